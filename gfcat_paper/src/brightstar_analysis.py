@@ -1,7 +1,9 @@
 import numpy as np
-import pyarrow.parquet as pq
 import pandas as pd
-from lightcurve_interface_skeleton import load_lightcurve_records, is_spiky
+from lightcurve_interface_skeleton import is_spiky
+from lightcurve_index import lookup_lightcurves
+from catalog_index import CatalogIndex, sort_catalog
+from header_table import HeaderTable
 import os
 from sklearn.cluster import DBSCAN
 from scipy import signal, stats
@@ -14,13 +16,18 @@ datadir = '/home/ubuntu/datadir'
 if not os.path.exists(f'{datadir}/mislike_image_header_table.csv'):
     cmd =  f"aws s3 cp s3://nishapur/galex_metadata/mislike_image_header_table.csv {datadir}/."
     os.system(cmd)
-header_data = pd.read_csv(f'{datadir}/mislike_image_header_table.csv')
+header_table = HeaderTable.load(f'{datadir}/mislike_image_header_table.csv')
+header_data = header_table.to_pandas()
 
 catalog_filename = f"{datadir}/catalog_nd_daostarfinder.parquet"
 if not os.path.exists(f"{datadir}/catalog_nd_daostarfinder.parquet"):
     cmd = f"aws s3 cp s3://dream-pool/indices/catalog_nd_daostarfinder.parquet {datadir}/."
     os.system(cmd)
-catalog_file = pq.ParquetFile(catalog_filename)
+# an eclipse-sorted copy of the catalog lets us fetch many eclipses in one scan
+sorted_catalog_filename = f"{datadir}/catalog_nd_daostarfinder_sorted.parquet"
+if not os.path.exists(sorted_catalog_filename):
+    sort_catalog(catalog_filename, sorted_catalog_filename)
+catalog_file = CatalogIndex(sorted_catalog_filename)
 
 def find_bright_stars(catalog_file,header_data,
                       n_ecl=100, # number of eclipses to check, not necessarily return
@@ -30,17 +37,20 @@ def find_bright_stars(catalog_file,header_data,
     targets=[]
     scrambled_ecl = np.random.choice(len(header_data),size=len(header_data),replace=False)
     #while len(np.unique(np.array(targets)[:,0]))<n_ecl:
-    for ix in np.random.choice(len(header_data),size=n_ecl,replace=False):
-        visit = header_data.iloc[ix]
+    visits = header_data.iloc[np.random.choice(len(header_data),size=n_ecl,replace=False)]
+    visits = visits.loc[visits['EXPTIME']>=1200.0]
+    # fetch the candidate bright stars for all of the selected eclipses in one batched read
+    candidates = catalog_file.read_eclipses(visits['ECLIPSE'].astype(int), filters =
+                                            [('aperture_sum_mask_n_51_2','=',0.0),
+                                             ('aperture_sum_edge_n_51_2','=',0.0),
+                                             ('aperture_sum_n_51_2','>',10000.0)])
+    candidates = dict(tuple(candidates.groupby('eclipse')))
+    for _, visit in visits.iterrows():
         eclipse = int(visit['ECLIPSE'])
         #print(eclipse)
-        if visit['EXPTIME']<1200.0:
+        if eclipse not in candidates:
             continue
-        bright_stars = pq.read_table(catalog_filename,filters =
-                                     [('aperture_sum_mask_n_51_2','=',0.0),
-                                      ('aperture_sum_edge_n_51_2','=',0.0),
-                                      ('aperture_sum_n_51_2','>',10000.0),
-                                      ('eclipse','=',eclipse)]).to_pandas()
+        bright_stars = candidates[eclipse]
 
         cps = np.array(bright_stars['aperture_sum_n_12_8'])/visit['EXPT_0']
         ix = np.where(cps>countrate_limit)
@@ -99,24 +109,20 @@ for eclipse in np.unique(np.array(targets)[:, 0]):
     print(eclipse)
     fn = f'{datadir}/e{str(eclipse).zfill(5)}-30s-photom.parquet'
     aper_radius = 51.2
-    lightcurves = load_lightcurve_records(fn, 'NUV', apersize=aper_radius)
-
     obj_ids = np.array(targets)[np.where(np.array(targets)[:,0]==eclipse)][:,1].tolist()
 
-    variables = {}
-    for lc in lightcurves:
-        if lc['obj_id'] in obj_ids:
-            variables[lc['obj_id']] = lc
+    # reads only the rows for obj_ids, see lightcurve_index.py
+    variables = lookup_lightcurves(fn, obj_ids, 'NUV', apersize=aper_radius)
     for obj_id in obj_ids:
         if obj_id not in variables.keys():
-            print(f'{obj_id} not found in {eclipse} {band} unflagged lightcurves')
+            print(f'{obj_id} not found in {eclipse} NUV unflagged lightcurves')
 
     for k in variables.keys():
         lc = variables[k]
         summary_stats = get_lc_summary_stats(lc)
         summary_stats['obj_id'] = int(k)
         summary_stats['eclipse'] = int(str(k)[-5:])
-        hdr = header_data.loc[header_data['ECLIPSE'] == summary_stats['eclipse']].loc[header_data['BAND']=='NUV']
+        hdr = header_table.row(summary_stats['eclipse'], 'NUV')
         summary_stats['CRPIX1'] = float(hdr['CRPIX1'])
         summary_stats['CRPIX2'] = float(hdr['CRPIX2'])
         bright_star_table = bright_star_table.append(pd.Series(summary_stats), ignore_index=True)
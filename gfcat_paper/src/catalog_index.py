@@ -0,0 +1,113 @@
+"""
+batched access to the survey-wide daostarfinder catalog
+(catalog_nd_daostarfinder.parquet).
+
+`sort_catalog` rewrites the catalog sorted by (eclipse, obj_id) with modest
+row groups, so each row group's min/max eclipse statistics describe a narrow
+range of eclipses. `CatalogIndex` reads those statistics once and then
+fetches many eclipses, or many (eclipse, obj_id) pairs, by decoding only the
+row groups that can contain them -- one scan per batch instead of one full
+`pq.read_table(..., filters=...)` per lookup.
+"""
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pac
+from pyarrow import parquet
+
+
+def sort_catalog(
+    catalog_filename: str, output_filename: str, row_group_size: int = 50000
+) -> str:
+    """
+    write a copy of the catalog sorted by (eclipse, obj_id), with row group
+    statistics. note that this holds the whole catalog in memory while sorting.
+    """
+    table = parquet.read_table(catalog_filename)
+    table = table.sort_by([('eclipse', 'ascending'), ('obj_id', 'ascending')])
+    parquet.write_table(
+        table, output_filename, row_group_size=row_group_size,
+        write_statistics=True, version="2.6",
+    )
+    return output_filename
+
+
+class CatalogIndex:
+    """
+    eclipse-range index over the row groups of an eclipse-sorted catalog file
+    (see `sort_catalog`). lookups also work on an unsorted file, just with
+    less pruning.
+    """
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.file = parquet.ParquetFile(filename)
+        meta = self.file.metadata
+        eclipse_ix = self.file.schema_arrow.get_field_index('eclipse')
+        mins, maxes = [], []
+        for rg in range(meta.num_row_groups):
+            stats = meta.row_group(rg).column(eclipse_ix).statistics
+            if stats is None or not stats.has_min_max:
+                mins.append(-np.inf)
+                maxes.append(np.inf)
+            else:
+                mins.append(stats.min)
+                maxes.append(stats.max)
+        self.rg_min = np.array(mins, dtype=float)
+        self.rg_max = np.array(maxes, dtype=float)
+
+    def row_groups(self, eclipses: Iterable[int]) -> list[int]:
+        """row groups whose eclipse range contains any of `eclipses`"""
+        eclipses = np.unique(np.asarray(list(eclipses), dtype=float))
+        if not len(eclipses):
+            return []
+        # first requested eclipse >= each row group's minimum; a row group
+        # is needed if that eclipse is also <= its maximum
+        first = np.searchsorted(eclipses, self.rg_min, side='left')
+        hit = first < len(eclipses)
+        hit[hit] = eclipses[first[hit]] <= self.rg_max[hit]
+        return np.nonzero(hit)[0].tolist()
+
+    def _read(
+        self,
+        eclipses: Iterable[int],
+        columns: Optional[Sequence[str]] = None,
+        filters=None,
+    ) -> pa.Table:
+        eclipses = list(map(int, set(eclipses)))
+        if columns is not None:
+            columns = list(dict.fromkeys(list(columns) + ['eclipse', 'obj_id']))
+        row_groups = self.row_groups(eclipses)
+        if not row_groups:
+            return self.file.schema_arrow.empty_table().select(
+                columns or self.file.schema_arrow.names
+            )
+        table = self.file.read_row_groups(row_groups, columns=columns)
+        table = table.filter(pac.is_in(table['eclipse'], pa.array(eclipses, table['eclipse'].type)))
+        if filters is not None:
+            table = table.filter(parquet.filters_to_expression(filters))
+        return table
+
+    def read_eclipses(
+        self,
+        eclipses: Iterable[int],
+        columns: Optional[Sequence[str]] = None,
+        filters=None,
+    ) -> pd.DataFrame:
+        """
+        all catalog rows for any of `eclipses` in one batched scan.
+        `filters` takes the same list-of-tuples form as pq.read_table.
+        """
+        return self._read(eclipses, columns, filters).to_pandas()
+
+    def read_sources(
+        self,
+        pairs: Iterable[tuple[int, int]],
+        columns: Optional[Sequence[str]] = None,
+    ) -> pd.DataFrame:
+        """catalog rows matching any of the given (eclipse, obj_id) pairs"""
+        pairs = pd.DataFrame(list(pairs), columns=['eclipse', 'obj_id']).astype('int64')
+        found = self._read(pairs['eclipse'], columns).to_pandas()
+        found = found.astype({'eclipse': 'int64', 'obj_id': 'int64'})
+        return found.merge(pairs.drop_duplicates(), on=['eclipse', 'obj_id'])
@@ -1,10 +1,12 @@
 import numpy as np
-import pyarrow.parquet as pq
 import pandas as pd
 from rich import print
 import warnings
 import os
-from lightcurve_interface_skeleton import load_lightcurve_records, load_exptime
+from lightcurve_interface_skeleton import load_exptime
+from lightcurve_index import lookup_lightcurves
+from catalog_index import CatalogIndex, sort_catalog
+from header_table import HeaderTable
 import datetime
 from astropy.time import Time
 
@@ -20,15 +22,24 @@ datadir = '/home/ubuntu/datadir'
 if not os.path.exists(f'{datadir}/mislike_image_header_table.csv'):
     cmd =  f"aws s3 cp s3://nishapur/galex_metadata/mislike_image_header_table.csv {datadir}/."
     os.system(cmd)
-header_data = pd.read_csv(f'{datadir}/mislike_image_header_table.csv')
+header_table = HeaderTable.load(f'{datadir}/mislike_image_header_table.csv')
+header_data = header_table.to_pandas()
 
 catalog_filename = f"{datadir}/catalog_nd_daostarfinder.parquet"
 if not os.path.exists(f"{datadir}/catalog_nd_daostarfinder.parquet"):
     cmd = f"aws s3 cp s3://dream-pool/indices/catalog_nd_daostarfinder.parquet {datadir}/."
     os.system(cmd)
-catalog_file = pq.ParquetFile(catalog_filename)
+# an eclipse-sorted copy of the catalog lets us fetch all of the flare stars in one scan
+sorted_catalog_filename = f"{datadir}/catalog_nd_daostarfinder_sorted.parquet"
+if not os.path.exists(sorted_catalog_filename):
+    sort_catalog(catalog_filename, sorted_catalog_filename)
+catalog_file = CatalogIndex(sorted_catalog_filename)
 
 flare_list = pd.read_csv('flare_table.csv')
+flare_stars = catalog_file.read_sources(zip(flare_list['eclipse'].astype(int),
+                                            flare_list['obj_id'].astype(int)))
+no_star = flare_stars.iloc[:0]
+flare_stars = dict(tuple(flare_stars.groupby(['eclipse', 'obj_id'])))
 flare_table = pd.DataFrame()
 for flare in flare_list.iterrows():
     eclipse = int(flare[1]['eclipse'])
@@ -39,13 +50,10 @@ for flare in flare_list.iterrows():
         os.system(cmd)
 
     obj_id = int(flare[1]['obj_id'])
-    this_star = pq.read_table(catalog_filename,filters =
-                              [('eclipse','=',eclipse),
-                               ('obj_id','=',obj_id)]).to_pandas()
-    expt = header_data.loc[header_data['ECLIPSE']==eclipse].loc[header_data['BAND']=='NUV']['EXPT_0']
-    obstart = header_data.loc[header_data['ECLIPSE']==eclipse].loc[header_data['BAND']=='NUV']['T0_0']
+    this_star = flare_stars.get((eclipse, obj_id), no_star).reset_index(drop=True)
+    obstart = header_table.get(eclipse, 'NUV', 'T0_0')
     GPSSECS = 315532800 + 432000
-    t = obstart.tolist()[0] + GPSSECS
+    t = obstart + GPSSECS
     dt = datetime.datetime.fromtimestamp(t)
     this_star['datetime_iso'] = dt.isoformat().split('.')[0]
     this_star['datetime_decimal'] = Time(dt,format='datetime').decimalyear
@@ -65,14 +73,17 @@ for flare in flare_list.iterrows():
             this_star[f'{band}mag_err_1'] = None
             this_star[f'{band}mag_err_2'] = None
             continue
-        lightcurves = load_lightcurve_records(fn, band, apersize=aper_radius)
-        variables = {}
-        for lc in lightcurves:
-            if lc['obj_id'] in obj_ids:
-                variables[lc['obj_id']] = lc
+        # reads only the rows for obj_ids, see lightcurve_index.py
+        variables = lookup_lightcurves(fn, obj_ids, band, apersize=aper_radius)
         for obj_id in obj_ids:
             if obj_id not in variables.keys():
                 print(f'{obj_id} not found in e{str(eclipse).zfill(5)} {band} unflagged lightcurves')
+        if not len(variables):
+            this_star[f'{band}mag'] = None
+            this_star[f'{band}mag_err_1'] = None
+            this_star[f'{band}mag_err_2'] = None
+            continue
+        lc = variables[next(iter(variables))]
         ix = np.where(np.isfinite(lc['cps']))
         counts = (lc['cps'][ix]*expt[ix]).sum()
         if counts==0:
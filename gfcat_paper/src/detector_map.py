@@ -0,0 +1,203 @@
+"""
+survey-level map of where on the detector screening candidates and
+artifacts turn up.
+
+a DetectorMap accumulates, across screened eclipses, 2-d histograms of
+source positions relative to the field center (xcenter - CRPIX1,
+ycenter - CRPIX2, in pixels): every screened source, every candidate of
+the per-source cuts, and the candidates then rejected by the per-eclipse
+vetoes (declumping, bright stars, cursed eclipses, the artifact
+classifier). hot spots and edge glints show up as bins with many more
+candidates per source than the survey as a whole, or where most candidates
+are rejected.
+
+`weight` turns the map into a per-candidate factor in (0, 1]: the expected
+share of a bin's candidates that are neither excess over the survey-wide
+candidate rate nor rejected more often than the survey-wide rejection
+rate. bin rates are shrunk toward the survey rate by prior_weight
+pseudo-candidates, so bins with few candidates keep a weight near 1.
+lookups are one array index per candidate; the weight map is cached until
+the next update.
+
+    detector_map = DetectorMap.load("detector_map.npz")  # or DetectorMap()
+    varix, rejects = screen_variables(
+        fn, metrics=ScreeningMetrics(eclipse=eclipse),
+        detector_map=detector_map, crpix=header_crpix(header_table, eclipse),
+    )
+    detector_map.save("detector_map.npz")
+"""
+import os
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+# histogram bin width in pixels; matches the declumping radius
+BIN_SIZE = 40
+# half-width of the mapped region around CRPIX, in pixels; positions
+# beyond it fall in the outermost bins
+DETECTOR_RADIUS = 1600
+# pseudo-candidates of survey-average behavior added to every bin
+PRIOR_WEIGHT = 20
+HISTOGRAMS = ('sources', 'candidates', 'rejected')
+
+
+def header_crpix(header_table, eclipse: int, band: str = 'NUV') -> tuple[float, float]:
+    """CRPIX1 / CRPIX2 of one eclipse from a header_table.HeaderTable"""
+    return (
+        float(header_table.get(eclipse, band, 'CRPIX1')),
+        float(header_table.get(eclipse, band, 'CRPIX2')),
+    )
+
+
+class DetectorMap:
+    """histograms of source, candidate and rejected positions around CRPIX"""
+    def __init__(
+        self,
+        bin_size: float = BIN_SIZE,
+        radius: float = DETECTOR_RADIUS,
+        prior_weight: float = PRIOR_WEIGHT,
+    ):
+        self.bin_size = bin_size
+        self.radius = radius
+        self.prior_weight = prior_weight
+        self.n_bins = int(np.ceil(2 * radius / bin_size))
+        self.counts = {
+            name: np.zeros((self.n_bins, self.n_bins), dtype=np.int64)
+            for name in HISTOGRAMS
+        }
+        # (eclipse, band) already added, so re-screening an eclipse is not double counted
+        self.eclipses = set()
+        self._weights = None
+
+    def bin_index(
+        self, xcenter: Sequence[float], ycenter: Sequence[float], crpix: tuple[float, float]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """(row, column) bins of detector positions; NaN positions go to the center"""
+        ix = [
+            np.clip(np.floor(
+                (np.nan_to_num(np.asarray(pos, dtype=np.float64) - center) + self.radius)
+                / self.bin_size
+            ), 0, self.n_bins - 1).astype(np.int64)
+            for pos, center in ((xcenter, crpix[0]), (ycenter, crpix[1]))
+        ]
+        return ix[1], ix[0]
+
+    def _histogram(self, xcenter, ycenter, crpix) -> np.ndarray:
+        row, column = self.bin_index(xcenter, ycenter, crpix)
+        return np.bincount(
+            row * self.n_bins + column, minlength=self.n_bins ** 2
+        ).reshape(self.n_bins, self.n_bins)
+
+    def add(
+        self,
+        eclipse: int,
+        crpix: tuple[float, float],
+        sources: tuple[Sequence[float], Sequence[float]],
+        candidates: tuple[Sequence[float], Sequence[float]],
+        rejected: tuple[Sequence[float], Sequence[float]],
+        band: str = 'NUV',
+    ) -> bool:
+        """
+        add one eclipse's (xcenter, ycenter) arrays of screened sources,
+        candidates and rejected candidates. returns False, adding nothing,
+        if this eclipse and band are already in the map.
+        """
+        if (int(eclipse), band) in self.eclipses:
+            return False
+        self.eclipses.add((int(eclipse), band))
+        for name, (xcenter, ycenter) in zip(HISTOGRAMS, (sources, candidates, rejected)):
+            self.counts[name] += self._histogram(xcenter, ycenter, crpix)
+        self._weights = None
+        return True
+
+    def merge(self, other: "DetectorMap"):
+        """add another map's counts (e.g. from another worker) to this one"""
+        if (other.bin_size, other.n_bins) != (self.bin_size, self.n_bins):
+            raise ValueError("detector maps have different binning")
+        overlap = self.eclipses & other.eclipses
+        if overlap:
+            raise ValueError(f"{len(overlap)} eclipses are in both detector maps")
+        for name in HISTOGRAMS:
+            self.counts[name] += other.counts[name]
+        self.eclipses |= other.eclipses
+        self._weights = None
+
+    def survey_rejection_rate(self) -> float:
+        """fraction of all candidates that were rejected"""
+        candidates = self.counts['candidates'].sum()
+        return self.counts['rejected'].sum() / candidates if candidates else 0.0
+
+    def rejection_rate(self) -> np.ndarray:
+        """fraction of each bin's candidates that were rejected, shrunk to the survey rate"""
+        return (
+            (self.counts['rejected'] + self.prior_weight * self.survey_rejection_rate())
+            / (self.counts['candidates'] + self.prior_weight)
+        )
+
+    def candidate_excess(self) -> np.ndarray:
+        """
+        each bin's candidates over those expected from its sources at the
+        survey candidate rate, shrunk toward 1
+        """
+        sources, candidates = self.counts['sources'], self.counts['candidates']
+        if not candidates.sum():
+            return np.ones(sources.shape)
+        expected = sources * candidates.sum() / sources.sum()
+        return (candidates + self.prior_weight) / (expected + self.prior_weight)
+
+    def weights(self) -> np.ndarray:
+        """the (row, column) weight map; see the module docstring"""
+        if self._weights is None:
+            survey = self.survey_rejection_rate()
+            if survey >= 1:
+                kept = np.ones((self.n_bins, self.n_bins))
+            else:
+                kept = np.clip((1 - self.rejection_rate()) / (1 - survey), 0, 1)
+            self._weights = kept / np.maximum(self.candidate_excess(), 1)
+        return self._weights
+
+    def weight(
+        self, xcenter: Sequence[float], ycenter: Sequence[float], crpix: tuple[float, float]
+    ) -> np.ndarray:
+        """weights of candidates at these detector positions"""
+        row, column = self.bin_index(xcenter, ycenter, crpix)
+        return self.weights()[row, column]
+
+    def hotspots(self, max_weight: float = 0.5) -> pd.DataFrame:
+        """bins with weight below max_weight: center offsets from CRPIX, counts and rates"""
+        weights = self.weights()
+        row, column = np.nonzero(weights < max_weight)
+        centers = (np.arange(self.n_bins) + 0.5) * self.bin_size - self.radius
+        return pd.DataFrame({
+            'dx': centers[column], 'dy': centers[row],
+            **{name: self.counts[name][row, column] for name in HISTOGRAMS},
+            'rejection_rate': self.rejection_rate()[row, column],
+            'candidate_excess': self.candidate_excess()[row, column],
+            'weight': weights[row, column],
+        }).sort_values('weight', ignore_index=True)
+
+    def save(self, filename: str):
+        """write the map to an .npz file"""
+        eclipses = sorted(self.eclipses)
+        np.savez_compressed(
+            filename,
+            bin_size=self.bin_size, radius=self.radius, prior_weight=self.prior_weight,
+            eclipse=np.array([e for e, _ in eclipses], dtype=np.int64),
+            band=np.array([b for _, b in eclipses], dtype='U3'),
+            **self.counts,
+        )
+
+    @classmethod
+    def load(cls, filename: str) -> "DetectorMap":
+        """read a map written by save; a missing file gives an empty map"""
+        if not os.path.exists(filename):
+            return cls()
+        with np.load(filename) as data:
+            detector_map = cls(
+                float(data['bin_size']), float(data['radius']), float(data['prior_weight'])
+            )
+            for name in HISTOGRAMS:
+                detector_map.counts[name] = data[name].astype(np.int64)
+            detector_map.eclipses = set(zip(data['eclipse'].tolist(), data['band'].tolist()))
+        return detector_map
@@ -16,15 +16,15 @@ from astropy import wcs as pywcs
 from astropy.visualization import simple_norm, ZScaleInterval
 from rich import print
 import astropy
-from astroquery.simbad import Simbad
-Simbad.add_votable_fields("otype")
 import astropy.units as u
 import time
 import json
+from concurrent.futures import ProcessPoolExecutor
+import pyarrow
+from pyarrow import compute as pac
+from pyarrow import csv as pacsv
 from pyarrow import parquet
-
-#import pyarrow
-#from pyarrow import parquet
+from query_cache import default_cache
 
 
 def make_wcs(
@@ -63,68 +63,98 @@ def read_image(fn,hdunum=0):
     hdu.close()
     return image, flagmap, edgemap, wcs, tranges, exptimes
 
-def generate_visit_database(catdbfile='/Users/cm/GFCAT/catalog.parquet',
+VISIT_DATABASE_FIELDS = ['id', 'ra', 'dec', 'xcenter', 'ycenter',
+                         'exptime', 'cps', 'cps_err', 'hasmask', 'hasedge']
+
+
+def read_visit_photometry(edir:str, photdir='/Users/cm/GFCAT/photom', band='NUV', apersize=12.8):
+    # Build the visit-level (full-depth) table for one eclipse directory as column-wise
+    #  array operations. Prefers the parquet photometry file and falls back to the
+    #  legacy -nd-30s-photom.csv / -nd-30s-exptime.csv pair. Returns None if there is
+    #  no photometry for this eclipse.
+    parqfn = f'{photdir}/{edir}/{edir}-30s-photom.parquet'
+    csvfn = f'{photdir}/{edir}/{edir}-{band.lower()[0]}d-30s-photom.csv'
+    if os.path.exists(parqfn):
+        suffix = f"{band.lower()[0]}_{str(apersize).replace('.', '_')}"
+        cols = {'obj_id': 'id', 'ra': 'ra', 'dec': 'dec', 'xcenter': 'xcenter', 'ycenter': 'ycenter',
+                f'aperture_sum_{suffix}': 'counts',
+                f'aperture_sum_mask_{suffix}': 'mask',
+                f'aperture_sum_edge_{suffix}': 'edge'}
+        tab = parquet.read_table(parqfn, columns=list(cols.keys())).rename_columns(list(cols.values()))
+        expt_total = float(np.sum(parse_exposure_time(parqfn, band=band)['expt']))
+    elif os.path.exists(csvfn):
+        cols = ['id', 'ra', 'dec', 'xcenter', 'ycenter', 'aperture_sum', 'aperture_sum_mask', 'aperture_sum_edge']
+        tab = pacsv.read_csv(csvfn, convert_options=pacsv.ConvertOptions(
+            include_columns=cols,
+            column_types={c: pyarrow.float64() for c in cols[1:]})).rename_columns(
+            ['id', 'ra', 'dec', 'xcenter', 'ycenter', 'counts', 'mask', 'edge'])
+        expt = pacsv.read_csv(csvfn.replace('photom.csv', 'exptime.csv'), convert_options=pacsv.ConvertOptions(
+            include_columns=['expt'], column_types={'expt': pyarrow.float64()}))
+        expt_total = float(pac.sum(expt['expt']).as_py() or 0)
+    else:
+        return None
+    counts = tab['counts'].to_numpy(zero_copy_only=False).astype('float64')
+    return pyarrow.table({
+        'id': tab['id'],
+        'ra': tab['ra'], 'dec': tab['dec'],
+        'xcenter': tab['xcenter'], 'ycenter': tab['ycenter'],
+        'exptime': np.full(len(counts), expt_total),
+        'cps': counts / expt_total,
+        'cps_err': np.sqrt(counts) / expt_total,
+        'hasmask': pac.greater(tab['mask'], 0),
+        'hasedge': pac.greater(tab['edge'], 0),
+    })
+
+
+def _write_visit_partition(args):
+    edir, eclipse, photdir, catdbdir = args
+    visits = read_visit_photometry(edir, photdir=photdir)
+    if visits is None or not len(visits):
+        return None
+    partdir = f'{catdbdir}/eclipse={eclipse}'
+    os.makedirs(partdir, exist_ok=True)
+    # one file per eclipse, written as a single row group
+    parquet.write_table(visits, f'{partdir}/part-0.parquet', row_group_size=len(visits),
+                        use_dictionary=['id', 'exptime', 'hasmask', 'hasedge'], version="2.6")
+    return eclipse
+
+
+def generate_visit_database(catdbdir='/Users/cm/GFCAT/catalog',
                             photdir = '/Users/cm/GFCAT/photom',
-                            wrong_eclipse_file='/Users/cm/GFCAT/incorrectly_analyzed_eclipses.txt'):
-    observations = {'eclipse': [], 'id': [],
-                    'ra': [], 'dec': [],
-                    'xcenter': [], 'ycenter': [],
-                    'exptime': [], 'cps': [], 'cps_err': [],
-                    'hasmask': [], 'hasedge': []}
-    wrong_eclipses = pd.read_csv(wrong_eclipse_file)['eclipse'].values
-    for i, edir in enumerate(tqdm.tqdm(os.listdir(photdir))):
+                            wrong_eclipse_file='/Users/cm/GFCAT/incorrectly_analyzed_eclipses.txt',
+                            rerun=False, n_workers=None):
+    # Writes the visit-level database as a hive-partitioned parquet dataset with one
+    #  partition (and one row group) per eclipse, e.g. {catdbdir}/eclipse=1234/part-0.parquet.
+    #  Eclipses that already have a partition are skipped unless rerun=True, so running
+    #  this again after new eclipses are processed only reads the new photometry.
+    #  Read it back with load_visit_database().
+    wrong_eclipses = set(pd.read_csv(wrong_eclipse_file)['eclipse'].values)
+    jobs = []
+    for edir in os.listdir(photdir):
         try:
             eclipse = int(edir[1:])
         except ValueError:
             continue  # not a normal eclipse directory
         if eclipse in wrong_eclipses:
             continue  # skipping accidentally processed eclipse
+        if not rerun and os.path.exists(f'{catdbdir}/eclipse={eclipse}'):
+            continue  # already in the database
         if not len(os.listdir(f'{photdir}/{edir}')):
             continue  # light curves not created (for any number of reasons)
-        phot = csv.DictReader(open(f'{photdir}/{edir}/{edir}-nd-30s-photom.csv'))
-        expt = parse_exposure_time(f'{photdir}/{edir}/{edir}-nd-30s-exptime.csv')
-        for obj in phot:
-            counts = float(obj['aperture_sum'])
-            observations['eclipse'] += [eclipse]
-            observations['id'] += [obj['id']]
-            observations['ra'] += [float(obj['ra'])]
-            observations['dec'] += [float(obj['dec'])]
-            observations['xcenter'] += [float(obj['xcenter'])]
-            observations['ycenter'] += [float(obj['ycenter'])]
-            observations['exptime'] += [expt['expt_total']]
-            observations['cps'] += [counts / expt['expt_total']]
-            observations['cps_err'] += [math.sqrt(counts) / expt['expt_total']]
-            observations['hasmask'] += [float(obj['aperture_sum_mask']) > 0]
-            observations['hasedge'] += [float(obj['aperture_sum_edge']) > 0]
-
-    #engine = sql.create_engine(f'sqlite:///{catdbfile}', echo=False)
-    #pd.DataFrame(observations).to_sql('gfcat', con=engine, if_exists='replace')  # 'append' if i!=0 else 'replace')
-    #engine.execute("CREATE INDEX 'ix_gfcat' ON 'gfcat' ('ra', 'dec')")
-    #engine.dispose()
-    #print(f'Visit level data dumped to {catdbfile}.\n')
-
-    VARIABLES_FOR_WHICH_DICTIONARY_COMPRESSION_IS_USEFUL = [
-        "eclipse",
-        "id",
-        "ra",
-        "dec",
-        "xcenter",
-        "ycenter",
-        "exptime",
-        "cps",
-        "hasmask",
-        "hasedge",
-    ]
-    dict_comp = VARIABLES_FOR_WHICH_DICTIONARY_COMPRESSION_IS_USEFUL.copy()
-
-    parquet.write_table(
-        pyarrow.Table.from_arrays(
-            list(observations.values()), names=list(observations.keys())
-        ),
-        catdbfile,
-        use_dictionary=dict_comp,
-        version="2.6",
-    )
+        jobs.append((edir, eclipse, photdir, catdbdir))
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        written = [e for e in tqdm.tqdm(pool.map(_write_visit_partition, jobs, chunksize=16),
+                                        total=len(jobs)) if e is not None]
+    print(f'Visit level data for {len(written)} eclipses written to {catdbdir}.\n')
+    return written
+
+
+def load_visit_database(catdbdir='/Users/cm/GFCAT/catalog', eclipses=None, columns=None):
+    # Read the partitioned visit database. Passing `eclipses` only touches those partitions.
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(catdbdir, format='parquet', partitioning='hive')
+    filt = None if eclipses is None else pac.field('eclipse').isin(list(eclipses))
+    return dataset.to_table(columns=columns, filter=filt).to_pandas()
 
 def eliminate_dupes(variable_table):
     # Run a spatial clustering algorithm and consider variables within 1 arcmin
@@ -162,47 +192,61 @@ def parse_exposure_time(fn:str,band='NUV'):
         file = parquet.ParquetFile(fn)
         return pd.DataFrame(json.loads(file.schema_arrow.metadata[b'nuv_exptime' if band=='NUV' else b'fuv_exptime'].decode()))
 
-    with open(fn) as data:
-        expt_data = csv.DictReader(data) # way faster to parse the file like this
-        expt_rows = []
-        for row in expt_data:
-            expt_rows.append(
-                {
-                    't0':row['t0'],
-                    't1':row['t1'],
-                    'expt_eff':float(row['expt'])
-                }
-            )
-    return pd.DataFrame(expt_rows).astype({'t0':'float64','t1':'float64'}).to_dict('list')
+    # way faster to parse the file column-wise with arrow than row-by-row
+    expt_data = pacsv.read_csv(fn, convert_options=pacsv.ConvertOptions(
+        include_columns=['t0', 't1', 'expt'],
+        column_types={'t0': pyarrow.float64(), 't1': pyarrow.float64(), 'expt': pyarrow.float64()}))
+    return {'t0': expt_data['t0'].to_pylist(),
+            't1': expt_data['t1'].to_pylist(),
+            'expt_eff': expt_data['expt'].to_pylist()}
+
+def read_lightcurves_csv(fn:str):
+    # Read a legacy gPhoton -photom.csv file into per-bin matrices (sources x bins) in a
+    #  single vectorized pass, analogous to the parquet path. Rows with any missing bin
+    #  value contain no valid data and are dropped.
+    expt = parse_exposure_time(fn.split('photom')[0]+'exptime.csv')
+    n_bins = len(expt['t0'])
+    count_cols = [f'aperture_sum_{n}' for n in range(n_bins)]
+    # NOTE: There is a bug in the version of gPhoton that generated these photometry files that
+    #  switches the "mask" and "edge" columns. Bug discovered 220218.
+    edge_cols = [f'aperture_sum_flag_{n}' for n in range(n_bins)]
+    mask_cols = [f'aperture_sum_edge_{n}' for n in range(n_bins)]
+    id_cols = ['xcenter', 'ycenter', 'ra', 'dec']
+    cols = id_cols + count_cols + edge_cols + mask_cols
+    tab = pacsv.read_csv(fn, convert_options=pacsv.ConvertOptions(
+        include_columns=cols,
+        column_types={c: pyarrow.float64() for c in cols},
+        null_values=['']))
+    valid = np.ones(len(tab), dtype=bool)
+    for c in count_cols + edge_cols + mask_cols:
+        valid &= tab[c].is_valid().to_numpy(zero_copy_only=False)
+    tab = tab.filter(pyarrow.array(valid))
+
+    def matrix(columns):
+        if not len(tab):
+            return np.zeros((0, len(columns)))
+        return np.column_stack([tab[c].to_numpy() for c in columns])
+
+    counts = matrix(count_cols)
+    expt_eff = np.array(expt['expt_eff'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cps = counts / expt_eff
+        cps_err = np.sqrt(counts) / expt_eff
+    return {'counts': counts, 'cps': cps, 'cps_err': cps_err,
+            'edge_flags': matrix(edge_cols).astype(bool),
+            'mask_flags': matrix(mask_cols).astype(bool),
+            **{c: tab[c].to_numpy() for c in id_cols}}
 
 def parse_lightcurves_csv(fn:str):
-    # This is a blunt force way to suppress divide by zero warnings.
-    # It's dangerous to suppress warnings. Don't do this.
-    if not sys.warnoptions:
-        import warnings
-        warnings.simplefilter("ignore")
-
-    expt = parse_exposure_time(fn.split('photom')[0]+'exptime.csv')
-    with open(fn) as data:
-        obs = csv.DictReader(data)
-        lightcurves = []
-        for row in obs:
-            lc = {}
-            try:
-                lc['counts'] = np.array([float(row[f'aperture_sum_{n}']) for n in range(len(expt['t0']))])
-                # NOTE: There is a bug in the version of gPhoton that generated these photometry files that
-                #  switches the "mask" and "edge" columns. Bug discovered 220218.
-                lc['edge_flags'] = np.array([float(row[f'aperture_sum_flag_{n}']) for n in range(len(expt['t0']))],dtype=bool)
-                lc['mask_flags'] = np.array([float(row[f'aperture_sum_edge_{n}']) for n in range(len(expt['t0']))],dtype=bool)
-            except ValueError:
-                continue # this light curve contains no valid data
-            lc['cps'] = np.array(lc['counts'] / expt['expt_eff'])
-            lc['cps_err'] = np.array(np.sqrt(lc['counts']) / expt['expt_eff'])
-            lc['xcenter'] = float(row['xcenter'])
-            lc['ycenter'] = float(row['ycenter'])
-            lc['ra'] = float(row['ra'])
-            lc['dec'] = float(row['dec'])
-            lightcurves+=[lc]
+    data = read_lightcurves_csv(fn)
+    lightcurves = []
+    for i in range(len(data['counts'])):
+        lc = {}
+        for k in ['counts', 'edge_flags', 'mask_flags', 'cps', 'cps_err']:
+            lc[k] = data[k][i]
+        for k in ['xcenter', 'ycenter', 'ra', 'dec']:
+            lc[k] = float(data[k][i])
+        lightcurves+=[lc]
     return lightcurves
 
 def parse_lightcurves_parquet(fn:str,band='NUV',apersize=12.8):
@@ -245,10 +289,10 @@ def parse_lightcurves_parquet(fn:str,band='NUV',apersize=12.8):
 def parse_lightcurves(fn:str,band='NUV',apersize=12.8):
     if fn.endswith('parquet'):
         return parse_lightcurves_parquet(fn,band=band,apersize=apersize)
-    elif fn.endsiwth('csv'):
+    elif fn.endswith('csv'):
         return parse_lightcurves_csv(fn)
     else:
-        raise(f"Unknown lightcruve file format {fn}")
+        raise ValueError(f"Unknown lightcurve file format {fn}")
 
 def is_spiky(lc:dict):
     for sigma,n_outliers in [(3,3),(2,5)]: # sigma prominence is actually ~2x
@@ -473,27 +517,36 @@ def get_target_data(eclipse:int,index:int,band='NUV',photdir='/Users/cm/GFCAT/ph
     lc = parse_lightcurves(photpath)[index]
     return lc
 
-def get_simbad_id(skypos):
+def get_target_lightcurve(eclipse:int,obj_id:int,band='NUV',photdir='/Users/cm/GFCAT/photom'):
+    # gPhoton2 photometry: the source with this obj_id, looked up without reading the whole
+    #  eclipse (see lightcurve_index.py). Raises KeyError if it is not in the file.
+    from lightcurve_index import lookup_lightcurves
+    edir = f'e{str(eclipse).zfill(5)}'
+    parquetpath = f'{photdir}/{edir}/{edir}-30s-photom.parquet'
+    return lookup_lightcurves(parquetpath, [obj_id], band=band, unflagged=False)[obj_id]
+
+def get_simbad_id(skypos, cache=None):
+    # Results are memoized on disk by the query cache (see query_cache.py), so
+    # reruns over the same positions do not send any new queries to SIMBAD.
     ra, dec = skypos
-    skypos_obj = astropy.coordinates.SkyCoord(ra,dec,unit='deg')
-    r = 1*u.arcminute
-    result_table = Simbad.query_region(skypos_obj,r)
+    r = (1*u.arcminute).to(u.deg).value
+    result_table = (cache or default_cache()).query('simbad', ra, dec, r)
     #try:
     #    simbad_id = result_table[0]['MAIN_ID']
     #    #this [0] index grabs the top result for the skypos within the aperture search radius.
     #except TypeError: # a TypeError will be raised if no Simbad ID is found
     #    simbad_id = '-'
-    # NOTE: you will get blacklisted if you submit > 5-10 queries/sec, and this function will be used in a loop
-    #time.sleep(0.5)
+    # NOTE: you will get blacklisted if you submit > 5-10 queries/sec, and this function will be used in a loop.
+    #  Use QueryCache.prefetch() to populate the cache for many positions at a polite rate.
     return result_table[0]
 
-def quick_summarize_visit(eclipse:int,index:int,band='NUV',photdir='/Users/cm/GFCAT/photom'):
+def quick_summarize_visit(eclipse:int,index:int,band='NUV',photdir='/Users/cm/GFCAT/photom',cache=None):
     lc = get_target_data(eclipse,index,band=band,photdir=photdir)
     print(f'skypos:  {np.round(lc["ra"],5)}, {np.round(lc["dec"],5)}')
     print(f'eclipse: {eclipse}')
     print(f'index:   {index}')
     try:
-        simbad = get_simbad_id((lc['ra'],lc['dec']))
+        simbad = get_simbad_id((lc['ra'],lc['dec']),cache=cache)
         print(f'name:    {simbad["MAIN_ID"].decode()}')
         print(f'otype:   {simbad["OTYPE"].decode()}')
     except TypeError:
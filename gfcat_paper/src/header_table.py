@@ -0,0 +1,101 @@
+"""
+in-memory, indexed access to the GALEX image header table
+(mislike_image_header_table.csv).
+
+the table is loaded once into typed numpy columns keyed by (eclipse, band),
+so single lookups of EXPT_0, T0_0, CRPIX1, etc. are a dict access and lookups
+for arrays of eclipses are a single searchsorted. the parsed table can be
+cached as an Arrow IPC (feather) file next to the CSV so that workers don't
+re-parse the CSV on startup.
+"""
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pacsv
+from pyarrow import feather
+
+BAND_CODES = {'NUV': 0, 'FUV': 1}
+
+
+def _keys(eclipses, band_codes) -> np.ndarray:
+    return np.asarray(eclipses, dtype=np.int64) * 2 + np.asarray(band_codes, dtype=np.int64)
+
+
+class HeaderTable:
+    """header metadata for every (eclipse, band) in the table"""
+    def __init__(self, table: pa.Table):
+        self.table = table
+        self.columns = {
+            name: table[name].to_numpy(zero_copy_only=False)
+            for name in table.column_names
+        }
+        eclipse = self.columns['ECLIPSE'].astype(np.int64)
+        band = np.array([BAND_CODES.get(b, -1) for b in self.columns['BAND']])
+        # rows with a band other than NUV / FUV are left out of the index;
+        # their keys would collide with another eclipse's
+        known = np.flatnonzero(band >= 0)
+        keys = _keys(eclipse[known], band[known])
+        # keep the first row for any duplicated (eclipse, band)
+        self._sorted_keys, first = np.unique(keys, return_index=True)
+        first = known[first]
+        self._sorted_rows = first
+        self.index = dict(zip(
+            zip(eclipse[first].tolist(), self.columns['BAND'][first].tolist()),
+            first.tolist(),
+        ))
+
+    @classmethod
+    def load(cls, csv_filename: str, cache_filename: Optional[str] = None) -> "HeaderTable":
+        """
+        load the header table, using (and creating, if needed) a binary
+        cache of the parsed CSV. the cache is refreshed if the CSV is newer.
+        """
+        if cache_filename is None:
+            cache_filename = os.path.splitext(csv_filename)[0] + '.arrow'
+        if (
+            os.path.exists(cache_filename)
+            and os.path.getmtime(cache_filename) >= os.path.getmtime(csv_filename)
+        ):
+            return cls(feather.read_table(cache_filename, memory_map=True))
+        table = pacsv.read_csv(csv_filename)
+        feather.write_feather(table, cache_filename)
+        return cls(table)
+
+    def to_pandas(self) -> pd.DataFrame:
+        return self.table.to_pandas()
+
+    def __contains__(self, key: tuple[int, str]) -> bool:
+        return (int(key[0]), key[1]) in self.index
+
+    def row(self, eclipse: int, band: str = 'NUV') -> dict:
+        """all header values for one (eclipse, band)"""
+        ix = self.index[(int(eclipse), band)]
+        return {name: values[ix] for name, values in self.columns.items()}
+
+    def get(self, eclipse: int, band: str, field: str):
+        """a single header value, e.g. get(eclipse, 'NUV', 'EXPT_0')"""
+        return self.columns[field][self.index[(int(eclipse), band)]]
+
+    def rows(self, eclipses: Sequence[int], band: str = 'NUV') -> np.ndarray:
+        """
+        row numbers for an array of eclipses in one band; -1 where the
+        table has no entry for that eclipse
+        """
+        keys = _keys(eclipses, BAND_CODES[band])
+        pos = np.searchsorted(self._sorted_keys, keys)
+        pos = np.clip(pos, 0, max(len(self._sorted_keys) - 1, 0))
+        found = (len(self._sorted_keys) > 0) & (self._sorted_keys[pos] == keys)
+        return np.where(found, self._sorted_rows[pos], -1)
+
+    def lookup(
+        self, eclipses: Sequence[int], band: str, field: str, missing=np.nan
+    ) -> np.ndarray:
+        """values of `field` for an array of eclipses, `missing` where absent"""
+        rows = self.rows(eclipses, band)
+        values = self.columns[field][np.maximum(rows, 0)]
+        if (rows < 0).any():
+            values = np.where(rows >= 0, values, missing)
+        return values
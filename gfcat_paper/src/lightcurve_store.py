@@ -0,0 +1,178 @@
+"""
+a single local file holding the lightcurves of the catalog's source-visits.
+
+`export_lightcurve_store` pulls the rows for a list of (eclipse, obj_id)
+pairs out of the per-eclipse -30s-photom.parquet files (reading only those
+rows, see lightcurve_index.py) and writes one Arrow IPC file with a row per
+(eclipse, obj_id, band, aperture): source position, the bin time axes
+(t0, t1, expt) and cps, cps_err, mask_flags and edge_flags as list columns.
+`LightcurveStore` memory-maps that file and returns a lightcurve by key as
+numpy views into the list columns' offsets+values buffers, without parsing.
+
+    export_lightcurve_store(pairs, lambda e: f"{datadir}/e{e:05}-30s-photom.parquet",
+                            "gfcat_lightcurves.arrow")
+    store = LightcurveStore("gfcat_lightcurves.arrow")
+    lc = store.get(23456, 2101234, band='NUV', apersize=12.8)
+"""
+from collections import defaultdict
+from typing import Callable, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import ipc, parquet
+
+from lightcurve_index import read_rows
+from lightcurve_interface_skeleton import (
+    VARIABLE_PIPE_ID_FIELDS,
+    bin_field_name,
+    bins,
+    data_fields,
+    lightcurve_df_to_cps,
+    load_exptime,
+    sizes,
+)
+
+KEY_FIELDS = ('eclipse', 'obj_id', 'band', 'apersize')
+LIST_FIELDS = ('t0', 't1', 'expt', 'cps', 'cps_err', 'mask_flags', 'edge_flags')
+
+
+def visit_lightcurves(
+    photfile: str,
+    eclipse: int,
+    obj_ids: Iterable[int],
+    bands: Sequence[str] = ('NUV', 'FUV'),
+    apersizes: Optional[Sequence[float]] = None,
+) -> list[dict]:
+    """store rows for obj_ids from one photometry file, every band and aperture"""
+    file = parquet.ParquetFile(photfile)
+    data = data_fields(file.schema.names)
+    if apersizes is None:
+        # sizes() gives the column suffixes, e.g. '12_8'
+        apersizes = [float(size.replace('_', '.')) for size in sizes(data)]
+    binnos = bins(data)
+    band_expt = {}
+    for band in bands:
+        try:
+            band_expt[band] = load_exptime(photfile, band, exptime_only=False)
+        except KeyError:  # no data in this band
+            continue
+    columns = list(VARIABLE_PIPE_ID_FIELDS) + [
+        bin_field_name(size, band, binno, plane)
+        for band in band_expt for size in apersizes
+        for plane in ('cnt', 'mask', 'edge') for binno in binnos
+    ]
+    columns = [c for c in dict.fromkeys(columns) if c in file.schema.names]
+    tab = read_rows(photfile, obj_ids, columns).to_pandas()
+    rows = []
+    for band, expt in band_expt.items():
+        for size in apersizes:
+            counts = [bin_field_name(size, band, binno) for binno in binnos]
+            if not all(c in tab.columns for c in counts):
+                continue
+            cps, cps_err = lightcurve_df_to_cps(tab[counts], expt['expt'].to_numpy())
+            mask, edge = (
+                tab[[bin_field_name(size, band, binno, plane) for binno in binnos]]
+                .to_numpy() > 0
+                for plane in ('mask', 'edge')
+            )
+            for i, source in enumerate(tab[list(VARIABLE_PIPE_ID_FIELDS)].to_dict('records')):
+                rows.append(source | {
+                    'eclipse': eclipse, 'band': band, 'apersize': size,
+                    't0': expt['t0'].to_numpy(), 't1': expt['t1'].to_numpy(),
+                    'expt': expt['expt'].to_numpy(np.float32),
+                    'cps': cps[i], 'cps_err': cps_err[i],
+                    'mask_flags': mask[i], 'edge_flags': edge[i],
+                })
+    return rows
+
+
+STORE_SCHEMA = pa.schema([
+    ('eclipse', pa.int32()), ('obj_id', pa.int64()), ('band', pa.string()),
+    ('apersize', pa.float32()), ('xcenter', pa.float64()), ('ycenter', pa.float64()),
+    ('ra', pa.float64()), ('dec', pa.float64()),
+    ('t0', pa.list_(pa.float64())), ('t1', pa.list_(pa.float64())),
+    ('expt', pa.list_(pa.float32())), ('cps', pa.list_(pa.float32())),
+    ('cps_err', pa.list_(pa.float32())), ('mask_flags', pa.list_(pa.bool_())),
+    ('edge_flags', pa.list_(pa.bool_())),
+])
+
+
+def export_lightcurve_store(
+    pairs: Iterable[tuple[int, int]],
+    photfile: Callable[[int], str],
+    output_filename: str,
+    bands: Sequence[str] = ('NUV', 'FUV'),
+    apersizes: Optional[Sequence[float]] = None,
+) -> str:
+    """
+    write the store for (eclipse, obj_id) pairs. photfile maps an eclipse to
+    its photometry file; eclipses whose file is missing are reported and
+    skipped. apersizes defaults to every aperture in each file.
+    """
+    by_eclipse = defaultdict(set)
+    for eclipse, obj_id in pairs:
+        by_eclipse[int(eclipse)].add(int(obj_id))
+    rows = []
+    for eclipse in sorted(by_eclipse):
+        try:
+            rows += visit_lightcurves(
+                photfile(eclipse), eclipse, sorted(by_eclipse[eclipse]), bands, apersizes
+            )
+        except FileNotFoundError:
+            print(f'No photometry file for e{str(eclipse).zfill(5)}.')
+    rows.sort(key=lambda row: tuple(row[k] for k in KEY_FIELDS))
+    table = pa.Table.from_pylist(rows, schema=STORE_SCHEMA)
+    # a single record batch keeps each list column in one offsets+values buffer
+    with ipc.new_file(output_filename, STORE_SCHEMA) as writer:
+        writer.write_table(table, max_chunksize=max(len(table), 1))
+    return output_filename
+
+
+class LightcurveStore:
+    """memory-mapped reader for a file written by export_lightcurve_store"""
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.table = ipc.open_file(pa.memory_map(filename)).read_all().combine_chunks()
+        self.keys = {
+            key: row for row, key in enumerate(zip(
+                *(self.table[k].to_pylist() for k in KEY_FIELDS)
+            ))
+        }
+        self._scalars = {
+            k: self.table[k].to_numpy() for k in VARIABLE_PIPE_ID_FIELDS
+        }
+        self._lists = {}
+        for k in LIST_FIELDS:
+            array = self.table[k].chunk(0) if self.table.num_rows else None
+            if array is None:
+                continue
+            self._lists[k] = (
+                array.offsets.to_numpy(),
+                array.values.to_numpy(zero_copy_only=False),
+            )
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self.keys
+
+    def row(self, row: int) -> dict:
+        """the lightcurve in one row of the store"""
+        lc = {k: values[row] for k, values in self._scalars.items()}
+        for k, (offsets, values) in self._lists.items():
+            lc[k] = values[offsets[row]:offsets[row + 1]]
+        return lc
+
+    def get(
+        self, eclipse: int, obj_id: int, band: str = 'NUV', apersize: float = 12.8
+    ) -> dict:
+        """lightcurve record for a source-visit; raises KeyError if absent"""
+        return self.row(self.keys[(eclipse, obj_id, band, float(np.float32(apersize)))])
+
+    def visits(self) -> pd.DataFrame:
+        """the (eclipse, obj_id, band, apersize) keys and positions in the store"""
+        return self.table.select(
+            list(KEY_FIELDS) + ['ra', 'dec', 'xcenter', 'ycenter']
+        ).to_pandas()
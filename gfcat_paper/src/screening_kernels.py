@@ -0,0 +1,227 @@
+"""
+compiled versions of the per-source screening cuts in
+lightcurve_interface_skeleton.screen_lightcurves, used by
+screen_variables(backend='numba').
+
+screen_kernel evaluates the dim, brief, coverage, outlier and both
+spikiness cuts for every source of an eclipse in one parallel loop over a
+(source, bin) cps matrix. the decision logic is a line-by-line port of the
+numpy code, including scipy.signal.find_peaks (local maxima with plateaus,
+peak distance, prominence). two things stay in scipy and are applied by the
+caller to the few sources that get that far: the Anderson-Darling test,
+since matching scipy's normal log-cdf and float32 reductions exactly is not
+worth it for a handful of sources per eclipse, and find_peaks for curves
+with peaks of equal height, since numpy's (unstable) argsort decides which
+of them survives the distance cut.
+
+numba is optional: if it is not installed, HAVE_NUMBA is False and
+screen_variables uses the numpy backend.
+"""
+import numpy as np
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+# screen_kernel result codes, in the order the cuts are applied. PASSED
+# sources still have to pass the Anderson-Darling test; CHECK_PEAKS sources
+# passed every cut before the fine spikiness test and need it from scipy.
+(
+    PASSED, TOO_DIM, TOO_BRIEF, LOW_COVERAGE, FEW_OUTLIERS, SPIKY_CRUDE,
+    SPIKY_FINE, CHECK_PEAKS
+) = range(8)
+REJECT_REASONS = {
+    TOO_DIM: "too dim",
+    TOO_BRIEF: "too brief",
+    LOW_COVERAGE: "more than 1/4 bins unobserved",
+    FEW_OUTLIERS: "less than 3 outliers",
+    SPIKY_CRUDE: "spiky (crude)",
+    SPIKY_FINE: "spiky (fine)",
+}
+# the screening_metrics stage at which each code is decided
+KERNEL_STAGES = {
+    TOO_DIM: 'dim',
+    TOO_BRIEF: 'brief',
+    LOW_COVERAGE: 'coverage',
+    FEW_OUTLIERS: 'outliers',
+    SPIKY_CRUDE: 'spiky_crude',
+    SPIKY_FINE: 'spiky_fine',
+}
+
+
+@njit(cache=True)
+def bunched_outliers(lower, upper, n):
+    """is_spiky's count of bins n away from bins they clear on both sides"""
+    count = 0
+    for j in range(n, len(lower) - n):
+        if lower[j] - upper[j - n] > 0 and lower[j] - upper[j + n] > 0:
+            count += 1
+    return count
+
+
+@njit(cache=True)
+def local_maxima(x):
+    """scipy.signal._peak_finding_utils._local_maxima_1d (midpoints only)"""
+    midpoints = np.empty(len(x) // 2, dtype=np.int64)
+    m = 0
+    i = 1
+    i_max = len(x) - 1
+    while i < i_max:
+        if x[i - 1] < x[i]:
+            i_ahead = i + 1
+            # skip over a plateau
+            while i_ahead < i_max and x[i_ahead] == x[i]:
+                i_ahead += 1
+            if x[i_ahead] < x[i]:
+                midpoints[m] = (i + i_ahead - 1) // 2
+                m += 1
+                i = i_ahead
+        i += 1
+    return midpoints[:m]
+
+
+@njit(cache=True)
+def select_by_peak_distance(peaks, priority, distance):
+    """
+    scipy.signal._peak_finding_utils._select_by_peak_distance, for peaks
+    of distinct heights (see count_prominent_peaks)
+    """
+    n_peaks = len(peaks)
+    distance = np.ceil(distance)
+    keep = np.ones(n_peaks, dtype=np.bool_)
+    priority_to_position = np.argsort(priority, kind='mergesort')
+    for i in range(n_peaks - 1, -1, -1):
+        j = priority_to_position[i]
+        if not keep[j]:
+            continue
+        k = j - 1
+        while 0 <= k and peaks[j] - peaks[k] < distance:
+            keep[k] = False
+            k -= 1
+        k = j + 1
+        while k < n_peaks and peaks[k] - peaks[j] < distance:
+            keep[k] = False
+            k += 1
+    return keep
+
+
+@njit(cache=True)
+def count_prominent_peaks(x, min_prominence, distance):
+    """
+    len(scipy.signal.find_peaks(x, prominence=min_prominence, distance=distance)[0])
+    for an array-valued min_prominence and no window length, or -1 if two
+    peaks have the same height and the result would depend on sort order
+    """
+    peaks = local_maxima(x)
+    heights = np.sort(x[peaks])
+    for i in range(1, len(heights)):
+        if heights[i] == heights[i - 1]:
+            return -1
+    peaks = peaks[select_by_peak_distance(peaks, x[peaks], distance)]
+    count = 0
+    for peak in peaks:
+        # lowest point on each side before a higher point or the array edge
+        left_min = x[peak]
+        i = peak
+        while 0 <= i and x[i] <= x[peak]:
+            if x[i] < left_min:
+                left_min = x[i]
+            i -= 1
+        right_min = x[peak]
+        i = peak
+        while i < len(x) and x[i] <= x[peak]:
+            if x[i] < right_min:
+                right_min = x[i]
+            i += 1
+        if min_prominence[peak] <= x[peak] - max(left_min, right_min):
+            count += 1
+    return count
+
+
+@njit(cache=True)
+def screen_source(
+    cps, upper, lower, upper3, lower3, upper2, lower2, min_prominence, t0, t1
+):
+    """screen_lightcurves' cuts up to the fine spikiness test for one source"""
+    if not np.any(cps > 0.5):
+        return TOO_DIM
+    n_valid, first, last = 0, -1, -1
+    for i in range(len(cps)):
+        if cps[i] != 0 and np.isfinite(cps[i]):
+            if first < 0:
+                first = i
+            last = i
+            n_valid += 1
+    if t1[last] - t0[first] < 500:
+        return TOO_BRIEF
+    if n_valid / (last + 1 - first) < 0.75:
+        return LOW_COVERAGE
+    # second smallest upper limit over valid bins, sorting NaN last like np.sort
+    min1, min2, n_finite = np.inf, np.inf, 0
+    for i in range(first, last + 1):
+        if cps[i] != 0 and np.isfinite(cps[i]) and not np.isnan(upper[i]):
+            n_finite += 1
+            if upper[i] < min1:
+                min1, min2 = upper[i], min1
+            elif upper[i] < min2:
+                min2 = upper[i]
+    second_min = min2 if n_finite >= 2 else np.nan
+    n_outliers = 0
+    for i in range(first, last + 1):
+        if cps[i] != 0 and np.isfinite(cps[i]) and lower[i] > second_min:
+            n_outliers += 1
+    if n_outliers < 3:
+        return FEW_OUTLIERS
+    for n in (1, 2):
+        if (
+            bunched_outliers(lower3, upper3, n) >= 3
+            or bunched_outliers(lower2, upper2, n) >= 5
+        ):
+            return SPIKY_CRUDE
+    n_peaks = count_prominent_peaks(cps.astype(np.float64), min_prominence, 4.0)
+    if n_peaks < 0:
+        return CHECK_PEAKS
+    if n_peaks > 3:
+        return SPIKY_FINE
+    return PASSED
+
+
+@njit(parallel=True, cache=True)
+def _screen_kernel(
+    cps, upper, lower, upper3, lower3, upper2, lower2, min_prominence, t0, t1
+):
+    codes = np.empty(cps.shape[0], dtype=np.int8)
+    for s in prange(cps.shape[0]):
+        codes[s] = screen_source(
+            cps[s], upper[s], lower[s], upper3[s], lower3[s], upper2[s],
+            lower2[s], min_prominence[s], t0, t1
+        )
+    return codes
+
+
+def screen_kernel(
+    cps: np.ndarray,
+    cps_err: np.ndarray,
+    t0: np.ndarray,
+    t1: np.ndarray,
+    sigma: float = 3,
+) -> np.ndarray:
+    """
+    result code (see REJECT_REASONS) for each row of a (source, bin) cps
+    matrix. the error bounds are formed here with numpy so that they round
+    exactly as in the numpy backend.
+    """
+    sigma_err = cps_err * sigma
+    return _screen_kernel(
+        cps, cps + sigma_err, cps - sigma_err,
+        cps + 3 * cps_err, cps - 3 * cps_err,
+        cps + 2 * cps_err, cps - 2 * cps_err,
+        3 * cps_err,
+        np.asarray(t0, dtype=np.float64), np.asarray(t1, dtype=np.float64),
+    )
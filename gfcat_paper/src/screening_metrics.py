@@ -0,0 +1,112 @@
+"""
+per-eclipse timing and rejection-funnel instrumentation for screen_variables.
+
+a ScreeningMetrics object accumulates wall time per screening stage and the
+number of sources that reach each stage. records are written as one JSON
+object per line to a metrics file, and `load_metrics` / `summarize_metrics`
+aggregate them across a survey run.
+"""
+from collections import Counter, defaultdict
+import json
+import os
+import time
+from typing import Iterable, Optional, Union
+
+import pandas as pd
+
+# stages in the order screen_variables applies them
+SCREENING_STAGES = (
+    'load', 'dim', 'brief', 'coverage', 'outliers',
+    'spiky_crude', 'spiky_fine', 'anderson_darling', 'declump'
+)
+
+
+class ScreeningMetrics:
+    """wall time and funnel counts for one screen_variables call"""
+    def __init__(self, eclipse: Optional[int] = None, band: Optional[str] = None):
+        self.eclipse = eclipse
+        self.band = band
+        self.timings = defaultdict(float)
+        self.funnel = Counter()
+        self.outcome = None
+        self._start = time.perf_counter()
+        self.total = None
+
+    def lap(self, stage: str, since: float) -> float:
+        """add time elapsed since `since` to `stage`; return the current time"""
+        now = time.perf_counter()
+        self.timings[stage] += now - since
+        return now
+
+    def reached(self, stage: str, n: int = 1):
+        """record that n sources reached `stage`"""
+        self.funnel[stage] += n
+
+    def merge(self, other: "ScreeningMetrics"):
+        """add another object's stage times and funnel counts to this one"""
+        for stage, elapsed in other.timings.items():
+            self.timings[stage] += elapsed
+        self.funnel.update(other.funnel)
+
+    def finish(self, outcome: str):
+        self.outcome = outcome
+        self.total = time.perf_counter() - self._start
+
+    def record(self) -> dict:
+        """flat record: eclipse, band, outcome, total, time_<stage>, n_<stage>"""
+        record = {
+            'eclipse': self.eclipse, 'band': self.band,
+            'outcome': self.outcome, 'time_total': self.total,
+        }
+        stages = list(SCREENING_STAGES) + [
+            s for s in list(self.timings) + list(self.funnel)
+            if s not in SCREENING_STAGES
+        ]
+        for stage in dict.fromkeys(stages):
+            record[f'time_{stage}'] = self.timings.get(stage, 0.0)
+            record[f'n_{stage}'] = self.funnel.get(stage, 0)
+        return record
+
+    def write(self, metrics_file: Union[str, os.PathLike]):
+        """append this record to a JSON-lines metrics file"""
+        with open(metrics_file, 'a') as stream:
+            stream.write(json.dumps(self.record()) + '\n')
+
+
+def load_metrics(
+    metrics_files: Union[str, os.PathLike, Iterable[Union[str, os.PathLike]]]
+) -> pd.DataFrame:
+    """load records from one or more JSON-lines metrics files"""
+    if isinstance(metrics_files, (str, os.PathLike)):
+        metrics_files = [metrics_files]
+    records = []
+    for fn in metrics_files:
+        with open(fn) as stream:
+            records += [json.loads(line) for line in stream if line.strip()]
+    return pd.DataFrame(records)
+
+
+def summarize_metrics(metrics: pd.DataFrame) -> pd.DataFrame:
+    """
+    survey-level summary per stage: total and mean time, share of total
+    screening time, and the number of sources reaching the stage
+    """
+    stages = [c[len('time_'):] for c in metrics.columns
+              if c.startswith('time_') and c != 'time_total']
+    total = metrics['time_total'].sum()
+    return pd.DataFrame(
+        {
+            'time': [metrics[f'time_{s}'].sum() for s in stages],
+            'mean_time': [metrics[f'time_{s}'].mean() for s in stages],
+            'time_fraction': [
+                metrics[f'time_{s}'].sum() / total if total else 0.0 for s in stages
+            ],
+            'n_reached': [metrics[f'n_{s}'].sum() for s in stages],
+        },
+        index=stages,
+    )
+
+
+def slowest_eclipses(metrics: pd.DataFrame, n: int = 20) -> pd.DataFrame:
+    """the n eclipses with the longest total screening time"""
+    return metrics.sort_values('time_total', ascending=False).head(n)
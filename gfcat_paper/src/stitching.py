@@ -0,0 +1,203 @@
+"""
+multi-visit lightcurves of one sky position or GFCAT object.
+
+`PointingIndex` is a positional index over the field centers (CRVAL1 /
+CRVAL2) of every eclipse in the header table, so the eclipses that could
+have observed a position come from one k-d tree query. `stitch_position`
+then finds the nearest source to the position in each of those eclipses'
+photometry files (reading only the obj_id / ra / dec columns), looks up
+its lightcurve by obj_id (see lightcurve_index.py), reading the files on
+a thread pool, and returns one time-sorted lightcurve with a table of the
+visits and the offset of each visit's first bin in it.
+
+    header_table = HeaderTable.load(f'{datadir}/mislike_image_header_table.csv')
+    pointings = PointingIndex(header_table)
+    photfile = lambda e: f"{datadir}/e{e:05}/e{e:05}-30s-photom.parquet"
+    lc, visits = stitch_object("GFCAT J...", objects, pointings, photfile)
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+from pyarrow import parquet
+from scipy.spatial import cKDTree
+
+from header_table import HeaderTable
+from lightcurve_index import lookup_lightcurves
+from lightcurve_interface_skeleton import load_exptime
+
+# radius of the GALEX field of view, in degrees
+FOV_RADIUS = 0.6
+# the object table groups visits within 17.5" (006 - Summarize catalog ...)
+MATCH_RADIUS = 17.5 / 3600
+VISIT_COLUMNS = [
+    'eclipse', 'obj_id', 'ra', 'dec', 'separation', 'offset', 'n_bins',
+    'median_cps',
+]
+
+
+def unit_vectors(ra: np.ndarray, dec: np.ndarray) -> np.ndarray:
+    """(n, 3) unit vectors for positions in degrees"""
+    ra, dec = np.radians(np.atleast_1d(ra)), np.radians(np.atleast_1d(dec))
+    return np.stack(
+        [np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)], axis=1
+    )
+
+
+def chord(radius: float) -> float:
+    """chord length on the unit sphere for an angle in degrees"""
+    return 2 * np.sin(np.radians(radius) / 2)
+
+
+def separation(xyz: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """angular separations in degrees between unit vectors and one target"""
+    return np.degrees(2 * np.arcsin(np.clip(
+        np.linalg.norm(xyz - target, axis=1) / 2, 0, 1
+    )))
+
+
+class PointingIndex:
+    """k-d tree over the field centers of the eclipses in a header table"""
+    def __init__(
+        self,
+        header_table: HeaderTable,
+        band: str = 'NUV',
+        position_fields: tuple[str, str] = ('CRVAL1', 'CRVAL2'),
+        fov_radius: float = FOV_RADIUS,
+    ):
+        columns = header_table.columns
+        in_band = columns['BAND'] == band
+        ra = columns[position_fields[0]][in_band].astype(np.float64)
+        dec = columns[position_fields[1]][in_band].astype(np.float64)
+        known = np.isfinite(ra) & np.isfinite(dec)
+        self.eclipses = columns['ECLIPSE'][in_band][known].astype(np.int64)
+        self.fov_radius = fov_radius
+        self.tree = cKDTree(unit_vectors(ra[known], dec[known]))
+
+    def eclipses_covering(self, ra: float, dec: float) -> np.ndarray:
+        """eclipses whose field center is within the field radius of (ra, dec)"""
+        hits = self.tree.query_ball_point(unit_vectors(ra, dec)[0], chord(self.fov_radius))
+        return np.unique(self.eclipses[hits])
+
+
+def nearest_source(
+    photfile: str, ra: float, dec: float, match_radius: float = MATCH_RADIUS
+) -> Optional[tuple[int, float, float, float]]:
+    """obj_id, ra, dec and separation of the nearest source within match_radius"""
+    ids = parquet.read_table(photfile, columns=['obj_id', 'ra', 'dec'])
+    if ids.num_rows == 0:
+        return None
+    source_ra, source_dec = ids['ra'].to_numpy(), ids['dec'].to_numpy()
+    dist = separation(unit_vectors(source_ra, source_dec), unit_vectors(ra, dec)[0])
+    i = np.nanargmin(dist) if np.isfinite(dist).any() else None
+    if i is None or dist[i] > match_radius:
+        return None
+    return int(ids['obj_id'][i].as_py()), source_ra[i], source_dec[i], dist[i]
+
+
+def visit_lightcurve(
+    eclipse: int,
+    photfile: str,
+    ra: float,
+    dec: float,
+    band: str = 'NUV',
+    apersize: float = 12.8,
+    match_radius: float = MATCH_RADIUS,
+    unflagged: bool = True,
+) -> Optional[tuple[dict, pd.DataFrame]]:
+    """the nearest source's record and bin table in one eclipse, or None"""
+    if not os.path.exists(photfile):
+        return None
+    try:
+        expt = load_exptime(photfile, band, exptime_only=False)
+    except KeyError:  # no data in this band
+        return None
+    match = nearest_source(photfile, ra, dec, match_radius)
+    if match is None:
+        return None
+    obj_id, source_ra, source_dec, dist = match
+    records = lookup_lightcurves(photfile, [obj_id], band, apersize, unflagged=unflagged)
+    if obj_id not in records:
+        return None
+    visit = {
+        'eclipse': int(eclipse), 'obj_id': obj_id, 'ra': source_ra,
+        'dec': source_dec, 'separation': dist * 3600,
+    }
+    bins = expt[['t0', 't1', 'expt']].assign(
+        eclipse=int(eclipse), cps=records[obj_id]['cps'],
+        cps_err=records[obj_id]['cps_err'],
+    )
+    return visit, bins
+
+
+def stitch_position(
+    ra: float,
+    dec: float,
+    pointings: PointingIndex,
+    photfile: Callable[[int], str],
+    band: str = 'NUV',
+    apersize: float = 12.8,
+    match_radius: float = MATCH_RADIUS,
+    unflagged: bool = True,
+    n_workers: int = 8,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    the lightcurve of the nearest source to (ra, dec) in every eclipse that
+    covers it. photfile maps an eclipse to its photometry file; eclipses
+    whose file is absent, or with no source within match_radius (degrees),
+    are skipped. returns the time-sorted bins (eclipse, t0, t1, expt, cps,
+    cps_err) and one row per visit with the matched source, its separation
+    in arcsec, the offset of its first bin in the lightcurve, its number of
+    bins and its median cps.
+    """
+    eclipses = pointings.eclipses_covering(ra, dec)
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        found = list(pool.map(
+            lambda eclipse: visit_lightcurve(
+                eclipse, photfile(int(eclipse)), ra, dec, band, apersize,
+                match_radius, unflagged,
+            ),
+            eclipses,
+        ))
+    found = sorted(
+        (visit for visit in found if visit is not None),
+        key=lambda visit: visit[1]['t0'].iloc[0],
+    )
+    if not found:
+        return (
+            pd.DataFrame(columns=['eclipse', 't0', 't1', 'expt', 'cps', 'cps_err']),
+            pd.DataFrame(columns=VISIT_COLUMNS),
+        )
+    visits, offset = [], 0
+    for visit, bins in found:
+        visits.append(visit | {
+            'offset': offset, 'n_bins': len(bins),
+            'median_cps': np.nanmedian(bins['cps']) if bins['cps'].notna().any() else np.nan,
+        })
+        offset += len(bins)
+    lightcurve = pd.concat([bins for _, bins in found], ignore_index=True)
+    return (
+        lightcurve[['eclipse', 't0', 't1', 'expt', 'cps', 'cps_err']],
+        pd.DataFrame(visits, columns=VISIT_COLUMNS),
+    )
+
+
+def stitch_object(
+    gfcat_objid: str,
+    objects: pd.DataFrame,
+    pointings: PointingIndex,
+    photfile: Callable[[int], str],
+    **kwargs,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    stitch_position at the position of a GFCAT object, from the object
+    table (gfcat_object_table.csv: gfcat_objid, ra, dec)
+    """
+    row = objects.loc[objects['gfcat_objid'] == gfcat_objid]
+    if not len(row):
+        raise KeyError(gfcat_objid)
+    return stitch_position(
+        float(row['ra'].iloc[0]), float(row['dec'].iloc[0]), pointings, photfile, **kwargs
+    )
@@ -0,0 +1,253 @@
+"""
+feature-based artifact scoring of screening candidates, used by
+screen_variables(artifact_model=...).
+
+features are computed in batch from the candidates' (source, bin) cps
+matrix (brightness, coverage, outlier counts, spikiness, peak count,
+Anderson-Darling statistic, how much of the excess flux is in one bin)
+and from the positions and peak count rates of every source in the
+eclipse (number of other sources and candidates nearby, distance to the
+nearest bright star, position on the detector, number of candidates in
+the eclipse). a scikit-learn gradient-boosted tree classifier, trained on
+candidates sorted by visual QA, turns them into a probability that the
+candidate is a real variable; HistGradientBoosting handles the NaN
+features of sparse curves natively.
+
+QA labels come from the sorted QA GIF directories (flare / eclipse /
+trend / unk variable count as real, anything else as an artifact); files
+are named by make_gfcat as {estring}-{obj_id:05}-{band}-30s.gif. obj_ids
+repeat across eclipses, so sources are identified by (eclipse, obj_id).
+
+    labels = labels_from_sorted_qa("test_gifs/sorted/")
+    features = training_features(labels, photfile)
+    model = train_artifact_classifier(features, labels)
+    save_classifier(model, "artifact_classifier.joblib")
+"""
+import os
+from typing import Callable, Sequence
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import signal, stats
+from scipy.spatial import cKDTree
+from sklearn.ensemble import HistGradientBoostingClassifier
+
+from lightcurve_interface_skeleton import load_exptime, load_lightcurve_records
+
+REAL_CATEGORIES = ('flare', 'eclipse', 'trend', 'unk variable')
+# eliminate_dupes' bright-star threshold and clustering radius
+BRIGHT_CPS = 170
+NEIGHBOR_RADIUS = 40
+FEATURES = [
+    'max_cps', 'median_cps', 'excess_ratio', 'coverage', 'n_valid',
+    'duration', 'n_outliers', 'bunched_3_1', 'bunched_3_2', 'bunched_2_1',
+    'bunched_2_2', 'peak_bin_fraction', 'n_peaks', 'ad_statistic',
+    'n_neighbors', 'n_candidates_nearby', 'n_candidates', 'bright_distance',
+    'xcenter', 'ycenter', 'field_radius',
+]
+
+
+def bunched_counts(cps: np.ndarray, cps_err: np.ndarray, sigma: float, n: int) -> np.ndarray:
+    """
+    is_spiky's count, per source, of bins whose lower bound clears the upper
+    bounds of the bins n away on both sides
+    """
+    lower, upper = cps - sigma * cps_err, cps + sigma * cps_err
+    if cps.shape[1] <= 2 * n:
+        return np.zeros(len(cps), dtype=np.int64)
+    with np.errstate(invalid='ignore'):
+        middle = lower[:, n:-n]
+        bunched = (middle - upper[:, :-2 * n] > 0) & (middle - upper[:, 2 * n:] > 0)
+    return bunched.sum(axis=1)
+
+
+def lightcurve_features(
+    cps: np.ndarray, cps_err: np.ndarray, expt: pd.DataFrame, sigma: float = 3
+) -> pd.DataFrame:
+    """per-source features of a (source, bin) cps matrix"""
+    n_sources = len(cps)
+    valid = (cps != 0) & np.isfinite(cps)
+    n_valid = valid.sum(axis=1)
+    has_valid = n_valid > 0
+    first = np.argmax(valid, axis=1)
+    last = cps.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    t0, t1 = expt['t0'].to_numpy(), expt['t1'].to_numpy()
+    masked = np.where(valid, cps, np.nan)
+    with np.errstate(all='ignore'), warnings.catch_warnings():
+        # all-NaN rows give NaN features
+        warnings.simplefilter('ignore', RuntimeWarning)
+        max_cps = np.nanmax(masked, axis=1)
+        median_cps = np.nanmedian(masked, axis=1)
+        excess = np.clip(masked - median_cps[:, None], 0, None)
+        total_excess = np.nansum(excess, axis=1)
+        peak_bin_fraction = np.nanmax(excess, axis=1) / total_excess
+        # second smallest upper bound, as in screen_lightcurves' outlier test
+        upper = np.where(valid, cps + sigma * cps_err, np.inf)
+        second_min = np.sort(upper, axis=1)[:, 1] if cps.shape[1] > 1 else np.full(n_sources, np.inf)
+        n_outliers = (valid & (cps - sigma * cps_err > second_min[:, None])).sum(axis=1)
+    features = pd.DataFrame({
+        'max_cps': max_cps,
+        'median_cps': median_cps,
+        'excess_ratio': max_cps / median_cps,
+        'coverage': np.where(has_valid, n_valid / (last + 1 - first), np.nan),
+        'n_valid': n_valid,
+        'duration': np.where(has_valid, t1[last] - t0[first], np.nan),
+        'n_outliers': n_outliers,
+        'peak_bin_fraction': peak_bin_fraction,
+    })
+    for s, n in ((3, 1), (3, 2), (2, 1), (2, 2)):
+        features[f'bunched_{s}_{n}'] = bunched_counts(cps, cps_err, s, n)
+    n_peaks, ad = np.zeros(n_sources, dtype=np.int64), np.full(n_sources, np.nan)
+    for i in range(n_sources):
+        peak_ix, _ = signal.find_peaks(cps[i], prominence=3 * cps_err[i], distance=4)
+        n_peaks[i] = len(peak_ix)
+        if n_valid[i] > 1 and np.ptp(cps[i][valid[i]]) > 0:
+            ad[i] = stats.anderson(cps[i][valid[i]]).statistic
+    features['n_peaks'], features['ad_statistic'] = n_peaks, ad
+    return features
+
+
+def context_features(
+    candidates: pd.DataFrame,
+    sources: pd.DataFrame,
+    bright_cps: float = BRIGHT_CPS,
+    radius: float = NEIGHBOR_RADIUS,
+) -> pd.DataFrame:
+    """
+    features of each candidate's surroundings. candidates and sources (every
+    source in the eclipse) have xcenter, ycenter and, for sources, max_cps.
+    """
+    xy = candidates[['xcenter', 'ycenter']].to_numpy(np.float64)
+    source_xy = sources[['xcenter', 'ycenter']].to_numpy(np.float64)
+    # each candidate is also among the sources / candidates, so subtract itself
+    n_neighbors = np.array(
+        [len(hits) - 1 for hits in cKDTree(source_xy).query_ball_point(xy, radius)]
+    ) if len(source_xy) else np.zeros(len(xy), dtype=np.int64)
+    n_nearby = np.array(
+        [len(hits) - 1 for hits in cKDTree(xy).query_ball_point(xy, radius)]
+    ) if len(xy) else np.zeros(0, dtype=np.int64)
+    bright = source_xy[sources['max_cps'].to_numpy() > bright_cps]
+    if len(bright):
+        bright_distance, _ = cKDTree(bright).query(xy)
+    else:
+        bright_distance = np.full(len(xy), np.inf)
+    center = np.median(source_xy, axis=0) if len(source_xy) else np.zeros(2)
+    return pd.DataFrame({
+        'n_neighbors': np.maximum(n_neighbors, 0),
+        'n_candidates_nearby': np.maximum(n_nearby, 0),
+        'n_candidates': len(xy),
+        # the model cannot use inf; "no bright star" is just very far away
+        'bright_distance': np.minimum(bright_distance, 1e4),
+        'xcenter': xy[:, 0],
+        'ycenter': xy[:, 1],
+        'field_radius': np.hypot(*(xy - center).T),
+    })
+
+
+def source_context(lightcurves: Sequence[dict]) -> pd.DataFrame:
+    """positions and peak cps of lightcurve records, for context_features"""
+    return pd.DataFrame({
+        'xcenter': [lc['xcenter'] for lc in lightcurves],
+        'ycenter': [lc['ycenter'] for lc in lightcurves],
+        'max_cps': [np.nanmax(lc['cps']) if np.isfinite(lc['cps']).any() else np.nan
+                    for lc in lightcurves],
+    })
+
+
+def candidate_features(
+    candidates: Sequence[dict], expt: pd.DataFrame, sources: pd.DataFrame, sigma: float = 3
+) -> pd.DataFrame:
+    """the FEATURES of candidate lightcurve records, with their obj_ids"""
+    if len(candidates) == 0:
+        return pd.DataFrame(columns=['obj_id'] + FEATURES)
+    cps = np.stack([lc['cps'] for lc in candidates]).astype(np.float64)
+    cps_err = np.stack([lc['cps_err'] for lc in candidates]).astype(np.float64)
+    features = pd.concat([
+        lightcurve_features(cps, cps_err, expt, sigma),
+        context_features(source_context(candidates), sources),
+    ], axis=1)
+    features.insert(0, 'obj_id', [lc['obj_id'] for lc in candidates])
+    return features[['obj_id'] + FEATURES]
+
+
+def labels_from_sorted_qa(
+    path: str, real_categories: Sequence[str] = REAL_CATEGORIES
+) -> pd.DataFrame:
+    """
+    obj_id, eclipse, category and label (1 = real variable, 0 = artifact)
+    of every QA image under the subdirectories of a sorted QA directory
+    """
+    rows = []
+    for category in sorted(os.listdir(path)):
+        if not os.path.isdir(os.path.join(path, category)):
+            continue
+        for fn in os.listdir(os.path.join(path, category)):
+            fields = fn.split('-')
+            try:
+                eclipse, obj_id = int(fields[0].lstrip('e')), int(fields[1])
+            except (IndexError, ValueError):
+                continue
+            rows.append({
+                'obj_id': obj_id, 'eclipse': eclipse, 'category': category,
+                'label': int(category in real_categories),
+            })
+    return pd.DataFrame(rows, columns=['obj_id', 'eclipse', 'category', 'label'])
+
+
+def training_features(
+    labels: pd.DataFrame,
+    photfile: Callable[[int], str],
+    band: str = 'NUV',
+    apersize: float = 12.8,
+) -> pd.DataFrame:
+    """
+    features of labeled candidates, with their eclipse, read eclipse by
+    eclipse; photfile maps an eclipse to its photometry file. eclipses
+    without a file are skipped.
+    """
+    frames = []
+    for eclipse, group in labels.groupby('eclipse'):
+        fn = photfile(int(eclipse))
+        if not os.path.exists(fn):
+            continue
+        lightcurves = load_lightcurve_records(fn, band, apersize=apersize)
+        expt = load_exptime(fn, band, exptime_only=False)
+        wanted = set(group['obj_id'])
+        candidates = [lc for lc in lightcurves if lc['obj_id'] in wanted]
+        features = candidate_features(candidates, expt, source_context(lightcurves))
+        # n_candidates should describe the screening output, not the QA sample
+        features['n_candidates'] = len(group)
+        features.insert(0, 'eclipse', int(eclipse))
+        frames.append(features)
+    if not frames:
+        return pd.DataFrame(columns=['eclipse', 'obj_id'] + FEATURES)
+    return pd.concat(frames, ignore_index=True)
+
+
+def train_artifact_classifier(
+    features: pd.DataFrame, labels: pd.DataFrame, **kwargs
+) -> HistGradientBoostingClassifier:
+    """fit the classifier on features and labels joined by (eclipse, obj_id)"""
+    data = features.merge(labels[['eclipse', 'obj_id', 'label']], on=['eclipse', 'obj_id'])
+    model = HistGradientBoostingClassifier(**({'class_weight': 'balanced'} | kwargs))
+    model.fit(data[FEATURES].astype(np.float64), data['label'])
+    return model
+
+
+def score_candidates(
+    model: HistGradientBoostingClassifier, features: pd.DataFrame
+) -> np.ndarray:
+    """probability that each candidate is a real variable"""
+    if len(features) == 0:
+        return np.zeros(0)
+    return model.predict_proba(features[FEATURES].astype(np.float64))[:, 1]
+
+
+def save_classifier(model: HistGradientBoostingClassifier, filename: str):
+    joblib.dump(model, filename)
+
+
+def load_classifier(filename: str) -> HistGradientBoostingClassifier:
+    return joblib.load(filename)
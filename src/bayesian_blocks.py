@@ -0,0 +1,263 @@
+"""
+Bayesian-blocks segmentation (Scargle et al. 2013) of many binned
+lightcurves at once.
+
+the optimal-partition dynamic program is O(N^2) in the number of bins per
+lightcurve; here each step of it is one array operation across all
+sources, so a few thousand catalog visits segment in about a second.
+lightcurves of different lengths or with missing bins are handled by
+giving padded, unexposed and NaN bins zero weight: they cost nothing and
+join a neighbouring block, and edges are reported in valid bins only.
+
+fitness is 'gaussian' (point measures with errors, from cps and cps_err)
+or 'poisson' (binned counts, cps * expt, over exposure time). the
+per-change-point prior is set from the false-positive probability p0
+(Scargle et al. 2013, eq. 21) using each source's number of valid bins.
+
+    segments = segment_lightcurves(cps, cps_err, expt['expt'].to_numpy())
+    blocks = block_table(segments, expt['t0'].to_numpy(), expt['t1'].to_numpy())
+"""
+from typing import Literal, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def ncp_prior(n_valid: np.ndarray, p0: float = 0.05) -> np.ndarray:
+    """prior penalty per block for false-positive probability p0"""
+    n_valid = np.maximum(np.asarray(n_valid, dtype=np.float64), 1)
+    return 4 - np.log(73.53 * p0 * n_valid ** -0.478)
+
+
+def block_weights(
+    cps: np.ndarray,
+    cps_err: np.ndarray,
+    exptime: np.ndarray,
+    fitness: Literal['gaussian', 'poisson'] = 'gaussian',
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    per-bin terms of the block fitness and the valid-bin mask. for gaussian
+    fitness these are 1 / err**2 and cps / err**2, with err floored at one
+    count; for poisson fitness, exposure time and counts (clipped at zero,
+    since background-subtracted counts can be negative).
+    """
+    cps = np.asarray(cps, dtype=np.float64)
+    exptime = np.broadcast_to(np.asarray(exptime, dtype=np.float64), cps.shape)
+    valid = np.isfinite(cps) & (exptime > 0)
+    if fitness == 'poisson':
+        counts = np.where(valid, np.maximum(cps * exptime, 0), 0)
+        return np.where(valid, exptime, 0), counts, valid
+    floor = np.divide(1, exptime, out=np.zeros_like(exptime), where=exptime > 0)
+    err = np.maximum(np.where(valid, cps_err, 1), floor)
+    weights = np.where(valid, 1 / err ** 2, 0)
+    return weights, np.where(valid, cps, 0) * weights, valid
+
+
+def block_fitness(
+    a: np.ndarray, b: np.ndarray, fitness: Literal['gaussian', 'poisson'] = 'gaussian'
+) -> np.ndarray:
+    """
+    fitness of blocks with summed terms a and b (see block_weights);
+    empty blocks have zero fitness
+    """
+    out = np.zeros(np.broadcast(a, b).shape)
+    if fitness == 'poisson':
+        # N log(N / T), with 0 log 0 = 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.multiply(b, np.log(b / a), out=out, where=(a > 0) & (b > 0))
+        return out
+    np.divide(b * b, 2 * a, out=out, where=a > 0)
+    return out
+
+
+def optimal_partition(
+    a: np.ndarray, b: np.ndarray, prior: np.ndarray,
+    fitness: Literal['gaussian', 'poisson'] = 'gaussian',
+) -> np.ndarray:
+    """
+    the Bayesian-blocks dynamic program over a (source, bin) array. returns
+    the (source, bin) array of the start bin of the last block of the best
+    partition of bins 0..R, for backtracking.
+    """
+    n_sources, n_bins = a.shape
+    cum_a = np.zeros((n_sources, n_bins + 1))
+    cum_b = np.zeros((n_sources, n_bins + 1))
+    np.cumsum(a, axis=1, out=cum_a[:, 1:])
+    np.cumsum(b, axis=1, out=cum_b[:, 1:])
+    best = np.zeros((n_sources, n_bins + 1))
+    last = np.zeros((n_sources, n_bins), dtype=np.int64)
+    prior = np.asarray(prior, dtype=np.float64).reshape(-1, 1)
+    for r in range(n_bins):
+        # fitness of a final block running from each start bin through bin r
+        block = block_fitness(
+            cum_a[:, r + 1:r + 2] - cum_a[:, :r + 1],
+            cum_b[:, r + 1:r + 2] - cum_b[:, :r + 1],
+            fitness,
+        )
+        total = best[:, :r + 1] + block - prior
+        last[:, r] = np.argmax(total, axis=1)
+        best[:, r + 1] = total[np.arange(n_sources), last[:, r]]
+    return last
+
+
+def block_starts(last: np.ndarray, n_bins: int) -> np.ndarray:
+    """start bins of the blocks of the best partition of bins 0..n_bins-1"""
+    starts = []
+    end = n_bins
+    while end > 0:
+        start = last[end - 1]
+        starts.append(start)
+        end = start
+    return np.array(starts[::-1], dtype=np.int64)
+
+
+def segment_lightcurves(
+    cps: np.ndarray,
+    cps_err: np.ndarray,
+    exptime: np.ndarray,
+    p0: float = 0.05,
+    fitness: Literal['gaussian', 'poisson'] = 'gaussian',
+    n_bins: Optional[Sequence[int]] = None,
+) -> list[dict]:
+    """
+    Bayesian-blocks segmentation of each row of a (source, bin) cps matrix.
+    exptime is per bin, shared by all rows or a matrix of the same shape.
+    n_bins gives each row's true length if rows are padded. returns, per
+    source, the block boundaries in bins ('edges', n_blocks + 1 values),
+    each block's mean cps and error ('levels', 'level_errs') and exposure
+    ('expt').
+    """
+    cps = np.atleast_2d(np.asarray(cps, dtype=np.float64))
+    cps_err = np.atleast_2d(np.asarray(cps_err, dtype=np.float64))
+    a, b, valid = block_weights(cps, cps_err, exptime, fitness)
+    prior = ncp_prior(valid.sum(axis=1), p0)
+    last = optimal_partition(a, b, prior, fitness)
+    # the level of each block is the inverse-variance weighted mean
+    weights, weighted, _ = block_weights(cps, cps_err, exptime, 'gaussian')
+    exptime = np.broadcast_to(np.asarray(exptime, dtype=np.float64), cps.shape)
+    if n_bins is None:
+        n_bins = np.full(len(cps), cps.shape[1])
+    segments = []
+    for i in range(len(cps)):
+        # trim unexposed or padded bins off both ends of the visit
+        ix = np.flatnonzero(valid[i, :n_bins[i]])
+        if len(ix) == 0:
+            segments.append({
+                'edges': np.array([], dtype=np.int64), 'levels': np.array([]),
+                'level_errs': np.array([]), 'expt': np.array([]),
+            })
+            continue
+        starts = block_starts(last[i], ix[-1] + 1)
+        starts = starts[starts <= ix[0]][-1:].tolist() + starts[starts > ix[0]].tolist()
+        edges = np.array([ix[0]] + starts[1:] + [ix[-1] + 1], dtype=np.int64)
+        w = np.add.reduceat(weights[i], edges[:-1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            levels = np.add.reduceat(weighted[i], edges[:-1]) / w
+            level_errs = 1 / np.sqrt(w)
+        segments.append({
+            'edges': edges,
+            'levels': levels,
+            'level_errs': level_errs,
+            'expt': np.add.reduceat(np.where(valid[i], exptime[i], 0), edges[:-1]),
+        })
+    return segments
+
+
+def quiescent_level(segment: dict) -> tuple[float, float]:
+    """level and error of the block with the most exposure time"""
+    if len(segment['levels']) == 0:
+        return np.nan, np.nan
+    i = np.argmax(segment['expt'])
+    return segment['levels'][i], segment['level_errs'][i]
+
+
+def flare_blocks(segment: dict, sigma: float = 3) -> list[list[int]]:
+    """
+    bin ranges (as from function_defs.find_ix_ranges) of runs of blocks
+    whose level is more than sigma combined errors above the quiescent level
+    """
+    q, q_err = quiescent_level(segment)
+    edges, ranges = segment['edges'], []
+    with np.errstate(invalid='ignore'):
+        high = segment['levels'] - sigma * np.hypot(segment['level_errs'], q_err) > q
+    for i in np.flatnonzero(high):
+        bins = list(range(edges[i], edges[i + 1]))
+        if ranges and ranges[-1][-1] + 1 == bins[0]:
+            ranges[-1] += bins
+        else:
+            ranges.append(bins)
+    return ranges
+
+
+def segment_records(
+    lightcurves: Sequence[dict],
+    expt: Optional[pd.DataFrame] = None,
+    p0: float = 0.05,
+    fitness: Literal['gaussian', 'poisson'] = 'gaussian',
+) -> list[dict]:
+    """
+    segment lightcurve records in one pass. records that carry their own
+    't0', 't1' and 'expt' arrays (as from lightcurve_store.LightcurveStore)
+    may come from different visits and have different lengths; otherwise
+    all share the exposure time table expt. each result also has the block
+    boundaries in time ('t0', 't1') and the quiescent level ('quiescence').
+    """
+    if len(lightcurves) == 0:
+        return []
+    axes = [
+        (lc['t0'], lc['t1'], lc['expt']) if 'expt' in lc
+        else (expt['t0'].to_numpy(), expt['t1'].to_numpy(), expt['expt'].to_numpy())
+        for lc in lightcurves
+    ]
+    n_bins = np.array([len(lc['cps']) for lc in lightcurves])
+    shape = (len(lightcurves), n_bins.max())
+    cps, cps_err = np.full(shape, np.nan), np.full(shape, np.nan)
+    exptime = np.zeros(shape)
+    for i, (lc, (_, _, e)) in enumerate(zip(lightcurves, axes)):
+        cps[i, :n_bins[i]] = lc['cps']
+        cps_err[i, :n_bins[i]] = lc['cps_err']
+        exptime[i, :n_bins[i]] = e
+    segments = segment_lightcurves(cps, cps_err, exptime, p0, fitness, n_bins=n_bins)
+    for segment, (t0, t1, _) in zip(segments, axes):
+        edges = segment['edges']
+        segment['t0'] = np.asarray(t0)[edges[:-1]]
+        segment['t1'] = np.asarray(t1)[edges[1:] - 1]
+        segment['quiescence'] = quiescent_level(segment)[0]
+    return segments
+
+
+def block_table(
+    segments: Sequence[dict],
+    t0: Optional[np.ndarray] = None,
+    t1: Optional[np.ndarray] = None,
+    ids: Optional[Sequence] = None,
+) -> pd.DataFrame:
+    """
+    one row per block: source (position, or ids[position]), bin range,
+    times (from the segments, or from shared t0 / t1 arrays), level, error
+    and exposure
+    """
+    frames = []
+    for i, segment in enumerate(segments):
+        edges = segment['edges']
+        if len(edges) == 0:
+            continue
+        frame = pd.DataFrame({
+            'source': i if ids is None else ids[i],
+            'start_bin': edges[:-1],
+            'stop_bin': edges[1:],
+            'level': segment['levels'],
+            'level_err': segment['level_errs'],
+            'expt': segment['expt'],
+        })
+        if 't0' in segment:
+            frame['t0'], frame['t1'] = segment['t0'], segment['t1']
+        elif t0 is not None:
+            frame['t0'] = np.asarray(t0)[edges[:-1]]
+            frame['t1'] = np.asarray(t1)[edges[1:] - 1]
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(
+            columns=['source', 'start_bin', 'stop_bin', 'level', 'level_err', 'expt', 't0', 't1']
+        )
+    return pd.concat(frames, ignore_index=True)
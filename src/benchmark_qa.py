@@ -0,0 +1,182 @@
+"""
+benchmark of the QA rendering stage on synthetic image files.
+
+writes synthetic -nd-full.fits.gz and -nd-30s.fits.gz files (see
+synthetic_images.py), then times read_image on each, rendering of every
+animated QA frame for one source (make_gfcat.render_qa_frame), and GIF
+assembly (make_gfcat.compile_qa_gif). the inputs are generated, and each
+stage is run, in a freshly spawned process, so the peak resident memory
+recorded for a stage is that stage's own (over a baseline of the shared
+imports, recorded as peak_rss_mb_baseline). results are written as JSON in
+the same layout as benchmark_screening.py, so load_results /
+compare_results work on both.
+
+    python benchmark_qa.py --output qa_bench.json --imsz 3200 --n-frames 55
+"""
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Callable, Optional
+
+from matplotlib import gridspec
+import numpy as np
+
+from benchmark_screening import environment
+from gfcat_utils import read_image
+from make_gfcat import compile_qa_gif, render_qa_frame
+from synthetic_images import make_synthetic_image
+
+
+def peak_rss_mb() -> float:
+    """peak resident set size of this process so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def timed(func) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def measured(func: Callable, *args) -> tuple[object, float]:
+    """func(*args) and the peak RSS of the process that ran it"""
+    return func(*args), peak_rss_mb()
+
+
+def in_fresh_process(func: Callable, *args) -> tuple[object, float]:
+    """
+    run func(*args) in a newly spawned process, so its peak RSS reflects
+    that call alone (plus the imports every stage shares)
+    """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(measured, func, *args).result()
+
+
+def generate_inputs(
+    tmpdir: str, imsz: int, n_frames: int, n_stars: int, seed: int
+) -> tuple[str, str]:
+    full_fn = f'{tmpdir}/e01234-nd-full.fits.gz'
+    movie_fn = f'{tmpdir}/e01234-nd-30s.fits.gz'
+    make_synthetic_image(full_fn, 1, (imsz, imsz), n_stars, seed=seed)
+    make_synthetic_image(movie_fn, n_frames, (imsz, imsz), n_stars, seed=seed)
+    return full_fn, movie_fn
+
+
+def time_read_image(fn: str) -> float:
+    elapsed, _ = timed(lambda: read_image(fn))
+    return elapsed
+
+
+def time_render_qa_frames(
+    movie_fn: str, tmpdir: str, boxsz: int, seed: int
+) -> tuple[list[str], list[float], float]:
+    """
+    render every frame of the movie for one synthetic source. returns the
+    frame filenames, per-frame times, and the peak RSS once the movie was
+    read (the input to rendering, not part of it).
+    """
+    movie, _, _, _, tranges, _ = read_image(movie_fn)
+    input_rss = peak_rss_mb()
+    n_frames, imsz = len(movie), movie.shape[-1]
+    # one source near the middle of the field with a flare-like lightcurve
+    imgx = imgy = imsz / 2 + 17
+    rng = np.random.default_rng(seed)
+    t = np.array([tr[0] for tr in tranges])
+    cps = 2 + 10 * np.exp(-np.abs(np.arange(n_frames) - n_frames / 3) / 3)
+    curve = {'NUV': {'t': t, 'cps': rng.normal(cps, 0.3), 'cps_err': np.full(n_frames, 0.3)}}
+    min_i, max_i = np.argmin(curve['NUV']['cps']), np.argmax(curve['NUV']['cps'])
+    box = (max(int(imgy - boxsz), 0), min(int(imgy + boxsz), imsz),
+           max(int(imgx - boxsz), 0), min(int(imgx + boxsz), imsz))
+    full_box = (0, imsz, 0, imsz)
+    gs = gridspec.GridSpec(nrows=4, ncols=6)
+    frame_fns, frame_times = [], []
+    for i, frame in enumerate(movie):
+        frame_fn = f'{tmpdir}/e01234-00001-n-30s-{str(i).zfill(2)}.jpg'
+        elapsed, _ = timed(lambda: render_qa_frame(
+            frame, i, curve, 'NUV', box, full_box, min_i, max_i, frame_fn,
+            gs=gs, boxsz=boxsz
+        ))
+        frame_fns.append(frame_fn)
+        frame_times.append(elapsed)
+    return frame_fns, frame_times, input_rss
+
+
+def time_compile_qa_gif(frame_fns: list[str], gif_fn: str) -> float:
+    elapsed, _ = timed(lambda: compile_qa_gif(frame_fns, gif_fn))
+    return elapsed
+
+
+def run_qa_benchmark(
+    output: str = 'qa_benchmark.json',
+    imsz: int = 3200,
+    n_frames: int = 55,
+    n_stars: int = 2000,
+    boxsz: int = 200,
+    workdir: Optional[str] = None,
+    seed: int = 19470622,
+) -> dict:
+    """generate synthetic images, time the QA stages and write JSON to `output`"""
+    case = {'imsz': imsz, 'n_frames': n_frames, 'n_stars': n_stars, 'seed': seed}
+    timings = {}
+    with tempfile.TemporaryDirectory(dir=workdir) as tmpdir:
+        (full_fn, movie_fn), _ = in_fresh_process(
+            generate_inputs, tmpdir, imsz, n_frames, n_stars, seed
+        )
+        case['file_size_full'] = os.path.getsize(full_fn)
+        case['file_size_movie'] = os.path.getsize(movie_fn)
+        # what every stage's process holds before doing anything
+        _, case['peak_rss_mb_baseline'] = in_fresh_process(peak_rss_mb)
+
+        for name, fn in (('full', full_fn), ('30s', movie_fn)):
+            elapsed, rss = in_fresh_process(time_read_image, fn)
+            timings[f'read_image[{name}]'] = {'total': elapsed, 'peak_rss_mb': rss}
+        (frame_fns, frame_times, input_rss), rss = in_fresh_process(
+            time_render_qa_frames, movie_fn, tmpdir, boxsz, seed
+        )
+        timings['render_qa_frame'] = {
+            'total': float(np.sum(frame_times)),
+            'per_frame_median': float(np.median(frame_times)),
+            'per_frame_max': float(np.max(frame_times)),
+            'peak_rss_mb': rss,
+            'input_peak_rss_mb': input_rss,
+        }
+        elapsed, rss = in_fresh_process(
+            time_compile_qa_gif, frame_fns, f'{tmpdir}/e01234-00001-n-30s.gif'
+        )
+        timings['compile_qa_gif'] = {'total': elapsed, 'peak_rss_mb': rss}
+    # 'median' mirrors benchmark_screening's layout for compare_results
+    case['timings'] = {
+        k: v | {'median': v['total'], 'min': v['total'], 'mean': v['total'], 'repeat': 1}
+        for k, v in timings.items()
+    }
+    case['n_sources'], case['n_bins'] = 1, n_frames
+    report = {'environment': environment(), 'cases': [case]}
+    with open(output, 'w') as stream:
+        json.dump(report, stream, indent=2)
+    for name, timing in timings.items():
+        print(f"{name}: {timing['total']:.2f}s, peak RSS {timing['peak_rss_mb']:.0f} MB")
+    return report
+
+
+def main(
+    *,
+    output: str = 'qa_benchmark.json',
+    imsz: int = 3200,
+    n_frames: int = 55,
+    n_stars: int = 2000,
+):
+    run_qa_benchmark(output=output, imsz=imsz, n_frames=n_frames, n_stars=n_stars)
+
+
+# tell clize to handle command line call
+if __name__ == "__main__":
+    from clize import run
+    run(main)
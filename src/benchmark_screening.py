@@ -0,0 +1,237 @@
+"""
+reproducible benchmarks for the screening pipeline on synthetic photometry.
+
+generates synthetic -30s-photom.parquet files (see synthetic_photometry.py)
+for a grid of source and bin counts, times load_lightcurve_records,
+screen_variables, eliminate_dupes and the flare characterization functions
+from gfcat_paper/src/function_defs.py, and writes the timings to a JSON file
+along with enough environment information to compare runs across releases.
+
+`SCREENING_VARIANTS` maps a variant name to extra keyword arguments for
+screen_variables, so optimized code paths can be timed side by side with the
+reference implementation on identical inputs.
+
+    python benchmark_screening.py --output bench.json --n-sources 1000,10000
+"""
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from lightcurve_interface_skeleton import (
+    eliminate_dupes, load_exptime, load_lightcurve_records, screen_variables
+)
+from synthetic_photometry import make_synthetic_photometry
+
+# the flare functions live with the paper code
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gfcat_paper', 'src'))
+
+# name -> extra screen_variables kwargs; 'reference' is the baseline
+SCREENING_VARIANTS = {
+    'reference': {},
+    'streaming': {'streaming': True, 'batch_size': 2000},
+    'prefilter': {'prefilter': True},
+    'numba': {'backend': 'numba'},
+    'shared_memory': {'n_workers': os.cpu_count()},
+    'multicadence': {'cadences': (30, 120, 300)},
+    'matched_filter': {'detector': 'matched_filter'},
+}
+
+
+def time_call(func: Callable, repeat: int = 3) -> dict:
+    """wall-clock timings of `repeat` calls of func()"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {
+        'min': min(times), 'median': float(np.median(times)),
+        'mean': float(np.mean(times)), 'repeat': repeat,
+    }
+
+
+def environment() -> dict:
+    import pyarrow
+    import scipy
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.datetime.now().isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'pandas': pd.__version__,
+        'pyarrow': pyarrow.__version__,
+    }
+
+
+def candidate_table(lightcurves: list[dict]) -> dict:
+    """an eliminate_dupes input table built from every source in an eclipse"""
+    return {
+        'id': [lc['obj_id'] for lc in lightcurves],
+        'cps': [float(np.nanmedian(lc['cps'])) for lc in lightcurves],
+        'xcenter': [lc['xcenter'] for lc in lightcurves],
+        'ycenter': [lc['ycenter'] for lc in lightcurves],
+        'delta_cps': [
+            float(np.nanmin(lc['cps']) - np.nanmax(lc['cps'])) for lc in lightcurves
+        ],
+    }
+
+
+def flare_frame(lc: dict, expt: pd.DataFrame) -> pd.DataFrame:
+    """the per-bin DataFrame layout expected by function_defs' flare functions"""
+    frame = pd.DataFrame({
+        't0': expt['t0'], 't1': expt['t1'], 'expt': expt['expt'],
+        'cps': lc['cps'], 'cps_err': lc['cps_err'],
+    })
+    frame['counts'] = frame['cps'] * frame['expt']
+    frame['cps_apcorrected'] = frame['cps']
+    return frame.replace([np.inf, -np.inf], np.nan).fillna(0)
+
+
+def bench_flares(lightcurves: list[dict], expt: pd.DataFrame, n_curves: int = 20):
+    from function_defs import calculate_flare_energy, refine_flare_ranges
+
+    brightest = sorted(
+        lightcurves, key=lambda lc: -np.nanmax(np.where(np.isfinite(lc['cps']), lc['cps'], 0))
+    )[:n_curves]
+    frames = [flare_frame(lc, expt) for lc in brightest]
+
+    def run():
+        for frame in frames:
+            ranges, q, q_err = refine_flare_ranges(frame, makeplot=False)
+            for frange in ranges:
+                calculate_flare_energy(frame, frange, distance=10, quiescence=(q, q_err))
+
+    return run
+
+
+def run_case(
+    photfile: str, band: str, apersize: float, repeat: int, flares: bool
+) -> dict:
+    results = {}
+    results['load_lightcurve_records'] = time_call(
+        lambda: load_lightcurve_records(photfile, band, apersize=apersize), repeat
+    )
+    for name, kwargs in SCREENING_VARIANTS.items():
+        results[f'screen_variables[{name}]'] = time_call(
+            lambda: screen_variables(photfile, band, aper_radius=apersize, **kwargs),
+            repeat,
+        )
+    lightcurves = load_lightcurve_records(photfile, band, apersize=apersize)
+    table = candidate_table(lightcurves)
+    results['eliminate_dupes'] = time_call(lambda: eliminate_dupes(table, {}), repeat)
+    if flares:
+        expt = load_exptime(photfile, band, exptime_only=False)
+        results['flare_functions'] = time_call(bench_flares(lightcurves, expt), repeat)
+    return results
+
+
+def run_benchmarks(
+    output: str = 'screening_benchmark.json',
+    n_sources: tuple[int] = (1000, 10000),
+    n_bins: tuple[int] = (55,),
+    flare_rate: float = 0.005,
+    artifact_rate: float = 0.005,
+    band: str = 'NUV',
+    apersize: float = 12.8,
+    repeat: int = 3,
+    flares: bool = True,
+    workdir: Optional[str] = None,
+    seed: int = 19470622,
+) -> dict:
+    """run the benchmark grid and write results to `output` as JSON"""
+    report = {'environment': environment(), 'cases': []}
+    with tempfile.TemporaryDirectory(dir=workdir) as tmpdir:
+        for n_src in n_sources:
+            for n_bin in n_bins:
+                photfile = f'{tmpdir}/e01234-{n_src}-{n_bin}-30s-photom.parquet'
+                make_synthetic_photometry(
+                    photfile, n_sources=n_src, n_bins=n_bin, flare_rate=flare_rate,
+                    artifact_rate=artifact_rate, seed=seed,
+                )
+                case = {
+                    'n_sources': n_src, 'n_bins': n_bin, 'flare_rate': flare_rate,
+                    'artifact_rate': artifact_rate, 'band': band, 'apersize': apersize,
+                    'seed': seed, 'file_size': os.path.getsize(photfile),
+                }
+                case['timings'] = run_case(photfile, band, apersize, repeat, flares)
+                report['cases'].append(case)
+                print(f"{n_src} sources x {n_bin} bins: " + ", ".join(
+                    f"{k} {v['median']:.3f}s" for k, v in case['timings'].items()
+                ))
+    with open(output, 'w') as stream:
+        json.dump(report, stream, indent=2)
+    return report
+
+
+def load_results(filename: str) -> pd.DataFrame:
+    """flatten a benchmark JSON file to one row per (case, timed function)"""
+    with open(filename) as stream:
+        report = json.load(stream)
+    rows = []
+    for case in report['cases']:
+        for name, timing in case['timings'].items():
+            rows.append({
+                'n_sources': case['n_sources'], 'n_bins': case['n_bins'],
+                'function': name, **timing,
+            })
+    return pd.DataFrame(rows)
+
+
+def compare_results(baseline: str, candidate: str, stat: str = 'median') -> pd.DataFrame:
+    """
+    speedup of `candidate` over `baseline` for every case and function they
+    share (> 1 is faster)
+    """
+    keys = ['n_sources', 'n_bins', 'function']
+    merged = load_results(baseline).merge(
+        load_results(candidate), on=keys, suffixes=('_baseline', '_candidate')
+    )
+    merged['speedup'] = merged[f'{stat}_baseline'] / merged[f'{stat}_candidate']
+    return merged[keys + [f'{stat}_baseline', f'{stat}_candidate', 'speedup']]
+
+
+def main(
+    *,
+    output: str = 'screening_benchmark.json',
+    n_sources: str = '1000,10000',
+    n_bins: str = '55',
+    flare_rate: float = 0.005,
+    artifact_rate: float = 0.005,
+    repeat: int = 3,
+    no_flares: bool = False,
+):
+    run_benchmarks(
+        output=output,
+        n_sources=tuple(map(int, n_sources.split(','))),
+        n_bins=tuple(map(int, n_bins.split(','))),
+        flare_rate=flare_rate,
+        artifact_rate=artifact_rate,
+        repeat=repeat,
+        flares=not no_flares,
+    )
+
+
+# tell clize to handle command line call
+if __name__ == "__main__":
+    from clize import run
+    run(main)
@@ -1,16 +1,19 @@
+import numpy as np
+import pandas as pd
 import astropy.units as u
-from astropy.coordinates import SkyCoord
-from astroquery.gaia import Gaia
-Gaia.ROW_LIMIT = 200  # Ensure the default row limit.
+from query_cache import default_cache
 
 mdw_data = pd.read_csv('/Users/cm/github/gfcat_mdwarfs/src/mdw.csv',index_col=0)
 
+# Gaia cone searches are memoized on disk, so rebuilding the catalog only queries
+# the archive for positions that have not been seen before.
+cache = default_cache()
+radius = u.Quantity(0.2, u.deg).value
+cache.prefetch('gaia', zip(mdw_data['galex_ra'], mdw_data['galex_dec']), radius, delay=0)
+
 for i in range(len(mdw_data)):
     source = mdw_data.iloc[i]
-    coord = SkyCoord(source['galex_ra'], source['galex_dec'], unit=u.deg)
-    radius = u.Quantity(0.2, u.deg)
-    j = Gaia.cone_search_async(coord, radius)
-    r = j.get_results()
+    r = cache.query('gaia', source['galex_ra'], source['galex_dec'], radius)
     # match on the source that is closest to the estimate distance from prior catalogs... probably right...
     distance = source['cat_distance'] if np.isnan(source['distance']) else source['distance']
     distance = source['cat_distance']
@@ -0,0 +1,113 @@
+"""
+matched-filter flare detection over the (source, bin) cps matrix of an
+eclipse, used by screen_variables(detector='matched_filter').
+
+each lightcurve, less its median, is correlated with a small bank of
+fast-rise exponential-decay templates, weighting bins by 1 / cps_err**2.
+the statistic at bin j for template s is the usual matched-filter SNR
+
+    sum_k w[j+k] (cps[j+k] - median) s[k] / sqrt(sum_k w[j+k] s[k]**2)
+
+with the template peak at bin j. the correlation is done one template tap
+at a time across all sources and bins, so an eclipse costs
+n_templates * template length vectorized passes over the matrix.
+unexposed and NaN bins get zero weight. cps_err is floored at one count
+per bin, so that bins with no counts do not get infinite weight.
+
+    snr, template, peak = matched_filter(cps, cps_err, expt['expt'].to_numpy())
+"""
+from typing import Sequence
+
+import numpy as np
+
+# e-folding decay times of the template bank, in bins
+FLARE_DECAYS = (1, 2, 4, 8)
+# e-folding rise time, in bins; flares are unresolved on the rise at 30 s
+FLARE_RISE = 0.5
+# templates are truncated this many e-folding times from the peak
+TEMPLATE_EXTENT = 3
+# peak SNR above which a source is a candidate
+MIN_FLARE_SNR = 7
+
+
+def flare_template(decay: float, rise: float = FLARE_RISE) -> tuple[np.ndarray, int]:
+    """unit-peak FRED template sampled at bin centers, and its peak index"""
+    n_rise = int(np.ceil(TEMPLATE_EXTENT * rise))
+    n_decay = int(np.ceil(TEMPLATE_EXTENT * decay))
+    t = np.arange(-n_rise, n_decay + 1, dtype=np.float64)
+    shape = np.where(t < 0, np.exp(t / max(rise, 1e-3)), np.exp(-t / decay))
+    return shape, n_rise
+
+
+def flare_templates(
+    decays: Sequence[float] = FLARE_DECAYS, rise: float = FLARE_RISE
+) -> list[tuple[np.ndarray, int]]:
+    """the template bank: (shape, peak index) per decay time"""
+    return [flare_template(decay, rise) for decay in decays]
+
+
+def filter_weights(
+    cps: np.ndarray, cps_err: np.ndarray, exptime: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    median-subtracted cps and inverse-variance weights, both zero in
+    unexposed or non-finite bins
+    """
+    exptime = np.asarray(exptime, dtype=np.float64)
+    valid = np.isfinite(cps) & (exptime > 0)
+    floor = np.divide(1, exptime, out=np.zeros_like(exptime), where=exptime > 0)
+    err = np.maximum(np.where(valid, cps_err, 1), floor)
+    weights = np.where(valid, 1 / err ** 2, 0)
+    with np.errstate(all='ignore'):
+        # all-NaN rows have no valid bins and so no weight anyway
+        baseline = np.nanmedian(np.where(valid, cps, np.nan), axis=1, keepdims=True)
+    residual = np.where(valid, cps - np.nan_to_num(baseline), 0)
+    return residual, weights
+
+
+def correlate_template(
+    weighted: np.ndarray, weights: np.ndarray, shape: np.ndarray, peak: int
+) -> np.ndarray:
+    """matched-filter SNR of one template at every bin of every source"""
+    n_bins = weighted.shape[1]
+    pad = ((0, 0), (peak, len(shape) - peak - 1))
+    weighted, weights = np.pad(weighted, pad), np.pad(weights, pad)
+    signal = np.zeros((weighted.shape[0], n_bins))
+    norm = np.zeros((weighted.shape[0], n_bins))
+    for k, s in enumerate(shape):
+        signal += s * weighted[:, k:k + n_bins]
+        norm += s * s * weights[:, k:k + n_bins]
+    return np.divide(signal, np.sqrt(norm), out=np.zeros_like(signal), where=norm > 0)
+
+
+def matched_filter(
+    cps: np.ndarray,
+    cps_err: np.ndarray,
+    exptime: np.ndarray,
+    decays: Sequence[float] = FLARE_DECAYS,
+    rise: float = FLARE_RISE,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    peak matched-filter SNR over bins and templates for each row of a
+    (source, bin) cps matrix, with the index (into decays) of the template
+    and the bin at which it is reached
+    """
+    residual, weights = filter_weights(
+        np.asarray(cps, dtype=np.float64), np.asarray(cps_err, dtype=np.float64), exptime
+    )
+    weighted = residual * weights
+    n_sources = residual.shape[0]
+    best_snr = np.full(n_sources, -np.inf)
+    best_template = np.zeros(n_sources, dtype=np.int64)
+    best_bin = np.zeros(n_sources, dtype=np.int64)
+    if residual.shape[1] == 0:
+        return np.zeros(n_sources), best_template, best_bin
+    for i, (shape, peak) in enumerate(flare_templates(decays, rise)):
+        snr = correlate_template(weighted, weights, shape, peak)
+        peak_bin = np.argmax(snr, axis=1)
+        peak_snr = snr[np.arange(n_sources), peak_bin]
+        better = peak_snr > best_snr
+        best_snr[better] = peak_snr[better]
+        best_template[better] = i
+        best_bin[better] = peak_bin[better]
+    return best_snr, best_template, best_bin
@@ -0,0 +1,293 @@
+"""
+joint FUV/NUV screening of one -30s-photom.parquet file.
+
+both bands' columns are read in a single pass. each band is screened with
+the same cuts as screen_variables, and the bands are then compared source by
+source: an NUV candidate is "confirmed" by FUV if the FUV curve has outlier
+bins (by the screen_lightcurves outlier heuristic) within a bin of its NUV
+outlier bins. the FUV/NUV flux ratio columns that the catalog notebooks
+(003 - Add lightcurve statistics to all visits) used to compute afterwards
+are returned for every variable.
+
+    varix, rejects, table = screen_joint("e23456/e23456-30s-photom.parquet")
+"""
+from time import perf_counter
+from typing import Literal, Optional
+
+import numpy as np
+import pandas as pd
+from pyarrow import parquet
+
+from gPhoton.types import Pathlike
+from lightcurve_interface_skeleton import (
+    VARIABLE_PIPE_ID_FIELDS,
+    declump_candidates,
+    lightcurve_records,
+    load_exptime,
+    screen_lightcurves,
+    screen_lightcurves_compiled,
+    unflagged_columns,
+    unflagged_filter,
+)
+from screening_metrics import ScreeningMetrics
+
+# cps to erg/s/cm^2/A, as in function_defs.counts2flux
+FLUX_SCALE = {'FUV': 1.4e-15, 'NUV': 2.06e-16}
+RATIO_COLUMNS = (
+    'ratio_min', 'ratio_min_err', 'ratio_max', 'ratio_max_err',
+    'ratio_at_nuv_max', 'ratio_at_nuv_max_err',
+)
+JOINT_COLUMNS = (
+    list(VARIABLE_PIPE_ID_FIELDS)
+    + [
+        f'{stat}_{band}' for band in ('NUV', 'FUV')
+        for stat in ('variable', 'reject', 'max_cps', 'median_cps', 'n_outliers')
+    ]
+    + ['fuv_covered', 'fuv_confirmed', 'fuv_check']
+    + list(RATIO_COLUMNS)
+)
+
+
+def load_band_records(
+    lightcurve_parquet: Pathlike,
+    bands: tuple[str, ...] = ('NUV', 'FUV'),
+    apersize: float = 12.8,
+) -> dict[str, tuple[list[dict], pd.DataFrame]]:
+    """
+    lightcurve records and exposure time tables for several bands from one
+    read of a lightcurve parquet file. each band keeps the sources that are
+    unflagged in that band. bands missing from the file are left out.
+    """
+    file = parquet.ParquetFile(lightcurve_parquet)
+    metadata = file.schema_arrow.metadata
+    band_columns = {}
+    for band in bands:
+        if f'{band.lower()}_exptime'.encode('ascii') not in metadata:
+            continue
+        columns, full, edge, mask = unflagged_columns(file, apersize, band)
+        if full not in file.schema.names:
+            continue
+        band_columns[band] = columns, full, edge, mask
+    columns = list(dict.fromkeys(
+        col for spec in band_columns.values() for col in spec[0]
+    ))
+    tab = file.read(columns=columns)
+    records = {}
+    for band, (columns, full, edge, mask) in band_columns.items():
+        band_tab = tab.select(columns)
+        band_tab = band_tab.filter(unflagged_filter(band_tab, full, edge, mask))
+        expt = load_exptime(lightcurve_parquet, band, exptime_only=False)
+        records[band] = (
+            lightcurve_records(band_tab.to_pandas(), expt['expt'].to_numpy()), expt
+        )
+    return records
+
+
+def outlier_bins(lc: dict, sigma: float = 3) -> np.ndarray:
+    """bins that pass the screen_lightcurves outlier test at `sigma`"""
+    ix = np.where((lc['cps'] != 0) & (np.isfinite(lc['cps'])))[0]
+    if len(ix) < 2:
+        return np.array([], dtype=int)
+    sigma_err = lc['cps_err'] * sigma
+    second_min = np.sort((lc['cps'] + sigma_err)[ix])[1]
+    return ix[(lc['cps'] - sigma_err)[ix] > second_min]
+
+
+def flux_ratios(
+    nuv: dict, fuv: dict, nuv_expt: pd.DataFrame, fuv_expt: pd.DataFrame
+) -> dict:
+    """
+    FUV/NUV flux ratio at the minimum and maximum ratio and at the NUV
+    maximum, over bins common to both bands
+    """
+    ratios = dict.fromkeys(RATIO_COLUMNS, np.nan)
+    _, nix, fix = np.intersect1d(
+        nuv_expt['t0'], fuv_expt['t0'], return_indices=True
+    )
+    # the last common bin is usually a partial one
+    nix, fix = nix[:-1], fix[:-1]
+    if len(nix) == 0:
+        return ratios
+    nuv_flux = nuv['cps'][nix] * FLUX_SCALE['NUV']
+    fuv_flux = fuv['cps'][fix] * FLUX_SCALE['FUV']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = fuv_flux / nuv_flux
+        ratio_err = ratio * np.sqrt(
+            (nuv['cps_err'][nix] / nuv['cps'][nix]) ** 2
+            + (fuv['cps_err'][fix] / fuv['cps'][fix]) ** 2
+        )
+    finite = np.isfinite(ratio)
+    if not finite.any():
+        return ratios
+    nonzero = np.nonzero(finite & (ratio != 0))[0]
+    if len(nonzero):
+        i = nonzero[np.argmin(ratio[nonzero])]
+        ratios['ratio_min'], ratios['ratio_min_err'] = ratio[i], ratio_err[i]
+    finite = np.nonzero(finite)[0]
+    i = finite[np.argmax(ratio[finite])]
+    ratios['ratio_max'], ratios['ratio_max_err'] = ratio[i], ratio_err[i]
+    i = finite[np.argmax(nuv['cps'][nix][finite])]
+    ratios['ratio_at_nuv_max'], ratios['ratio_at_nuv_max_err'] = ratio[i], ratio_err[i]
+    return ratios
+
+
+def fuv_excursion(
+    nuv: dict, fuv: dict, nuv_expt: pd.DataFrame, fuv_expt: pd.DataFrame,
+    sigma: float = 3,
+) -> tuple[bool, bool, bool]:
+    """
+    whether FUV has valid data in any NUV outlier bin ("covered"), whether
+    FUV has an outlier bin within one bin of an NUV outlier bin
+    ("confirmed"), and whether FUV could have seen the excursion
+    ("sensitive"): FUV passes the screening dim cut, and in some covered
+    bin the NUV excursion over the NUV median, scaled to the FUV median,
+    exceeds sigma FUV errors
+    """
+    nuv_ix = outlier_bins(nuv, sigma)
+    if len(nuv_ix) == 0:
+        return False, False, False
+    nuv_t0 = nuv_expt['t0'].to_numpy()[nuv_ix]
+    fuv_t0 = fuv_expt['t0'].to_numpy()
+    valid = (fuv['cps'] != 0) & np.isfinite(fuv['cps'])
+    _, nix, fix = np.intersect1d(nuv_t0, fuv_t0, return_indices=True)
+    nix, fix = nix[valid[fix]], fix[valid[fix]]
+    covered = bool(len(fix))
+    nuv_valid = nuv['cps'][(nuv['cps'] != 0) & np.isfinite(nuv['cps'])]
+    expected = (
+        (nuv['cps'][nuv_ix[nix]] / np.median(nuv_valid) - 1)
+        * np.median(fuv['cps'][valid]) if covered else np.array([])
+    )
+    sensitive = bool(
+        any(fuv['cps'] > 0.5) and (expected > sigma * fuv['cps_err'][fix]).any()
+    )
+    binsz = np.median(np.diff(fuv_t0)) if len(fuv_t0) > 1 else 30
+    fuv_outliers = fuv_t0[outlier_bins(fuv, sigma)]
+    confirmed = bool(
+        len(fuv_outliers)
+        and (np.abs(nuv_t0[:, None] - fuv_outliers[None, :]) <= binsz).any()
+    )
+    return covered, confirmed, sensitive
+
+
+def fuv_check(covered: bool, confirmed: bool, sensitive: bool) -> str:
+    """the outcome of comparing an NUV variable with FUV, for fuv_veto"""
+    if confirmed:
+        return 'confirmed'
+    if not covered:
+        return 'not covered'
+    return 'unconfirmed' if sensitive else 'unconfirmable'
+
+
+def screen_band(
+    lightcurves: list[dict],
+    expt: pd.DataFrame,
+    sigma: float = 3,
+    metrics: Optional[ScreeningMetrics] = None,
+    backend: Literal["numpy", "numba"] = "numpy",
+) -> tuple[list, dict, dict]:
+    """
+    screen_variables' cuts and declumping for one band's records. returns
+    variable ids, rejects as from screen_variables, and rejection reasons
+    keyed by obj_id.
+    """
+    if expt['expt'].sum() < 500:
+        return [], {}, {}
+    screen = screen_lightcurves_compiled if backend == "numba" else screen_lightcurves
+    candidates, rejects = screen(lightcurves, expt, sigma=sigma, metrics=metrics)
+    # screening rejects are keyed by position; declumping rejects by obj_id,
+    # which can coincide with a position, so they are collected separately
+    reasons = {lightcurves[i]['obj_id']: reason for i, reason in rejects.items()}
+    varix, declumped = declump_candidates(pd.DataFrame(candidates), {})
+    kept = set(varix)
+    reasons |= {
+        c['id']: declumped[c['id']] for c in candidates
+        if c['id'] not in kept and c['id'] in declumped
+    }
+    return varix, rejects | declumped, reasons
+
+
+def screen_joint(
+    fn: Pathlike,
+    aper_radius: float = 12.8,
+    sigma: float = 3,
+    fuv_veto: bool = False,
+    metrics: Optional[ScreeningMetrics] = None,
+    backend: Literal["numpy", "numba"] = "numpy",
+) -> tuple[list, dict, pd.DataFrame]:
+    """
+    screen both bands of a photometry file from one read. returns NUV
+    variable ids and rejects (as screen_variables does for NUV), plus a
+    table with one row per variable in either band: per-band outcome and
+    statistics, FUV coverage / confirmation of the NUV excursion, and the
+    FUV/NUV ratio columns. with fuv_veto=True, NUV variables whose outlier
+    bins are covered by FUV data without a simultaneous FUV excursion are
+    rejected, but only if FUV was sensitive enough to see the excursion
+    (see fuv_excursion); the rest are left in with fuv_check
+    'unconfirmable'.
+    """
+    if metrics is None:
+        metrics = ScreeningMetrics(band='joint')
+    t = perf_counter()
+    records = load_band_records(fn, apersize=aper_radius)
+    t = metrics.lap('load', t)
+    by_id, results = {}, {}
+    for band, (lightcurves, expt) in records.items():
+        metrics.reached('load', len(lightcurves))
+        varix, rejects, reasons = screen_band(
+            lightcurves, expt, sigma=sigma,
+            metrics=metrics if band == 'NUV' else None, backend=backend,
+        )
+        by_id[band] = {lc['obj_id']: lc for lc in lightcurves}
+        results[band] = varix, rejects, reasons
+        t = metrics.lap(band, t)
+    if 'NUV' not in results:
+        metrics.finish('no NUV data')
+        return [], {}, pd.DataFrame()
+    nuv_varix, rejects, _ = results['NUV']
+    variables = list(dict.fromkeys(
+        [i for varix, _, _ in results.values() for i in varix]
+    ))
+    rows = []
+    for obj_id in variables:
+        source = (by_id['NUV'].get(obj_id) or by_id.get('FUV', {}).get(obj_id))
+        row = {field: source[field] for field in VARIABLE_PIPE_ID_FIELDS}
+        for band in ('NUV', 'FUV'):
+            lc = by_id.get(band, {}).get(obj_id)
+            varix, _, reasons = results.get(band, ([], {}, {}))
+            row[f'variable_{band}'] = obj_id in varix
+            row[f'reject_{band}'] = reasons.get(obj_id)
+            if lc is None:
+                row[f'max_cps_{band}'] = row[f'median_cps_{band}'] = np.nan
+                row[f'n_outliers_{band}'] = 0
+                continue
+            valid = lc['cps'][(lc['cps'] != 0) & np.isfinite(lc['cps'])]
+            row[f'max_cps_{band}'] = np.max(valid) if len(valid) else np.nan
+            row[f'median_cps_{band}'] = np.median(valid) if len(valid) else np.nan
+            row[f'n_outliers_{band}'] = len(outlier_bins(lc, sigma))
+        nuv, fuv = by_id['NUV'].get(obj_id), by_id.get('FUV', {}).get(obj_id)
+        if nuv is not None and fuv is not None:
+            nuv_expt, fuv_expt = records['NUV'][1], records['FUV'][1]
+            covered, confirmed, sensitive = fuv_excursion(
+                nuv, fuv, nuv_expt, fuv_expt, sigma
+            )
+            row |= flux_ratios(nuv, fuv, nuv_expt, fuv_expt)
+        else:
+            covered = confirmed = sensitive = False
+            row |= dict.fromkeys(RATIO_COLUMNS, np.nan)
+        row['fuv_covered'], row['fuv_confirmed'] = covered, confirmed
+        row['fuv_check'] = fuv_check(covered, confirmed, sensitive)
+        rows.append(row)
+    table = pd.DataFrame(rows, columns=JOINT_COLUMNS)
+    varix = list(nuv_varix)
+    if fuv_veto and len(table):
+        vetoed = table.loc[
+            table['variable_NUV'] & (table['fuv_check'] == 'unconfirmed'),
+            'obj_id'
+        ].tolist()
+        for obj_id in vetoed:
+            rejects[obj_id] = "no simultaneous FUV excursion"
+        varix = [i for i in varix if i not in vetoed]
+    metrics.lap('compare', t)
+    metrics.reached('variables', len(varix))
+    metrics.finish('variables' if len(varix) else 'no variables')
+    return varix, rejects, table
@@ -0,0 +1,170 @@
+"""
+lookup of individual lightcurves in -30s-photom.parquet files by obj_id.
+
+each photometry file gets a small sidecar index (obj_id -> row group, row)
+written next to it on first use, so that a lookup decodes only the row
+groups that hold the requested sources instead of every source in the
+eclipse. files sorted by obj_id need no sidecar: their row groups are
+selected from the obj_id column statistics. files with a single row group
+are read with a filter on obj_id pushed down to the parquet reader.
+
+    lookup_lightcurves("e23456/e23456-30s-photom.parquet", [2101234, 2301234])
+    lookup_visits([(23456, 2101234), (1234, 501234)], photfile=lambda e: ...)
+"""
+from collections import defaultdict
+import os
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pac
+from pyarrow import feather, parquet
+
+from gPhoton.types import GalexBand, Pathlike
+from lightcurve_interface_skeleton import (
+    load_exptime,
+    lightcurve_records,
+    unflagged_columns,
+    unflagged_filter,
+)
+
+
+def index_filename(photfile: Pathlike) -> str:
+    """path of the sidecar index for a photometry file"""
+    return str(photfile).replace('.parquet', '-index.arrow')
+
+
+def build_index(photfile: Pathlike) -> pa.Table:
+    """obj_id, row_group and row (within the row group) of every source"""
+    file = parquet.ParquetFile(photfile)
+    obj_ids, row_groups, rows = [], [], []
+    for i in range(file.num_row_groups):
+        ids = file.read_row_group(i, columns=['obj_id'])['obj_id'].to_numpy()
+        obj_ids.append(ids)
+        row_groups.append(np.full(len(ids), i, dtype=np.int32))
+        rows.append(np.arange(len(ids), dtype=np.int32))
+    table = pa.table({
+        'obj_id': np.concatenate(obj_ids) if obj_ids else np.array([], dtype=np.int64),
+        'row_group': np.concatenate(row_groups) if row_groups else np.array([], dtype=np.int32),
+        'row': np.concatenate(rows) if rows else np.array([], dtype=np.int32),
+    })
+    return table.sort_by('obj_id')
+
+
+def load_index(photfile: Pathlike, write: bool = True) -> pa.Table:
+    """
+    the sidecar index for a photometry file, rebuilt if it is missing or
+    older than the file. if write is False or the directory is not
+    writable, the index is built in memory only.
+    """
+    fn = index_filename(photfile)
+    if os.path.exists(fn) and os.path.getmtime(fn) >= os.path.getmtime(photfile):
+        return feather.read_table(fn)
+    table = build_index(photfile)
+    if write:
+        try:
+            feather.write_feather(table, fn)
+        except OSError:
+            pass
+    return table
+
+
+def sorted_row_groups(file: parquet.ParquetFile, obj_ids: np.ndarray) -> Optional[list[int]]:
+    """
+    row groups whose obj_id min/max statistics bracket any of obj_ids, or
+    None if the file is not sorted by obj_id (or has no statistics)
+    """
+    column = file.schema.names.index('obj_id')
+    bounds = []
+    for i in range(file.num_row_groups):
+        stats = file.metadata.row_group(i).column(column).statistics
+        if stats is None or not stats.has_min_max:
+            return None
+        bounds.append((stats.min, stats.max))
+    if any(prev[1] > this[0] for prev, this in zip(bounds, bounds[1:])):
+        return None
+    return [
+        i for i, (lo, hi) in enumerate(bounds)
+        if np.any((obj_ids >= lo) & (obj_ids <= hi))
+    ]
+
+
+def read_rows(
+    photfile: Pathlike, obj_ids: Iterable[int], columns: list[str], write_index: bool = True
+) -> pa.Table:
+    """the rows of a photometry file for obj_ids, decoding only their row groups"""
+    obj_ids = np.unique(np.asarray(list(obj_ids), dtype=np.int64))
+    file = parquet.ParquetFile(photfile)
+    if file.num_row_groups == 1 and len(obj_ids):
+        # neither statistics nor the sidecar can narrow a single row group
+        return parquet.read_table(
+            photfile, columns=list(dict.fromkeys(columns + ['obj_id'])),
+            filters=[('obj_id', 'in', obj_ids.tolist())],
+        ).select(columns)
+    candidates = sorted_row_groups(file, obj_ids)
+    if candidates is not None:
+        # sorted file: the statistics already say where the sources are
+        tab = file.read_row_groups(candidates, columns=list(dict.fromkeys(columns + ['obj_id'])))
+        tab = tab.filter(pac.is_in(tab['obj_id'], pa.array(obj_ids)))
+        return tab.select(columns)
+    index = load_index(photfile, write=write_index)
+    index = index.filter(pac.is_in(index['obj_id'], pa.array(obj_ids)))
+    pieces = []
+    row_groups = index['row_group'].to_numpy()
+    rows = index['row'].to_numpy()
+    for row_group in np.unique(row_groups):
+        tab = file.read_row_group(int(row_group), columns=columns)
+        pieces.append(tab.take(pa.array(rows[row_groups == row_group])))
+    if not pieces:
+        return file.schema_arrow.empty_table().select(columns)
+    return pa.concat_tables(pieces)
+
+
+def lookup_lightcurves(
+    photfile: Pathlike,
+    obj_ids: Iterable[int],
+    band: GalexBand = 'NUV',
+    apersize: float = 12.8,
+    unflagged: bool = True,
+    write_index: bool = True,
+) -> dict[int, dict]:
+    """
+    lightcurve records (as from load_lightcurve_records) for obj_ids in one
+    photometry file, keyed by obj_id. sources that are not in the file, or
+    that are flagged when unflagged is True, are absent from the result.
+    raises KeyError if the file has no data for `band`.
+    """
+    exptime = load_exptime(photfile, band)
+    file = parquet.ParquetFile(photfile)
+    columns, full, edge, mask = unflagged_columns(file, apersize, band)
+    tab = read_rows(photfile, obj_ids, columns, write_index=write_index)
+    if unflagged:
+        tab = tab.filter(unflagged_filter(tab, full, edge, mask))
+    return {lc['obj_id']: lc for lc in lightcurve_records(tab.to_pandas(), exptime)}
+
+
+def lookup_visits(
+    pairs: Iterable[tuple[int, int]],
+    photfile: Callable[[int], Pathlike],
+    band: GalexBand = 'NUV',
+    apersize: float = 12.8,
+    unflagged: bool = True,
+) -> dict[tuple[int, int], dict]:
+    """
+    lightcurve records for (eclipse, obj_id) pairs, with one lookup per
+    eclipse. photfile maps an eclipse to its photometry file. eclipses with
+    no data in `band` are skipped.
+    """
+    by_eclipse = defaultdict(list)
+    for eclipse, obj_id in pairs:
+        by_eclipse[int(eclipse)].append(int(obj_id))
+    found = {}
+    for eclipse, obj_ids in by_eclipse.items():
+        try:
+            records = lookup_lightcurves(
+                photfile(eclipse), obj_ids, band=band, apersize=apersize, unflagged=unflagged
+            )
+        except KeyError:
+            continue
+        found |= {(eclipse, obj_id): lc for obj_id, lc in records.items()}
+    return found
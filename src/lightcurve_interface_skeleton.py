@@ -1,5 +1,9 @@
+import atexit
+from concurrent.futures import ProcessPoolExecutor
 from functools import partial
 import json
+import multiprocessing
+from multiprocessing import shared_memory
 import re
 from typing import Literal, Optional, Sequence, Union
 
@@ -10,9 +14,15 @@ import pyarrow as pa
 import pyarrow.compute as pac
 from pyarrow import parquet
 from scipy import signal, stats
-import sys
+from time import perf_counter
+import warnings
 
+from flare_filter import FLARE_DECAYS, MIN_FLARE_SNR, matched_filter
 from gfcat_utils import eliminate_dupes
+from screening_kernels import (
+    CHECK_PEAKS, HAVE_NUMBA, KERNEL_STAGES, PASSED, REJECT_REASONS, screen_kernel
+)
+from screening_metrics import ScreeningMetrics
 from gPhoton.types import GalexBand, Pathlike
 
 from sklearn.cluster import DBSCAN
@@ -43,6 +53,9 @@ def id_fields(fieldnames: Sequence[str]) -> list[str]:
 
 
 VARIABLE_PIPE_ID_FIELDS = ('xcenter', 'ycenter', 'ra', 'dec', 'obj_id')
+# position of a source among all unflagged sources of its file, added to
+# prefiltered reads so rejects keep the keys an unfiltered read gives them
+SOURCE_POSITION = 'source_position'
 
 
 def data_fields(fieldnames: Sequence[str]) -> list[str]:
@@ -73,15 +86,13 @@ def bins(fieldnames: Sequence[str]) -> list[int]:
     return sorted(set(map(int, [m.group(1) for m in time_fields])))
 
 
-def load_unflagged(
-    lightcurve_file: Pathlike, size: Optional[float]=None, band: GalexBand="NUV",
-) -> pd.DataFrame:
+def unflagged_columns(
+    file: parquet.ParquetFile, size: Optional[float]=None, band: GalexBand="NUV",
+) -> tuple[list[str], str, str, str]:
     """
-    load just the curves from a lightcurve parquet file for a specific aperture size 
-    (by default the smallest) and band (by default NUV) with no counts from mask or 
-    edge backplanes
+    columns needed to load unflagged curves for one aperture size and band,
+    plus the names of the full-depth count, edge and mask columns
     """
-    file = parquet.ParquetFile(lightcurve_file)
     data = data_fields(file.schema.names)
     if size is None:
         size = sizes(data)[0]
@@ -89,11 +100,107 @@ def load_unflagged(
     bin_cols = [
         bin_field_name(size, band, binno) for binno in [None] + bins(data)
     ]
-    tab = file.read(
-        columns=list(VARIABLE_PIPE_ID_FIELDS) + bin_cols + [edge, mask], 
-    )
-    tab = tab.filter(pac.equal(pac.add(tab[edge], tab[mask]), 0))
-    return tab.to_pandas(), load_exptime(tab, band)
+    columns = list(VARIABLE_PIPE_ID_FIELDS) + bin_cols + [edge, mask]
+    return columns, bin_cols[0], edge, mask
+
+
+def unflagged_filter(
+    table: Union[pa.Table, pa.RecordBatch],
+    full: str,
+    edge: str,
+    mask: str,
+    min_counts: Optional[float] = None,
+) -> pa.Array:
+    """
+    rows with no counts in the edge or mask backplanes and, if min_counts
+    is given, more than min_counts full-depth counts
+    """
+    keep = pac.equal(pac.add(table[edge], table[mask]), 0)
+    if min_counts is not None:
+        keep = pac.and_(keep, pac.greater(table[full], min_counts))
+    return keep
+
+
+def prefilter_counts(
+    exptime: np.ndarray, min_peak_cps: float, min_expt: Optional[float] = None
+) -> float:
+    """
+    full-depth counts a source must exceed to have any bin above min_peak_cps.
+    no bin can hold more than the full-depth counts, so with the shortest
+    nonzero bin exposure (the default for min_expt) this bound is exact;
+    a larger min_expt (e.g. the typical bin exposure) prunes harder but may
+    drop sources whose only bright bin is a short partial one.
+    """
+    if min_expt is None:
+        exposed = exptime[exptime > 0]
+        min_expt = exposed.min() if len(exposed) else 0
+    return min_peak_cps * min_expt
+
+
+def prefiltered_row_groups(
+    file: parquet.ParquetFile, full: str, edge: str, mask: str, min_counts: float
+) -> tuple[list[int], np.ndarray]:
+    """
+    indices of row groups containing at least one unflagged source with more
+    than min_counts full-depth counts, and the position among all unflagged
+    sources of each such source in them, in file order. row groups whose
+    statistics rule them out are only read for their edge and mask columns,
+    to count their unflagged sources; the rest are checked on the
+    full-depth, edge and mask columns only.
+    """
+    full_ix = file.schema.names.index(full)
+    row_groups, positions, n_unflagged = [], [], 0
+    for i in range(file.num_row_groups):
+        column_stats = file.metadata.row_group(i).column(full_ix).statistics
+        if (
+            column_stats is not None and column_stats.has_min_max
+            and column_stats.max <= min_counts
+        ):
+            tab = file.read_row_group(i, columns=[edge, mask])
+            n_unflagged += pac.sum(unflagged_filter(tab, full, edge, mask)).as_py() or 0
+            continue
+        tab = file.read_row_group(i, columns=[full, edge, mask])
+        unflagged = unflagged_filter(tab, full, edge, mask).to_numpy(zero_copy_only=False)
+        keep = unflagged_filter(tab, full, edge, mask, min_counts).to_numpy(zero_copy_only=False)
+        if keep.any():
+            row_groups.append(i)
+            positions.append(n_unflagged + np.cumsum(unflagged)[keep] - 1)
+        n_unflagged += int(unflagged.sum())
+    positions = np.concatenate(positions) if positions else np.zeros(0, dtype=np.int64)
+    return row_groups, positions
+
+
+def load_unflagged(
+    lightcurve_file: Pathlike,
+    size: Optional[float]=None,
+    band: GalexBand="NUV",
+    min_peak_cps: Optional[float] = None,
+    min_expt: Optional[float] = None,
+) -> pd.DataFrame:
+    """
+    load just the curves from a lightcurve parquet file for a specific aperture size 
+    (by default the smallest) and band (by default NUV) with no counts from mask or 
+    edge backplanes. if min_peak_cps is given, sources that cannot have any bin
+    above it (judged from full-depth counts, see prefilter_counts) are dropped:
+    row groups with no such source are not read at all, and within the rest
+    the sources are dropped after decoding, before conversion to pandas. the
+    kept sources' positions among all unflagged sources are then added as
+    the SOURCE_POSITION column.
+    """
+    file = parquet.ParquetFile(lightcurve_file)
+    columns, full, edge, mask = unflagged_columns(file, size, band)
+    exptime = load_exptime(lightcurve_file, band)
+    min_counts = None
+    if min_peak_cps is None:
+        tab = file.read(columns=columns)
+    else:
+        min_counts = prefilter_counts(exptime, min_peak_cps, min_expt)
+        row_groups, positions = prefiltered_row_groups(file, full, edge, mask, min_counts)
+        tab = file.read_row_groups(row_groups, columns=columns)
+    tab = tab.filter(unflagged_filter(tab, full, edge, mask, min_counts))
+    if min_counts is not None:
+        tab = tab.append_column(SOURCE_POSITION, pa.array(positions, pa.int64()))
+    return tab.to_pandas(), exptime
 
 
 def load_exptime(
@@ -118,37 +225,148 @@ def load_exptime(
 
 
 def lightcurve_df_to_cps(
-    lightcurves: np.ndarray, exptime: np.ndarray
-) -> tuple[np.ndarray, np.ndarray]:
-    # dangerous warning suppression --- never do this!
-    if not sys.warnoptions:
-        import warnings
-        warnings.simplefilter("ignore")
-    cps = np.einsum('i,ji -> ji', 1/exptime, lightcurves)
-    cps_err = np.einsum('i,ji -> ji', 1/exptime, np.sqrt(lightcurves))
-    return cps, cps_err
+    lightcurves: Union[np.ndarray, pd.DataFrame],
+    exptime: np.ndarray,
+    dtype: type = np.float32,
+    min_peak_cps: Optional[float] = None,
+) -> tuple[np.ndarray, ...]:
+    """
+    convert a (source, bin) array of counts to cps and cps_err in `dtype`
+    (float32 by default, which is ample for GALEX count rates). bins with no
+    exposure are NaN rather than inf. if min_peak_cps is given, cps_err is
+    only computed for rows with some bin above it, and the boolean row mask
+    is returned as a third value: (cps[keep], cps_err[keep], keep).
+    """
+    # the only copy of the counts; cps_err is computed in place over it
+    counts = np.array(lightcurves, dtype=dtype)
+    exptime = np.asarray(exptime, dtype=dtype)
+    exposed = exptime > 0
+    cps = np.full_like(counts, np.nan)
+    np.divide(counts, exptime, out=cps, where=exposed)
+    keep = None
+    if min_peak_cps is not None:
+        keep = (cps > min_peak_cps).any(axis=1)
+        cps, counts = cps[keep], counts[keep]
+    # negative background-subtracted counts have no Poisson error
+    with np.errstate(invalid='ignore'):
+        cps_err = np.sqrt(counts, out=counts)
+    np.divide(cps_err, exptime, out=cps_err, where=exposed)
+    cps_err[:, ~exposed] = np.nan
+    if keep is None:
+        return cps, cps_err
+    return cps, cps_err, keep
 
 
-def load_lightcurve_records(
-    lightcurve_parquet: Pathlike, band: GalexBand = 'NUV', apersize: int = 12.8
-) -> tuple[list[dict[str, Union[np.ndarray, float, int]]], np.ndarray]:
-    """load lightcurve records from a lightcurve parquet file"""
-    # dataframe containing unflagged bins from specified band and aperture size,
-    # and ndarray with exptime per bin
-    table, exptime = load_unflagged(lightcurve_parquet, band=band, size=apersize)
+def lightcurve_matrices(
+    table: pd.DataFrame, exptime: np.ndarray, min_peak_cps: Optional[float] = None
+) -> tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """
+    split a frame of unflagged curves into its metadata fields and (source,
+    bin) cps and cps_err matrices. if min_peak_cps is given, sources with no
+    bin above it are dropped. a SOURCE_POSITION column is kept with the
+    metadata fields.
+    """
     # select time-series data out for conversion to cps
     lightcurves = table[curve_fields(table)]
+    # select metadata fields
+    ids = table[[
+        f for f in (*VARIABLE_PIPE_ID_FIELDS, SOURCE_POSITION) if f in table.columns
+    ]]
     # make cps and cps_err arrays
-    cps, cps_err = lightcurve_df_to_cps(lightcurves, exptime)
-    # select metadata fields & convert to records
-    id_records = table[list(VARIABLE_PIPE_ID_FIELDS)].to_dict(orient='records')
+    if min_peak_cps is None:
+        cps, cps_err = lightcurve_df_to_cps(lightcurves, exptime)
+    else:
+        cps, cps_err, keep = lightcurve_df_to_cps(lightcurves, exptime, min_peak_cps=min_peak_cps)
+        ids = ids[keep]
+    return ids, cps, cps_err
+
+
+def lightcurve_records(
+    table: pd.DataFrame, exptime: np.ndarray, min_peak_cps: Optional[float] = None
+) -> list[dict[str, Union[np.ndarray, float, int]]]:
+    """
+    convert a frame of unflagged curves to per-source cps records. if
+    min_peak_cps is given, sources with no bin above it are dropped.
+    """
+    ids, cps, cps_err = lightcurve_matrices(table, exptime, min_peak_cps)
     # make records from each row of cps/cps_err arrays and merge w/metadata records
     return [
         id_record | {'cps': cps_vec, 'cps_err': cps_err_vec}
-        for id_record, cps_vec, cps_err_vec in zip(id_records, cps, cps_err)
+        for id_record, cps_vec, cps_err_vec
+        in zip(ids.to_dict(orient='records'), cps, cps_err)
     ]
 
 
+def load_lightcurve_records(
+    lightcurve_parquet: Pathlike,
+    band: GalexBand = 'NUV',
+    apersize: int = 12.8,
+    min_peak_cps: Optional[float] = None,
+    min_expt: Optional[float] = None,
+) -> tuple[list[dict[str, Union[np.ndarray, float, int]]], np.ndarray]:
+    """
+    load lightcurve records from a lightcurve parquet file. min_peak_cps drops
+    sources with no bin above it, prefiltering the read as in load_unflagged.
+    """
+    # dataframe containing unflagged bins from specified band and aperture size,
+    # and ndarray with exptime per bin
+    table, exptime = load_unflagged(
+        lightcurve_parquet, band=band, size=apersize,
+        min_peak_cps=min_peak_cps, min_expt=min_expt,
+    )
+    return lightcurve_records(table, exptime, min_peak_cps=min_peak_cps)
+
+
+# rough number of in-memory copies of each value while a batch is screened:
+# arrow batch, pandas frame, cps, cps_err (the records are views of cps/cps_err)
+COPIES_PER_VALUE = 4
+
+
+def streaming_batch_size(
+    lightcurve_parquet: Pathlike, max_memory: float, apersize: float = 12.8
+) -> int:
+    """number of sources per batch that keeps screening under max_memory bytes"""
+    file = parquet.ParquetFile(lightcurve_parquet)
+    n_columns = len(unflagged_columns(file, apersize)[0])
+    return max(int(max_memory // (n_columns * 8 * COPIES_PER_VALUE)), 1)
+
+
+def iter_lightcurve_records(
+    lightcurve_parquet: Pathlike,
+    band: GalexBand = 'NUV',
+    apersize: float = 12.8,
+    batch_size: int = 10000,
+    min_peak_cps: Optional[float] = None,
+    min_expt: Optional[float] = None,
+):
+    """
+    yield lightcurve records from a lightcurve parquet file in batches of
+    at most batch_size sources (before flag filtering), so that only one
+    batch's columns and cps arrays are in memory at a time. min_peak_cps
+    and min_expt prefilter as in load_unflagged.
+    """
+    file = parquet.ParquetFile(lightcurve_parquet)
+    columns, full, edge, mask = unflagged_columns(file, apersize, band)
+    exptime = load_exptime(lightcurve_parquet, band)
+    min_counts, row_groups = None, None
+    if min_peak_cps is not None:
+        min_counts = prefilter_counts(exptime, min_peak_cps, min_expt)
+        row_groups, positions = prefiltered_row_groups(file, full, edge, mask, min_counts)
+        if not row_groups:
+            return
+    start = 0
+    for batch in file.iter_batches(
+        batch_size=batch_size, row_groups=row_groups, columns=columns
+    ):
+        batch = batch.filter(unflagged_filter(batch, full, edge, mask, min_counts))
+        if min_counts is not None:
+            batch = batch.append_column(
+                SOURCE_POSITION, pa.array(positions[start:start + batch.num_rows], pa.int64())
+            )
+            start += batch.num_rows
+        yield lightcurve_records(batch.to_pandas(), exptime, min_peak_cps=min_peak_cps)
+
+
 def is_spiky(lc: dict):
     for sigma,n_outliers in [(3,3),(2,5)]: # sigma prominence is actually ~2x
         sigma_err = sigma * lc['cps_err']
@@ -206,24 +424,233 @@ def eliminate_dupes(variable_table, rejects,
     
     
 
-def screen_variables(fn:str, band='NUV', aper_radius=12.8, sigma=3, binsz=30):
+# sigma values at which outlier counts are stored in screening statistics,
+# so that changes to `sigma` among these can be re-evaluated without rereading
+OUTLIER_SIGMAS = (2, 2.5, 3, 3.5, 4, 5)
+
+
+def outlier_column(sigma: float, stat: str = 'n_outliers') -> str:
+    """screening statistics column of `stat` at sigma; 3 and 3.0 name the same one"""
+    return f'{stat}_{float(sigma):g}'
+
+
+def source_statistics(
+    lc: dict, expt: pd.DataFrame, sigmas: Sequence[float] = OUTLIER_SIGMAS
+) -> dict:
+    """
+    every per-source quantity the screening cuts in screen_variables are
+    evaluated on. sources that are too dim (no bin > 0.5 cps) only get
+    max_cps, since no tunable threshold can bring them back. unexposed (NaN)
+    bins are left out, as they are by the cuts.
+    """
+    finite = lc['cps'][np.isfinite(lc['cps'])]
+    record = {
+        'obj_id': lc['obj_id'], 'xcenter': lc['xcenter'], 'ycenter': lc['ycenter'],
+        'max_cps': float(np.max(finite)) if len(finite) else np.nan,
+    }
+    if not any(lc['cps'] > 0.5):
+        return record
+    ix = np.where((lc['cps'] != 0) & (np.isfinite(lc['cps'])))[0]
+    record['n_valid'] = len(ix)
+    if not len(ix):
+        return record
+    record['duration'] = expt['t1'][ix[-1]] - expt['t0'][ix[0]]
+    record['coverage'] = len(ix) / (ix[-1] + 1 - ix[0])
+    for sigma in sigmas:
+        sigma_err = lc['cps_err'] * sigma
+        if len(ix) < 2:
+            record[outlier_column(sigma)] = 0
+            continue
+        second_min = np.sort((lc['cps'] + sigma_err)[ix])[1]
+        record[outlier_column(sigma, 'second_min')] = second_min
+        record[outlier_column(sigma)] = int(
+            np.sum((lc['cps'] - sigma_err)[ix] > second_min)
+        )
+    record['spiky_crude'] = bool(is_spiky(lc))
+    peak_ix, _ = signal.find_peaks(lc['cps'], prominence=3 * lc['cps_err'], distance=4)
+    record['n_peaks'] = len(peak_ix)
+    if len(ix) > 1:
+        ad = stats.anderson(lc['cps'][ix])
+        record['ad_statistic'] = ad.statistic
+        record['ad_critical_5'] = ad.critical_values[2]
+    record['median_cps'] = np.median(lc['cps'][ix])
+    record['delta_cps'] = np.min(lc['cps'][ix]) - np.max(lc['cps'][ix])
+    return record
+
+
+def screening_stats_filename(photfile: Pathlike, band: GalexBand = 'NUV') -> str:
+    """default sidecar filename for a photometry file's screening statistics"""
+    return str(photfile).replace(
+        '-photom.parquet', f'-{band.lower()[0]}d-screening-stats.parquet'
+    )
+
+
+def write_screening_statistics(
+    fn: Pathlike,
+    stats_file: Optional[Pathlike] = None,
+    band: GalexBand = 'NUV',
+    aper_radius: float = 12.8,
+    sigmas: Sequence[float] = OUTLIER_SIGMAS,
+) -> pd.DataFrame:
+    """
+    compute source_statistics for every unflagged source in a photometry file
+    and write them to a parquet sidecar (by default next to the photometry
+    file). the row index is the source's position in load_lightcurve_records
+    output, which is how screen_variables keys `rejects`.
+    """
     lightcurves = load_lightcurve_records(fn, band, apersize=aper_radius)
     expt = load_exptime(fn, band=band, exptime_only=False)
-    if expt['expt'].sum() < 500:
-        print('Short exposure.')
+    table = pd.DataFrame(
+        [source_statistics(lc, expt, sigmas) for lc in lightcurves]
+    )
+    metadata = {
+        b'screening': json.dumps({
+            'band': band, 'aper_radius': aper_radius, 'sigmas': list(sigmas),
+            'expt_total': float(expt['expt'].sum()),
+        }).encode()
+    }
+    if stats_file is None:
+        stats_file = screening_stats_filename(fn, band)
+    arrow = pa.Table.from_pandas(table, preserve_index=False)
+    parquet.write_table(arrow.replace_schema_metadata(
+        (arrow.schema.metadata or {}) | metadata
+    ), stats_file)
+    table.attrs = json.loads(metadata[b'screening'])
+    return table
+
+
+def load_screening_statistics(stats_file: Pathlike) -> pd.DataFrame:
+    """read a screening statistics sidecar; its settings are in .attrs"""
+    table = parquet.read_table(stats_file)
+    stats_frame = table.to_pandas()
+    stats_frame.attrs = json.loads(table.schema.metadata[b'screening'].decode())
+    return stats_frame
+
+
+def apply_screening_cuts(
+    stats_frame: pd.DataFrame,
+    sigma: float = 3,
+    min_duration: float = 500,
+    min_coverage: float = 0.75,
+    min_outliers: int = 3,
+    max_peaks: int = 3,
+) -> tuple[pd.DataFrame, dict]:
+    """
+    evaluate the screen_variables heuristics as a query over stored source
+    statistics. returns the surviving candidates (in the eliminate_dupes
+    input layout) and rejection reasons keyed like screen_variables.
+    """
+    outliers = outlier_column(sigma)
+    if outliers not in stats_frame.columns:
+        raise ValueError(
+            f"outlier counts for sigma={sigma} were not stored; "
+            f"rerun write_screening_statistics with it in `sigmas`"
+        )
+    remaining = np.ones(len(stats_frame), dtype=bool)
+    rejects = {}
+    cuts = (
+        ("too dim", ~(stats_frame['max_cps'] > 0.5)),
+        # NaN duration (no valid bins at all) can never pass
+        ("too brief", ~(stats_frame['duration'] >= min_duration)),
+        ("more than 1/4 bins unobserved", ~(stats_frame['coverage'] >= min_coverage)),
+        ("less than 3 outliers", ~(stats_frame[outliers] >= min_outliers)),
+        ("spiky (crude)", stats_frame['spiky_crude'] == True),
+        ("spiky (fine)", stats_frame['n_peaks'] > max_peaks),
+        ("anderson-darling", ~(stats_frame['ad_statistic'] > stats_frame['ad_critical_5'])),
+    )
+    for reason, failed in cuts:
+        failed = remaining & np.asarray(failed, dtype=bool)
+        rejects |= {i: reason for i in np.nonzero(failed)[0].tolist()}
+        remaining &= ~failed
+    candidates = stats_frame.loc[remaining, ['obj_id', 'median_cps', 'xcenter', 'ycenter', 'delta_cps']]
+    candidates = candidates.rename(columns={'obj_id': 'id', 'median_cps': 'cps'})
+    return candidates, dict(sorted(rejects.items()))
+
+
+def rescreen(
+    stats_file: Pathlike,
+    sigma: float = 3,
+    min_duration: float = 500,
+    min_coverage: float = 0.75,
+    max_cluster_count: int = 30,
+    max_cursed: int = 20,
+):
+    """
+    re-run screening for one eclipse with new thresholds from its stored
+    statistics: only declumping is recomputed. returns (varix, rejects) like
+    screen_variables.
+    """
+    stats_frame = load_screening_statistics(stats_file)
+    if stats_frame.attrs['expt_total'] < 500:
         return [], {}
+    candidates, rejects = apply_screening_cuts(
+        stats_frame, sigma=sigma, min_duration=min_duration, min_coverage=min_coverage
+    )
+    return declump_candidates(candidates, rejects, max_cluster_count, max_cursed)
+
+
+def declump_candidates(
+    candidates: pd.DataFrame, rejects: dict, max_cluster_count: int = 30, max_cursed: int = 20
+):
+    """the eliminate_dupes / cursed-eclipse tail of screen_variables"""
+    if len(candidates) == 0:
+        return [], rejects
+    varix, rejects = eliminate_dupes(
+        candidates.to_dict('list'), rejects, max_cluster_count=max_cluster_count
+    )
+    if len(varix) >= max_cursed:
+        return [], rejects  # This is a cursed eclipse --- too many "variables" --- do not believe its lies
+    return varix, rejects
+
+
+def candidate_record(lc: dict, ix: np.ndarray) -> dict:
+    """the eliminate_dupes row for a source that passed screening"""
+    return {
+        'id': lc['obj_id'],
+        'cps': np.median(lc['cps'][ix]),
+        'xcenter': lc['xcenter'],
+        'ycenter': lc['ycenter'],
+        'delta_cps': np.min(lc['cps'][ix]) - np.max(lc['cps'][ix])
+    }
+
+
+def screen_lightcurves(
+    lightcurves: list[dict],
+    expt: pd.DataFrame,
+    sigma: float = 3,
+    metrics: Optional[ScreeningMetrics] = None,
+    offset: int = 0,
+) -> tuple[list[dict], dict]:
+    """
+    apply the per-source screening heuristics to a list of lightcurve records.
+    returns candidate records for eliminate_dupes and rejection reasons keyed
+    by source position (counting from `offset`).
+    """
+    if metrics is None:
+        metrics = ScreeningMetrics()
     candidate_variables, rejects = [], {}
-    for i, lc in enumerate(lightcurves):
+    for i, lc in enumerate(lightcurves, start=offset):
+        t = perf_counter()
+        metrics.reached('dim')
         if not any(lc['cps'] > 0.5):
             rejects[i] = "too dim"
+            metrics.lap('dim', t)
             continue  # too dim to be meaningful
+        t = metrics.lap('dim', t)
+        metrics.reached('brief')
         ix = np.where((lc['cps'] != 0) & (np.isfinite(lc['cps'])))[0]
         if expt['t1'][ix[-1]] - expt['t0'][ix[0]] < 500:
             rejects[i] = "too brief"
+            metrics.lap('brief', t)
             continue
+        t = metrics.lap('brief', t)
+        metrics.reached('coverage')
         if len(ix) / (ix[-1] + 1 - ix[0]) < 0.75:
             rejects[i] = "more than 1/4 bins unobserved"
+            metrics.lap('coverage', t)
             continue
+        t = metrics.lap('coverage', t)
+        metrics.reached('outliers')
         sigma_err = lc['cps_err'] * sigma
         second_min = np.sort((lc['cps'] + sigma_err)[ix])[1]
         outlier_ix = np.where(
@@ -231,45 +658,535 @@ def screen_variables(fn:str, band='NUV', aper_radius=12.8, sigma=3, binsz=30):
         )[0]
         if len(outlier_ix) < 3:
             rejects[i] = "less than 3 outliers"
+            metrics.lap('outliers', t)
             continue  # skip if there are not 3 significant outliers using the dumbest heuristic
+        t = metrics.lap('outliers', t)
+        metrics.reached('spiky_crude')
         if is_spiky(lc):
             rejects[i] = "spiky (crude)"
+            metrics.lap('spiky_crude', t)
             continue  # skip: multiple spiky peaks, most likely contaminated by an artifact
+        t = metrics.lap('spiky_crude', t)
+        metrics.reached('spiky_fine')
         peak_ix, _ = signal.find_peaks(lc['cps'], prominence=3 * lc['cps_err'], distance=4)
         if len(peak_ix) > 3:
             rejects[i] = "spiky (fine)"
+            metrics.lap('spiky_fine', t)
             continue  # skip multiple spiky peaks, most likely contaminated by an artifact
+        t = metrics.lap('spiky_fine', t)
+        metrics.reached('anderson_darling')
+        ad = stats.anderson(lc['cps'][ix])  # standard test of variability
+        if ad.statistic <= ad.critical_values[2]:
+            rejects[i] = "anderson-darling"
+            metrics.lap('anderson_darling', t)
+            continue  # failed the anderson-darling test at 5%
+        metrics.lap('anderson_darling', t)
+        candidate_variables.append(candidate_record(lc, ix))
+    return candidate_variables, rejects
+
+
+def screen_lightcurves_compiled(
+    lightcurves: list[dict],
+    expt: pd.DataFrame,
+    sigma: float = 3,
+    metrics: Optional[ScreeningMetrics] = None,
+    offset: int = 0,
+) -> tuple[list[dict], dict]:
+    """
+    screen_lightcurves with every cut but Anderson-Darling evaluated by the
+    compiled kernel in screening_kernels.py (requires numba), and the fine
+    spikiness test too unless the kernel defers it to scipy. per-stage
+    times are not separable inside the kernel, so they are recorded as a
+    single 'kernel' stage; funnel counts are kept per stage.
+    """
+    if metrics is None:
+        metrics = ScreeningMetrics()
+    if len(lightcurves) == 0:
+        return [], {}
+    t = perf_counter()
+    codes = screen_kernel(
+        np.stack([lc['cps'] for lc in lightcurves]),
+        np.stack([lc['cps_err'] for lc in lightcurves]),
+        expt['t0'].to_numpy(), expt['t1'].to_numpy(), sigma=sigma,
+    )
+    t = metrics.lap('kernel', t)
+    for code, stage in KERNEL_STAGES.items():
+        metrics.reached(stage, int(np.sum((codes == PASSED) | (codes >= code))))
+    candidate_variables, rejects = [], {}
+    for i, (lc, code) in enumerate(zip(lightcurves, codes), start=offset):
+        if code == CHECK_PEAKS:
+            peak_ix, _ = signal.find_peaks(lc['cps'], prominence=3 * lc['cps_err'], distance=4)
+            if len(peak_ix) > 3:
+                rejects[i] = "spiky (fine)"
+                continue
+        elif code != PASSED:
+            rejects[i] = REJECT_REASONS[code]
+            continue
+        metrics.reached('anderson_darling')
+        ix = np.where((lc['cps'] != 0) & (np.isfinite(lc['cps'])))[0]
         ad = stats.anderson(lc['cps'][ix])  # standard test of variability
         if ad.statistic <= ad.critical_values[2]:
             rejects[i] = "anderson-darling"
             continue  # failed the anderson-darling test at 5%
-        candidate_variables.append(
+        candidate_variables.append(candidate_record(lc, ix))
+    metrics.lap('anderson_darling', t)
+    return candidate_variables, rejects
+
+
+def screen_lightcurves_matched(
+    lightcurves: list[dict],
+    expt: pd.DataFrame,
+    sigma: float = 3,
+    metrics: Optional[ScreeningMetrics] = None,
+    offset: int = 0,
+    min_snr: float = MIN_FLARE_SNR,
+    decays: Sequence[float] = FLARE_DECAYS,
+) -> tuple[list[dict], dict]:
+    """
+    candidate generator with the same interface as screen_lightcurves, using
+    the matched flare filter in flare_filter.py in place of the heuristic
+    cuts: sources whose peak SNR over the template bank reaches min_snr are
+    candidates. sigma is accepted for interchangeability and not used.
+    candidate records also carry the peak SNR ('snr'), the decay time of
+    the best template in bins ('decay') and the start of the peak bin ('t_peak').
+    """
+    if metrics is None:
+        metrics = ScreeningMetrics()
+    if len(lightcurves) == 0:
+        return [], {}
+    t = perf_counter()
+    metrics.reached('matched_filter', len(lightcurves))
+    snr, template, peak_bin = matched_filter(
+        np.stack([lc['cps'] for lc in lightcurves]),
+        np.stack([lc['cps_err'] for lc in lightcurves]),
+        expt['expt'].to_numpy(), decays=decays,
+    )
+    t0 = expt['t0'].to_numpy()
+    candidate_variables, rejects = [], {}
+    for i, lc in enumerate(lightcurves):
+        if not snr[i] >= min_snr:
+            rejects[i + offset] = f"matched filter SNR < {min_snr:g}"
+            continue
+        ix = np.where((lc['cps'] != 0) & (np.isfinite(lc['cps'])))[0]
+        candidate_variables.append(candidate_record(lc, ix) | {
+            'snr': snr[i], 'decay': decays[template[i]], 't_peak': t0[peak_bin[i]]
+        })
+    metrics.lap('matched_filter', t)
+    return candidate_variables, rejects
+
+
+# worker pool kept alive across screen_variables(n_workers=...) calls
+_SCREENING_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def screening_pool(n_workers: int) -> ProcessPoolExecutor:
+    """
+    the persistent screening worker pool, (re)started if it does not exist,
+    has a different number of workers, or is broken (a worker died).
+    workers come from a forkserver rather than by forking this process,
+    which may already be running numba's threads, and the pool is shut down
+    at exit. as with spawn, the calling script is re-imported by the
+    forkserver, so scripts that screen with n_workers must do so under an
+    `if __name__ == '__main__':` guard.
+    """
+    global _SCREENING_POOL
+    if (
+        _SCREENING_POOL is None
+        or _SCREENING_POOL._max_workers != n_workers
+        or _SCREENING_POOL._broken
+    ):
+        shutdown_screening_pool()
+        _SCREENING_POOL = ProcessPoolExecutor(
+            max_workers=n_workers, mp_context=multiprocessing.get_context('forkserver')
+        )
+    return _SCREENING_POOL
+
+
+@atexit.register
+def shutdown_screening_pool():
+    global _SCREENING_POOL
+    if _SCREENING_POOL is not None:
+        _SCREENING_POOL.shutdown()
+        _SCREENING_POOL = None
+
+
+def _screen_shared_slice(task: dict) -> tuple[list[dict], dict, ScreeningMetrics]:
+    """
+    pool worker: screen sources start:stop of cps / cps_err matrices held in
+    shared memory blocks, without copying them
+    """
+    blocks = [shared_memory.SharedMemory(name=name) for name in task['blocks']]
+    try:
+        cps, cps_err = (
+            np.ndarray(task['shape'], dtype=task['dtype'], buffer=block.buf)[
+                task['start']:task['stop']
+            ]
+            for block in blocks
+        )
+        lightcurves = [
+            id_record | {'cps': cps_vec, 'cps_err': cps_err_vec}
+            for id_record, cps_vec, cps_err_vec in zip(task['ids'], cps, cps_err)
+        ]
+        screen = (
+            screen_lightcurves_compiled if task['backend'] == 'numba' else screen_lightcurves
+        )
+        metrics = ScreeningMetrics()
+        candidates, rejects = screen(
+            lightcurves, task['expt'], sigma=task['sigma'], metrics=metrics,
+            offset=task['start'],
+        )
+        # the shared buffers cannot be closed while views into them exist
+        del lightcurves, cps, cps_err
+    finally:
+        for block in blocks:
+            block.close()
+    return candidates, rejects, metrics
+
+
+def screen_shared(
+    ids: pd.DataFrame,
+    cps: np.ndarray,
+    cps_err: np.ndarray,
+    expt: pd.DataFrame,
+    n_workers: int,
+    sigma: float = 3,
+    metrics: Optional[ScreeningMetrics] = None,
+    backend: Literal["numpy", "numba"] = "numpy",
+    slices_per_worker: int = 4,
+) -> tuple[list[dict], dict]:
+    """
+    screen_lightcurves over a whole eclipse on the persistent worker pool.
+    cps and cps_err are placed in shared memory once and each worker screens
+    a range of sources from them; candidates and rejects come back in source
+    order, as from a single screen_lightcurves call. stage times in metrics
+    are summed over workers.
+    """
+    if metrics is None:
+        metrics = ScreeningMetrics()
+    n_sources = len(cps)
+    if n_sources == 0:
+        return [], {}
+    blocks = []
+    try:
+        for matrix in (cps, cps_err):
+            block = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+            np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=block.buf)[:] = matrix
+            blocks.append(block)
+        id_records = ids.to_dict(orient='records')
+        expt = expt[['t0', 't1', 'expt']]
+        bounds = np.linspace(
+            0, n_sources, min(n_workers * slices_per_worker, n_sources) + 1
+        ).astype(int)
+        tasks = [
             {
-                'id': lc['obj_id'],
-                'cps': np.median(lc['cps'][ix]), 
-                'xcenter': lc['xcenter'], 
-                'ycenter': lc['ycenter'],
-                'delta_cps': np.min(lc['cps'][ix]) - np.max(lc['cps'][ix])
+                'blocks': [block.name for block in blocks],
+                'shape': cps.shape, 'dtype': cps.dtype.str,
+                'start': start, 'stop': stop, 'ids': id_records[start:stop],
+                'expt': expt, 'sigma': sigma, 'backend': backend,
             }
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        candidate_variables, rejects = [], {}
+        for candidates, slice_rejects, slice_metrics in screening_pool(n_workers).map(
+            _screen_shared_slice, tasks
+        ):
+            candidate_variables += candidates
+            rejects |= slice_rejects
+            metrics.merge(slice_metrics)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return candidate_variables, rejects
+
+
+def add_to_detector_map(
+    detector_map,
+    eclipse: int,
+    band: GalexBand,
+    crpix: tuple[float, float],
+    positions: Sequence[np.ndarray],
+    candidate_positions: dict,
+    rejected: set,
+):
+    """
+    add one eclipse to a detector_map.DetectorMap: the (n, 2) xcenter /
+    ycenter arrays of every screened source, the positions of the candidates
+    by id, and the ids of the candidates that the per-eclipse vetoes rejected
+    """
+    xy = np.concatenate(positions) if positions else np.zeros((0, 2))
+    rejected = [xy_ for i, xy_ in candidate_positions.items() if i in rejected]
+    detector_map.add(
+        eclipse, crpix, (xy[:, 0], xy[:, 1]),
+        tuple(zip(*candidate_positions.values())) if candidate_positions else ([], []),
+        tuple(zip(*rejected)) if rejected else ([], []),
+        band=band,
+    )
+
+
+def reject_positions(rejects: dict, positions: Sequence[int], offset: int = 0) -> dict:
+    """
+    re-key per-source rejects of a prefiltered read (keyed by position among
+    the sources read, counting from offset) by their SOURCE_POSITION
+    """
+    return {positions[i - offset]: reason for i, reason in rejects.items()}
+
+
+def screen_variables(
+    fn:str, band='NUV', aper_radius=12.8, sigma=3, binsz=30,
+    metrics: Optional[ScreeningMetrics] = None,
+    stats_file: Optional[Pathlike] = None,
+    streaming: bool = False,
+    max_memory: float = 2e9,
+    batch_size: Optional[int] = None,
+    prefilter: bool = False,
+    min_expt: Optional[float] = None,
+    backend: Literal["numpy", "numba"] = "numpy",
+    n_workers: Optional[int] = None,
+    cadences: Optional[Sequence[float]] = None,
+    significant_cadence: Optional[dict] = None,
+    detector: Literal["heuristic", "matched_filter"] = "heuristic",
+    min_snr: float = MIN_FLARE_SNR,
+    artifact_model=None,
+    min_artifact_score: float = 0.5,
+    detector_map=None,
+    crpix: Optional[tuple[float, float]] = None,
+    min_detector_weight: float = 0.5,
+):
+    """
+    screen one eclipse's lightcurves for candidate variables. returns ids of
+    the surviving candidates and a dict of rejection reasons by source.
+    pass a ScreeningMetrics to collect per-stage wall time and funnel counts.
+    if stats_file is given, full per-source statistics are computed and
+    written there first, so the eclipse can later be re-evaluated with
+    different thresholds by rescreen(stats_file, ...).
+    with streaming=True, sources are read and screened in batches sized to
+    keep memory use under roughly max_memory bytes (or of batch_size
+    sources), and only candidates are kept for declumping.
+    with prefilter=True, sources too dim to pass the first cut are dropped
+    during the parquet read (see load_unflagged); they are then absent from
+    rejects, whose other keys are the same as without prefiltering.
+    backend="numba" evaluates the per-source cuts with the compiled kernel
+    in screening_kernels.py (same decisions), falling back to numpy if numba
+    is not installed.
+    with n_workers set, the eclipse's cps matrices are put in shared memory
+    and source ranges are screened on a worker pool that persists across
+    calls (see screen_shared); this cannot be combined with streaming.
+    with cadences set (e.g. (30, 120, 300)), sources rejected at 30 s for
+    lack of significance are rebinned in memory and screened again at each
+    coarser cadence (see rebinning.screen_cadences); the artifact and
+    coverage cuts stay final. rejects keep the 30-s reason for
+    sources that never pass. if a dict is passed as significant_cadence,
+    it is filled with the cadence at which each candidate passed, by obj_id.
+    cadences cannot be combined with n_workers or stats_file.
+    detector="matched_filter" generates candidates with the matched flare
+    filter (see screen_lightcurves_matched) instead of the heuristic cuts,
+    keeping sources with peak SNR of at least min_snr; backend and n_workers
+    do not apply to it, but declumping does.
+    with an artifact_model (see artifact_classifier.py), the variables that
+    survive declumping and the cursed-eclipse check (the candidates that QA
+    sorts, and that the model is trained on) are scored, and those scoring
+    below min_artifact_score are rejected as "artifact classifier". this
+    cannot be combined with n_workers or stats_file.
+    with a detector_map (see detector_map.py) and the eclipse's crpix,
+    declumped candidates whose detector-position weight is below
+    min_detector_weight are rejected as "detector hotspot" before the
+    cursed-eclipse check. the eclipse's sources, candidates and the
+    candidates rejected by declumping, the cursed-eclipse check or the
+    artifact classifier are then added to the map, once per eclipse and
+    band; metrics must have the eclipse set. this cannot be combined with
+    n_workers or stats_file.
+    """
+    if streaming and n_workers is not None:
+        raise ValueError("streaming and n_workers cannot be combined")
+    if cadences is not None and (n_workers is not None or stats_file is not None):
+        raise ValueError("cadences cannot be combined with n_workers or stats_file")
+    if backend == "numba" and not HAVE_NUMBA:
+        warnings.warn("numba is not installed; screening with the numpy backend")
+        backend = "numpy"
+    screen_batch = screen_lightcurves_compiled if backend == "numba" else screen_lightcurves
+    if detector == "matched_filter":
+        if n_workers is not None or stats_file is not None:
+            raise ValueError("detector='matched_filter' cannot be combined with n_workers or stats_file")
+        screen_batch = partial(screen_lightcurves_matched, min_snr=min_snr)
+    if artifact_model is not None and (n_workers is not None or stats_file is not None):
+        raise ValueError("artifact_model cannot be combined with n_workers or stats_file")
+    if detector_map is not None:
+        if n_workers is not None or stats_file is not None:
+            raise ValueError("detector_map cannot be combined with n_workers or stats_file")
+        if crpix is None:
+            raise ValueError("detector_map needs the eclipse's crpix")
+        if metrics is None or metrics.eclipse is None:
+            raise ValueError("detector_map needs metrics with the eclipse set")
+    if metrics is None:
+        metrics = ScreeningMetrics(band=band)
+    if stats_file is not None:
+        t = perf_counter()
+        stats_frame = write_screening_statistics(
+            fn, stats_file, band=band, aper_radius=aper_radius,
+            sigmas=sorted(set(OUTLIER_SIGMAS) | {sigma}),
+        )
+        t = metrics.lap('statistics', t)
+        metrics.reached('statistics', len(stats_frame))
+        if stats_frame.attrs['expt_total'] < 500:
+            print('Short exposure.')
+            metrics.finish('short exposure')
+            return [], {}
+        candidates, rejects = apply_screening_cuts(stats_frame, sigma=sigma)
+        metrics.reached('declump', len(candidates))
+        varix, rejects = declump_candidates(candidates, rejects)
+        metrics.lap('declump', t)
+        metrics.finish('variables' if len(varix) else 'no variables')
+        return varix, rejects
+    t = perf_counter()
+    expt = load_exptime(fn, band=band, exptime_only=False)
+    if expt['expt'].sum() < 500:
+        metrics.lap('load', t)
+        print('Short exposure.')
+        metrics.finish('short exposure')
+        return [], {}
+    # the "too dim" cut, applied while reading if prefilter is set
+    read_kwargs = {'min_peak_cps': 0.5, 'min_expt': min_expt} if prefilter else {}
+    candidate_variables, rejects, offset = [], {}, 0
+    # for the artifact classifier: every source's position and peak, and the candidates' curves
+    sources, candidate_lightcurves = [], []
+    # for the detector map: every source's position
+    positions = []
+    if n_workers is not None:
+        table, exptime = load_unflagged(fn, size=aper_radius, band=band, **read_kwargs)
+        ids, cps, cps_err = lightcurve_matrices(
+            table, exptime, min_peak_cps=read_kwargs.get('min_peak_cps')
         )
+        del table
+        t = metrics.lap('load', t)
+        metrics.reached('load', len(cps))
+        candidate_variables, rejects = screen_shared(
+            ids, cps, cps_err, expt, n_workers, sigma=sigma, metrics=metrics,
+            backend=backend,
+        )
+        if prefilter:
+            rejects = reject_positions(rejects, ids[SOURCE_POSITION].to_numpy())
+        batches = []
+    elif streaming:
+        if batch_size is None:
+            batch_size = streaming_batch_size(fn, max_memory, aper_radius)
+        batches = iter_lightcurve_records(
+            fn, band, apersize=aper_radius, batch_size=batch_size, **read_kwargs
+        )
+    else:
+        batches = [load_lightcurve_records(fn, band, apersize=aper_radius, **read_kwargs)]
+    for lightcurves in batches:
+        t = metrics.lap('load', t)
+        metrics.reached('load', len(lightcurves))
+        if cadences is None:
+            batch_candidates, batch_rejects = screen_batch(
+                lightcurves, expt, sigma=sigma, metrics=metrics, offset=offset
+            )
+        else:
+            # local import: rebinning builds on this module
+            from rebinning import screen_cadences
+            batch_candidates, batch_rejects, batch_cadences = screen_cadences(
+                lightcurves, expt, cadences, sigma=sigma, screen=screen_batch,
+                metrics=metrics, offset=offset,
+            )
+            if significant_cadence is not None:
+                significant_cadence |= batch_cadences
+        if prefilter:
+            batch_rejects = reject_positions(
+                batch_rejects, [lc[SOURCE_POSITION] for lc in lightcurves], offset
+            )
+        if artifact_model is not None:
+            from artifact_classifier import source_context
+            sources.append(source_context(lightcurves))
+            found = {candidate['id'] for candidate in batch_candidates}
+            candidate_lightcurves += [lc for lc in lightcurves if lc['obj_id'] in found]
+        if detector_map is not None:
+            positions.append(
+                np.array([[lc['xcenter'], lc['ycenter']] for lc in lightcurves]).reshape(-1, 2)
+            )
+        candidate_variables += batch_candidates
+        rejects |= batch_rejects
+        offset += len(lightcurves)
+        del lightcurves  # only the small candidate list is carried forward
+        t = perf_counter()
     if len(candidate_variables) == 0:
+        metrics.finish('no candidates')
         return [], rejects # there are no candidate variables at this point
+    # positions of every candidate, for the detector map
+    position = {c['id']: (c['xcenter'], c['ycenter']) for c in candidate_variables}
     # Now screen out variables in clumps, which are very probably due to transient artifacts
-    varix, rejects = eliminate_dupes(pd.DataFrame(candidate_variables).to_dict('list'), rejects)
+    t = perf_counter()
+    metrics.reached('declump', len(candidate_variables))
+    # screening rejects are keyed by position; declumping rejects by obj_id,
+    # which can coincide with a position, so they are collected separately
+    varix, declump_rejects = eliminate_dupes(
+        pd.DataFrame(candidate_variables).to_dict('list'), {}
+    )
+    rejects |= declump_rejects
+    metrics.lap('declump', t)
+    declumped = set(varix)
+    if detector_map is not None:
+        t = perf_counter()
+        metrics.reached('detector_map', len(varix))
+        # weigh this eclipse's candidates by the map as it was before it
+        weights = detector_map.weight(
+            [position[i][0] for i in varix], [position[i][1] for i in varix], crpix
+        )
+        for i, weight in zip(varix, weights):
+            if weight < min_detector_weight:
+                rejects[i] = "detector hotspot"
+        varix = [i for i, weight in zip(varix, weights) if weight >= min_detector_weight]
+        metrics.lap('detector_map', t)
+    # candidates thrown away by the per-eclipse vetoes, for the detector map;
+    # duplicates merged into a kept candidate are not among them
+    vetoed = set(declump_rejects)
+    metrics.reached('variables', len(varix))
     if len(varix) >= 20:
         print("cursed eclipse")
+        metrics.finish('cursed')
+        if detector_map is not None:
+            add_to_detector_map(
+                detector_map, metrics.eclipse, band, crpix, positions, position,
+                vetoed | declumped,
+            )
         return [], rejects  # This is a cursed eclipse --- too many "variables" --- do not believe its lies
+    if artifact_model is not None and len(varix):
+        from artifact_classifier import candidate_features, score_candidates
+        t = perf_counter()
+        metrics.reached('artifact_classifier', len(varix))
+        # like the QA-sorted candidates it was trained on, each candidate is
+        # described among everything that survived declumping
+        features = candidate_features(
+            [lc for lc in candidate_lightcurves if lc['obj_id'] in declumped],
+            expt, pd.concat(sources, ignore_index=True), sigma,
+        )
+        scores = dict(zip(features['obj_id'], score_candidates(artifact_model, features)))
+        for i in varix:
+            if scores[i] < min_artifact_score:
+                rejects[i] = "artifact classifier"
+                vetoed.add(i)
+        varix = [i for i in varix if scores[i] >= min_artifact_score]
+        metrics.lap('artifact_classifier', t)
+    if detector_map is not None:
+        add_to_detector_map(
+            detector_map, metrics.eclipse, band, crpix, positions, position, vetoed
+        )
     if len(varix) == 0:
         print("no variables after declumping")
+        metrics.finish('no variables after declumping')
         return [], rejects # there are no variables
+    metrics.finish('variables')
     return varix, rejects
 
 
 
 """
-# print reasons for rejections:
+# print reasons for rejections, and where the screening time went:
 eclipse = 23456
 e = str(eclipse).zfill(5)
-varix, rejects = screen_variables(f"e{e}/e{e}-30s-photom.parquet")
+metrics = ScreeningMetrics(eclipse=eclipse, band='NUV')
+varix, rejects = screen_variables(f"e{e}/e{e}-30s-photom.parquet", metrics=metrics)
 frequencies(rejects.values())
+metrics.record()
+metrics.write("screening_metrics.jsonl")  # aggregate with screening_metrics.load_metrics()
 """
@@ -1,4 +1,7 @@
-from lightcurve_interface_skeleton import screen_variables, load_lightcurve_records
+from lightcurve_interface_skeleton import screen_variables
+from lightcurve_index import lookup_lightcurves
+from joint_screening import screen_joint
+from screening_metrics import ScreeningMetrics
 from gfcat_utils import read_image, parse_exposure_time
 import os
 import numpy as np
@@ -13,7 +16,9 @@ from astropy.wcs import WCS
 from astropy.coordinates import SkyCoord
 import shutil
 
-def screen_eclipse(eclipse, photdir = '/home/ubuntu/datadir/', band = 'NUV'):
+def screen_eclipse(eclipse, photdir = '/home/ubuntu/datadir/', band = 'NUV', metrics_file=None, stats_dir=None,
+                   max_memory=None, n_workers=None, joint_dir=None, fuv_veto=False, cadences=None,
+                   detector='heuristic', artifact_model=None, detector_map=None, crpix=None):
     estring = f"e{str(eclipse).zfill(5)}"
     edir = f"{photdir}{estring}"
     if not os.path.exists(edir):
@@ -24,7 +29,24 @@ def screen_eclipse(eclipse, photdir = '/home/ubuntu/datadir/', band = 'NUV'):
         cmd = f"aws s3 cp s3://dream-pool/{estring}/{estring}-30s-photom.parquet {edir}/."
         os.system(cmd)
 
-    varix, rejects = screen_variables(f'{edir}/{estring}-30s-photom.parquet')
+    metrics = ScreeningMetrics(eclipse=eclipse, band=band)
+    # if stats_dir is set, per-source screening statistics are kept there (outside edir, which
+    # is deleted below) so that threshold changes can be re-evaluated later with rescreen()
+    stats_file = None if stats_dir is None else f"{stats_dir}/{estring}-{band.lower()[0]}d-screening-stats.parquet"
+    if joint_dir is not None: # screen both bands from one read; keep the per-variable FUV/NUV table
+        varix, rejects, joint_table = screen_joint(photfilename, metrics=metrics, fuv_veto=fuv_veto)
+        joint_table.to_parquet(f"{joint_dir}/{estring}-joint-screening.parquet")
+    else:
+        varix, rejects = screen_variables(f'{edir}/{estring}-30s-photom.parquet', band=band, metrics=metrics,
+                                          stats_file=stats_file, streaming=max_memory is not None,
+                                          max_memory=max_memory or 2e9, # bounded memory for dense eclipses
+                                          n_workers=n_workers, # worker pool persists across eclipses
+                                          cadences=cadences, # e.g. (30, 120, 300) to also search coarser bins
+                                          detector=detector, # or 'matched_filter', see flare_filter.py
+                                          artifact_model=artifact_model, # see artifact_classifier.py
+                                          detector_map=detector_map, crpix=crpix) # see detector_map.py
+    if metrics_file is not None: # per-stage timing / funnel counts, see screening_metrics.py
+        metrics.write(metrics_file)
 
     if not len(varix):
         shutil.rmtree(edir)
@@ -32,6 +54,54 @@ def screen_eclipse(eclipse, photdir = '/home/ubuntu/datadir/', band = 'NUV'):
 
     return varix
 
+def render_qa_frame(frame, i, curve, band, box, full_box, min_i, max_i, frame_fn, gs=None, boxsz=200):
+    # Render one frame of an animated QA image: the full frame, the thumbnail around the
+    #  source, and the lightcurve with bin i highlighted. `box` and `full_box` are the
+    #  (x1, x2, y1, y2) crops on the subframe and the full frame.
+    x1, x2, y1, y2 = box
+    x1_, x2_, y1_, y2_ = full_box
+    if gs is None:
+        gs = gridspec.GridSpec(nrows=4, ncols=6)
+    fig = plt.figure(figsize=(12, 9));
+    fig.tight_layout()
+    ax = fig.add_subplot(gs[:3, :3])
+    ax.imshow(ZScaleInterval()(frame[x1_:x2_, y1_:y2_]),origin="lower",cmap="Greys_r")
+    ax.set_xticks([])
+    ax.set_yticks([])
+    rect = Rectangle((y1 - y1_, x1 - x1_), 2 * boxsz, 2 * boxsz, linewidth=1, edgecolor='y', facecolor='none',
+                     ls='solid')
+    ax.add_patch(rect)
+
+    ax = fig.add_subplot(gs[:3, 3:])
+    ax.imshow(ZScaleInterval()(frame[x1:x2, y1:y2]),origin="lower",cmap="Greys_r")
+    ax.set_xticks([])
+    ax.set_xticks([])
+    ax.set_yticks([])
+    circ = Circle((boxsz, boxsz), 20, linewidth=1, edgecolor='y', facecolor='none', ls='solid')
+    ax.add_patch(circ)
+
+    ax = fig.add_subplot(gs[3:, :])
+    ax.vlines(curve[band]['t'][i], curve[band]['cps'][min_i] - 3 * curve[band]['cps_err'][min_i],
+              curve[band]['cps'][max_i] + 3 * curve[band]['cps_err'][max_i], ls='dotted')
+    ax.scatter(curve[band]['t'][i], curve[band]['cps'][i], c='y', s=100, marker='o')
+    ax.errorbar(curve[band]['t'], curve[band]['cps'],
+                yerr=curve[band]['cps_err'] * 3, fmt='k.-',label=band)
+    ax.set_xlim([curve[band]['t'].min()-30,curve[band]['t'].max()+60])
+    ax.set_xticks([])
+    plt.legend()
+
+    plt.savefig(frame_fn, dpi=100)
+    plt.close('all')
+
+def compile_qa_gif(frame_fns, gif_fn, fps=6, cleanup=True):
+    # Assemble rendered QA frames into an animated gif, removing the frames unless cleanup=False.
+    with imageio.get_writer(gif_fn, mode='I', fps=fps) as writer:
+        for frame_fn in frame_fns:
+            image = imageio.imread(frame_fn)
+            writer.append_data(image)
+            if cleanup: # remove the jpg frames
+                os.remove(frame_fn)
+
 def make_qa_image(eclipse, obj_ids, step="prescreen", # or "final"
                   photdir = '/home/ubuntu/datadir/', band = 'NUV',aper_radius=12.8, cleanup=True):
     if obj_ids.__class__ is int:
@@ -47,21 +117,17 @@ def make_qa_image(eclipse, obj_ids, step="prescreen", # or "final"
         cmd = f"aws s3 cp s3://dream-pool/{estring}/{estring}-30s-photom.parquet {edir}/."
         os.system(cmd)
 
-    try:
-        lightcurves = load_lightcurve_records(photfilename, band, apersize=aper_radius)
+    try: # decodes only the row groups holding obj_ids, see lightcurve_index.py
+        variables = lookup_lightcurves(photfilename, obj_ids, band, apersize=aper_radius)
     except KeyError:
         print(f'No {band} data available for {estring}.')
         return
     expt = parse_exposure_time(photfilename, band=band)
 
-    variables = {}
-    for lc in lightcurves:
-        if lc['obj_id'] in obj_ids:
-            variables[lc['obj_id']] = lc
     for obj_id in obj_ids:
         if obj_id not in variables.keys():
             print(f'{obj_id} not found in {eclipse} {band} unflagged lightcurves')
-    if not len(lc):
+    if not len(variables):
         print(f'No matching objects in {estring} {band}')
         return
 
@@ -158,50 +224,18 @@ def make_qa_image(eclipse, obj_ids, step="prescreen", # or "final"
 
         else: # generate slower but more informative animated qa images
             print(f'Generating {source_ix} {band} QA frames.')
+            frame_fns = []
             for i, frame in enumerate(imgmap):  # probably eliminate the first / last frame, which always has lower exposure
-                fig = plt.figure(figsize=(12, 9));
-                fig.tight_layout()
-                ax = fig.add_subplot(gs[:3, :3])
-                ax.imshow(ZScaleInterval()(frame[x1_:x2_, y1_:y2_]),origin="lower",cmap="Greys_r")
-                ax.set_xticks([])
-                ax.set_yticks([])
-                rect = Rectangle((y1 - y1_, x1 - x1_), 2 * boxsz, 2 * boxsz, linewidth=1, edgecolor='y', facecolor='none',
-                                 ls='solid')
-                ax.add_patch(rect)
-
-                ax = fig.add_subplot(gs[:3, 3:])
-                ax.imshow(ZScaleInterval()(frame[x1:x2, y1:y2]),origin="lower",cmap="Greys_r")
-                ax.set_xticks([])
-                ax.set_xticks([])
-                ax.set_yticks([])
-                circ = Circle((boxsz, boxsz), 20, linewidth=1, edgecolor='y', facecolor='none', ls='solid')
-                ax.add_patch(circ)
-
-                ax = fig.add_subplot(gs[3:, :])
-                ax.vlines(curve[band]['t'][i], curve[band]['cps'][min_i] - 3 * curve[band]['cps_err'][min_i],
-                          curve[band]['cps'][max_i] + 3 * curve[band]['cps_err'][max_i], ls='dotted')
-                ax.scatter(curve[band]['t'][i], curve[band]['cps'][i], c='y', s=100, marker='o')
-                ax.errorbar(curve[band]['t'], curve[band]['cps'],
-                            yerr=curve[band]['cps_err'] * 3, fmt='k.-',label=band)
-                ax.set_xlim([curve[band]['t'].min()-30,curve[band]['t'].max()+60])
-                ax.set_xticks([])
-                plt.legend()
-
-                plt.savefig(f'{edir}/{estring}-{str(source_ix).zfill(5)}-{b}-30s-{str(i).zfill(2)}.jpg', dpi=100)
-                plt.close('all')
+                frame_fn = f'{edir}/{estring}-{str(source_ix).zfill(5)}-{b}-30s-{str(i).zfill(2)}.jpg'
+                render_qa_frame(frame, i, curve, band, (x1, x2, y1, y2), (x1_, x2_, y1_, y2_),
+                                min_i, max_i, frame_fn, gs=gs, boxsz=boxsz)
+                frame_fns += [frame_fn]
 
             print(f'Compiling {source_ix} {band} movie.')
-            n_frames = np.shape(imgmap)[0]
             # write the animated gif
             gif_fn = f'{edir}/{estring}-{str(source_ix).zfill(5)}-{b}-30s.gif'
             print(f"writing {gif_fn}")
-            with imageio.get_writer(gif_fn, mode='I', fps=6) as writer:
-                for i in np.arange(n_frames):
-                    frame_fn = f'{edir}/{estring}-{str(source_ix).zfill(5)}-{b}-30s-{str(i).zfill(2)}.jpg'
-                    image = imageio.imread(frame_fn)
-                    writer.append_data(image)
-                    # remove the png frames
-                    os.remove(frame_fn)
+            compile_qa_gif(frame_fns, gif_fn)
 
     # remove the local copies of image data
     #if cleanup:
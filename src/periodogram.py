@@ -0,0 +1,235 @@
+"""
+batched periodograms of candidate lightcurves within a visit.
+
+all sources of a candidate set are evaluated on one shared frequency grid
+from the bin mid-times of the exposure time table. the generalized
+(floating-mean, error-weighted) Lomb-Scargle periodogram of Zechmeister &
+Kuerster (2009) is computed for every source and frequency with a handful
+of (source, bin) x (bin, frequency) matrix products, and the false-alarm
+probability of each source's highest peak uses the Baluev (2008)
+approximation (as astropy's LombScargle.false_alarm_probability(method=
+'baluev')). box least squares folds all sources at each trial period with
+one matrix product per period, for eclipse-like dips. unexposed and NaN
+bins get zero weight.
+
+    frequency = frequency_grid(expt)
+    peaks = lomb_scargle_peaks(cps, cps_err, expt, frequency)
+"""
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy.special import gammaln
+
+
+def bin_midtimes(expt: pd.DataFrame) -> np.ndarray:
+    """mid-times of the bins of an exposure time table"""
+    return 0.5 * (expt['t0'].to_numpy(np.float64) + expt['t1'].to_numpy(np.float64))
+
+
+def frequency_grid(
+    expt: pd.DataFrame,
+    samples_per_peak: float = 5,
+    min_period: Optional[float] = None,
+    max_period: Optional[float] = None,
+) -> np.ndarray:
+    """
+    frequencies (1/s) from 1 / max_period (default: the visit length) to
+    1 / min_period (default: the Nyquist period, two bins), oversampling
+    each peak of width 1 / visit length by samples_per_peak
+    """
+    t = bin_midtimes(expt)
+    baseline = t[-1] - t[0] + np.median(np.diff(t)) if len(t) > 1 else 1
+    min_period = 2 * np.median(np.diff(t)) if min_period is None else min_period
+    max_period = baseline if max_period is None else max_period
+    step = 1 / (samples_per_peak * baseline)
+    return np.arange(1 / max_period, 1 / min_period + step / 2, step)
+
+
+def periodogram_weights(
+    cps: np.ndarray, cps_err: np.ndarray, exptime: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """cps with invalid bins zeroed, and 1 / err**2 weights (err floored at one count)"""
+    cps = np.asarray(cps, dtype=np.float64)
+    exptime = np.asarray(exptime, dtype=np.float64)
+    valid = np.isfinite(cps) & (exptime > 0)
+    floor = np.divide(1, exptime, out=np.zeros_like(exptime), where=exptime > 0)
+    err = np.maximum(np.where(valid, cps_err, 1), floor)
+    return np.where(valid, cps, 0), np.where(valid, 1 / err ** 2, 0)
+
+
+def lomb_scargle(
+    cps: np.ndarray,
+    cps_err: np.ndarray,
+    t: np.ndarray,
+    frequency: np.ndarray,
+    exptime: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    (source, frequency) generalized Lomb-Scargle power, normalized to [0, 1]
+    ('standard' normalization), for a (source, bin) cps matrix with bin
+    times t. exptime (per bin) marks unexposed bins; by default all are used.
+    """
+    cps = np.atleast_2d(cps)
+    if exptime is None:
+        exptime = np.ones(cps.shape[1])
+    y, w = periodogram_weights(cps, np.atleast_2d(cps_err), exptime)
+    total = w.sum(axis=1, keepdims=True)
+    w = np.divide(w, total, out=np.zeros_like(w), where=total > 0)
+    phase = 2 * np.pi * np.outer(t - t[0], frequency)
+    cos, sin = np.cos(phase), np.sin(phase)
+    wy = w * y
+    Y = wy.sum(axis=1, keepdims=True)
+    YY = (wy * y).sum(axis=1, keepdims=True) - Y * Y
+    C, S = w @ cos, w @ sin
+    YC = wy @ cos - Y * C
+    YS = wy @ sin - Y * S
+    CC = w @ (cos * cos) - C * C
+    SS = w @ (sin * sin) - S * S
+    CS = w @ (cos * sin) - C * S
+    D = CC * SS - CS * CS
+    power = np.zeros(YC.shape)
+    np.divide(
+        SS * YC * YC + CC * YS * YS - 2 * CS * YC * YS, YY * D,
+        out=power, where=(YY * D) > 0,
+    )
+    return power
+
+
+def _weighted_var(t: np.ndarray, w: np.ndarray) -> np.ndarray:
+    """per-source weighted variance of the bin times"""
+    w = w / w.sum(axis=1, keepdims=True)
+    mean = w @ t
+    return (w * (t[None, :] - mean[:, None]) ** 2).sum(axis=1)
+
+
+def false_alarm_probability(
+    power: np.ndarray, fmax: float, t: np.ndarray, weights: np.ndarray
+) -> np.ndarray:
+    """
+    Baluev (2008) false-alarm probability of a peak of `power` ('standard'
+    normalization, floating mean) for each source, searching up to fmax
+    """
+    weights = np.atleast_2d(weights)
+    n = (weights > 0).sum(axis=1).astype(np.float64)
+    nh, nk = n - 1, n - 3
+    with np.errstate(all='ignore'):
+        fap_single = (1 - power) ** (0.5 * nk)
+        gamma = np.sqrt(2 / nh) * np.exp(gammaln(nh / 2) - gammaln((nh - 1) / 2))
+        width = fmax * np.sqrt(4 * np.pi * _weighted_var(t, weights))
+        tau = gamma * width * (1 - power) ** (0.5 * (nk - 1)) * np.sqrt(0.5 * nh * power)
+        # 1 - (1 - fap_single) * exp(-tau), keeping precision for small values
+        fap = -np.expm1(-tau) + fap_single * np.exp(-tau)
+    # too few points for a meaningful test
+    return np.where(n > 3, np.clip(fap, 0, 1), 1.0)
+
+
+def lomb_scargle_peaks(
+    cps: np.ndarray,
+    cps_err: np.ndarray,
+    expt: pd.DataFrame,
+    frequency: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """
+    highest Lomb-Scargle peak of each row of a (source, bin) cps matrix:
+    power, period (s) and false-alarm probability
+    """
+    if frequency is None:
+        frequency = frequency_grid(expt)
+    t = bin_midtimes(expt)
+    exptime = expt['expt'].to_numpy(np.float64)
+    power = lomb_scargle(cps, cps_err, t, frequency, exptime)
+    best = np.argmax(power, axis=1)
+    peak = power[np.arange(len(power)), best]
+    _, weights = periodogram_weights(np.atleast_2d(cps), np.atleast_2d(cps_err), exptime)
+    return pd.DataFrame({
+        'ls_power': peak,
+        'ls_period': 1 / frequency[best],
+        'ls_fap': false_alarm_probability(peak, frequency.max(), t, weights),
+    })
+
+
+def box_least_squares(
+    cps: np.ndarray,
+    cps_err: np.ndarray,
+    expt: pd.DataFrame,
+    frequency: Optional[np.ndarray] = None,
+    durations: Sequence[float] = (0.05, 0.1, 0.2),
+    n_phase_bins: int = 40,
+) -> pd.DataFrame:
+    """
+    box least squares search for periodic dips in each row of a (source,
+    bin) cps matrix. durations are fractions of the period. returns, per
+    source, the best signal residue power (Kovacs et al. 2002, for dips
+    only), its period (s), duration (s) and depth (cps).
+    """
+    if frequency is None:
+        frequency = frequency_grid(expt)
+    t = bin_midtimes(expt)
+    y, w = periodogram_weights(
+        np.atleast_2d(cps), np.atleast_2d(cps_err), expt['expt'].to_numpy(np.float64)
+    )
+    total = w.sum(axis=1, keepdims=True)
+    w = np.divide(w, total, out=np.zeros_like(w), where=total > 0)
+    y = y - (w * y).sum(axis=1, keepdims=True)
+    wy = w * y
+    n_sources = len(y)
+    best = {
+        'power': np.zeros(n_sources), 'period': np.full(n_sources, np.nan),
+        'duration': np.full(n_sources, np.nan), 'depth': np.full(n_sources, np.nan),
+    }
+    widths = sorted({max(int(round(d * n_phase_bins)), 1) for d in durations})
+    for f in frequency:
+        phase_bin = np.floor(((t - t[0]) * f % 1) * n_phase_bins).astype(np.int64)
+        fold = np.zeros((len(t), n_phase_bins))
+        fold[np.arange(len(t)), phase_bin] = 1
+        # cumulative sums over the folded curve, wrapped once for boxes that cross phase 0
+        r, s = w @ fold, wy @ fold
+        r = np.concatenate([np.zeros((n_sources, 1)), np.cumsum(np.hstack([r, r]), axis=1)], axis=1)
+        s = np.concatenate([np.zeros((n_sources, 1)), np.cumsum(np.hstack([s, s]), axis=1)], axis=1)
+        for width in widths:
+            r_box = r[:, width:width + n_phase_bins] - r[:, :n_phase_bins]
+            s_box = s[:, width:width + n_phase_bins] - s[:, :n_phase_bins]
+            power = np.zeros(r_box.shape)
+            dip = (s_box < 0) & (r_box > 0) & (r_box < 1)
+            np.divide(s_box ** 2, r_box * (1 - r_box), out=power, where=dip)
+            start = np.argmax(power, axis=1)
+            peak = power[np.arange(n_sources), start]
+            better = peak > best['power']
+            if not better.any():
+                continue
+            rb, sb = r_box[better, start[better]], s_box[better, start[better]]
+            best['power'][better] = peak[better]
+            best['period'][better] = 1 / f
+            best['duration'][better] = width / n_phase_bins / f
+            # mean in the box less the mean outside it
+            best['depth'][better] = -sb / (rb * (1 - rb))
+    return pd.DataFrame({f'bls_{k}': v for k, v in best.items()})
+
+
+def candidate_periodograms(
+    lightcurves: Sequence[dict],
+    expt: pd.DataFrame,
+    frequency: Optional[np.ndarray] = None,
+    bls: bool = True,
+) -> pd.DataFrame:
+    """
+    Lomb-Scargle (and optionally box least squares) peaks for a list of
+    lightcurve records from one eclipse, with their obj_ids
+    """
+    columns = ['obj_id', 'ls_power', 'ls_period', 'ls_fap']
+    if bls:
+        columns += ['bls_power', 'bls_period', 'bls_duration', 'bls_depth']
+    if len(lightcurves) == 0:
+        return pd.DataFrame(columns=columns)
+    if frequency is None:
+        frequency = frequency_grid(expt)
+    cps = np.stack([lc['cps'] for lc in lightcurves])
+    cps_err = np.stack([lc['cps_err'] for lc in lightcurves])
+    frames = [
+        pd.DataFrame({'obj_id': [lc['obj_id'] for lc in lightcurves]}),
+        lomb_scargle_peaks(cps, cps_err, expt, frequency),
+    ]
+    if bls:
+        frames.append(box_least_squares(cps, cps_err, expt, frequency))
+    return pd.concat(frames, axis=1)[columns]
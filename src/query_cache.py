@@ -0,0 +1,189 @@
+"""
+persistent on-disk cache for positional queries against remote catalogs
+(SIMBAD, Gaia). results are keyed by service name and rounded position and
+radius and stored in a SQLite file, so repeated catalog rebuilds and visit
+summaries do not repeat remote queries.
+"""
+import os
+import pickle
+import sqlite3
+import time
+from typing import Any, Callable, Iterable, Optional
+
+# a backend is any callable taking (ra, dec, radius), all in decimal degrees,
+# and returning the query result (or None for an empty result)
+Backend = Callable[[float, float, float], Any]
+
+DEFAULT_CACHE_FILE = os.path.expanduser('~/.gfcat/query_cache.sqlite')
+
+
+def simbad_region(ra: float, dec: float, radius: float):
+    """query SIMBAD for sources within radius of (ra, dec), including OTYPE"""
+    import astropy.units as u
+    from astropy.coordinates import SkyCoord
+    from astroquery.simbad import Simbad
+    simbad = Simbad()
+    simbad.add_votable_fields("otype")
+    return simbad.query_region(
+        SkyCoord(ra, dec, unit='deg'), radius=radius * u.deg
+    )
+
+
+def gaia_cone(ra: float, dec: float, radius: float):
+    """cone search of the Gaia archive within radius of (ra, dec)"""
+    import astropy.units as u
+    from astropy.coordinates import SkyCoord
+    from astroquery.gaia import Gaia
+    Gaia.ROW_LIMIT = 200  # Ensure the default row limit.
+    job = Gaia.cone_search_async(
+        SkyCoord(ra, dec, unit='deg'), radius=u.Quantity(radius, u.deg)
+    )
+    return job.get_results()
+
+
+DEFAULT_BACKENDS = {'simbad': simbad_region, 'gaia': gaia_cone}
+
+
+class FakeBackend:
+    """
+    stand-in for a remote service. returns canned results keyed by rounded
+    (ra, dec) -- or `default` for unknown positions -- and counts calls, so
+    callers can check how many "remote" queries were actually issued.
+    """
+    def __init__(self, results: Optional[dict] = None, default=None, precision=5):
+        self.results = {
+            (round(ra, precision), round(dec, precision)): result
+            for (ra, dec), result in (results or {}).items()
+        }
+        self.default = default
+        self.precision = precision
+        self.calls = []
+
+    def __call__(self, ra: float, dec: float, radius: float):
+        self.calls.append((ra, dec, radius))
+        return self.results.get(
+            (round(ra, self.precision), round(dec, self.precision)), self.default
+        )
+
+
+class QueryCache:
+    """
+    SQLite-backed memo of positional queries.
+
+    positions are rounded to `precision` decimal places of a degree (the
+    default of 5 is ~0.04 arcsec) to form the cache key. entries older than
+    `ttl` seconds are re-queried; ttl=None means entries never expire. in
+    offline mode, nothing is sent to a backend and a cache miss raises
+    KeyError.
+    """
+    def __init__(
+        self,
+        cache_file: str = DEFAULT_CACHE_FILE,
+        backends: Optional[dict[str, Backend]] = None,
+        ttl: Optional[float] = None,
+        offline: bool = False,
+        precision: int = 5,
+    ):
+        if cache_file != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+        self.db = sqlite3.connect(cache_file)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS queries ("
+            "service TEXT, ra TEXT, dec TEXT, radius TEXT, "
+            "created REAL, result BLOB, "
+            "PRIMARY KEY (service, ra, dec, radius))"
+        )
+        self.db.commit()
+        self.backends = DEFAULT_BACKENDS | (backends or {})
+        self.ttl = ttl
+        self.offline = offline
+        self.precision = precision
+        self.n_remote = 0  # number of queries actually sent to a backend
+
+    def key(self, service: str, ra: float, dec: float, radius: float) -> tuple:
+        p = self.precision
+        return service, f"{ra:.{p}f}", f"{dec:.{p}f}", f"{radius:.{p + 2}f}"
+
+    def _lookup(self, key: tuple):
+        row = self.db.execute(
+            "SELECT created, result FROM queries "
+            "WHERE service=? AND ra=? AND dec=? AND radius=?", key
+        ).fetchone()
+        if row is None:
+            return False, None
+        created, result = row
+        if self.ttl is not None and time.time() - created > self.ttl:
+            return False, None
+        return True, pickle.loads(result)
+
+    def _store(self, key: tuple, result):
+        self.db.execute(
+            "INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?, ?, ?)",
+            key + (time.time(), pickle.dumps(result)),
+        )
+        self.db.commit()
+
+    def cached(self, service: str, ra: float, dec: float, radius: float) -> bool:
+        """is there a fresh cache entry for this query?"""
+        return self._lookup(self.key(service, ra, dec, radius))[0]
+
+    def query(self, service: str, ra: float, dec: float, radius: float):
+        """
+        return the result of querying `service` within radius (degrees) of
+        (ra, dec), from the cache if possible. empty (None) results are
+        cached too, so a position with no match is only ever queried once.
+        """
+        key = self.key(service, ra, dec, radius)
+        hit, result = self._lookup(key)
+        if hit:
+            return result
+        if self.offline:
+            raise KeyError(f"{key} is not in the query cache (offline mode)")
+        result = self.backends[service](ra, dec, radius)
+        self.n_remote += 1
+        self._store(key, result)
+        return result
+
+    def prefetch(
+        self,
+        service: str,
+        positions: Iterable[tuple[float, float]],
+        radius: float,
+        delay: float = 0.2,
+    ) -> int:
+        """
+        populate the cache for a list of (ra, dec) positions, skipping any
+        that are already cached. `delay` seconds are slept between remote
+        queries -- SIMBAD will blacklist you for more than ~5-10 queries/sec.
+        returns the number of remote queries issued.
+        """
+        n_remote = self.n_remote
+        for ra, dec in positions:
+            if self.cached(service, ra, dec, radius):
+                continue
+            if self.offline:
+                continue
+            self.query(service, ra, dec, radius)
+            if delay:
+                time.sleep(delay)
+        return self.n_remote - n_remote
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_cache = None
+
+
+def default_cache() -> QueryCache:
+    """shared QueryCache using DEFAULT_CACHE_FILE, opened on first use"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = QueryCache()
+    return _default_cache
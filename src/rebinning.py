@@ -0,0 +1,234 @@
+"""
+rebinning of 30-s lightcurves to coarser cadences.
+
+the 30-s count columns and the exposure time table (t0, t1, expt) of a
+-30s-photom.parquet file are summed over consecutive runs of native bins,
+so longer-timescale variability can be screened without regenerating
+photometry. coarse bins are aligned to the start of the first native bin.
+errors are Poisson in the summed counts, i.e. the native errors added in
+quadrature. coarse bins with less than `min_fill` of a full bin's exposure
+(partial bins at the ends of a visit, or mostly-unexposed stretches) are
+given zero exposure and so come out NaN, like unexposed 30-s bins.
+
+    expt = load_exptime(fn, 'NUV', exptime_only=False)
+    coarse, starts = rebin_exptime(expt, 120)
+    cps, cps_err = rebin_cps(cps_30s, expt['expt'].to_numpy(), starts, coarse)
+
+`screen_cadences` runs the screening cuts on one eclipse's records at
+several cadences (screen_variables(cadences=...)), so slow variables that
+are lost in 30-s noise are found without reading the photometry again.
+only sources rejected for lack of significance are screened again: coarse
+bins average artifact spikes away, so the artifact and coverage vetoes are
+final.
+"""
+from time import perf_counter
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from lightcurve_interface_skeleton import (
+    curve_fields,
+    lightcurve_df_to_cps,
+    screen_lightcurves,
+)
+from screening_metrics import ScreeningMetrics
+
+CADENCES = (30, 60, 120, 300)
+# rejection reasons that a coarser cadence can overturn
+RESCREEN_REASONS = ("less than 3 outliers", "anderson-darling")
+
+
+def cadence_starts(expt: pd.DataFrame, binsz: float) -> np.ndarray:
+    """index of the first native bin in each bin of width binsz seconds"""
+    t0 = expt['t0'].to_numpy(np.float64)
+    if len(t0) == 0:
+        return np.array([], dtype=np.intp)
+    # bin starts are whole seconds apart; the offset guards against t0
+    # values that land a hair below a boundary
+    group = np.floor((t0 - t0[0]) / binsz + 1e-6).astype(np.int64)
+    return np.flatnonzero(np.r_[True, np.diff(group) != 0])
+
+
+def live_fraction(expt: pd.DataFrame) -> float:
+    """median fraction of each exposed native bin that is exposure time"""
+    width = (expt['t1'] - expt['t0']).to_numpy(np.float64)
+    exposed = expt['expt'].to_numpy(np.float64) > 0
+    if not exposed.any():
+        return 1.0
+    return float(np.median(expt['expt'].to_numpy(np.float64)[exposed] / width[exposed]))
+
+
+def rebin_exptime(
+    expt: pd.DataFrame, binsz: float, min_fill: float = 0.5
+) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    exposure time table at cadence binsz, and the index of the first native
+    bin in each coarse bin (for rebin_counts). the table has t0, t1, expt
+    and n_bins (native bins summed). expt is zeroed for coarse bins with
+    less than min_fill of the exposure of a full bin at the native live
+    fraction (except at the native cadence).
+    """
+    starts = cadence_starts(expt, binsz)
+    if len(starts) == 0:
+        return pd.DataFrame(columns=['t0', 't1', 'expt', 'n_bins']), starts
+    ends = np.r_[starts[1:], len(expt)]
+    exptime = np.add.reduceat(expt['expt'].to_numpy(np.float64), starts)
+    if binsz > np.median((expt['t1'] - expt['t0']).to_numpy()):
+        # the native cadence is passed through as it is screened now
+        exptime[exptime < min_fill * binsz * live_fraction(expt)] = 0
+    coarse = pd.DataFrame({
+        't0': expt['t0'].to_numpy()[starts],
+        't1': expt['t1'].to_numpy()[ends - 1],
+        'expt': exptime,
+        'n_bins': ends - starts,
+    })
+    return coarse, starts
+
+
+def rebin_counts(counts: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    sum a (source, bin) array of counts (or flag counts) over the coarse
+    bins beginning at starts. NaN entries count as zero.
+    """
+    counts = np.asarray(counts)
+    if counts.dtype.kind == 'f':
+        counts = np.nan_to_num(counts)
+    return np.add.reduceat(counts, starts, axis=1)
+
+
+def cps_to_counts(cps: np.ndarray, exptime: np.ndarray) -> np.ndarray:
+    """counts implied by a (source, bin) cps array; unexposed bins are zero"""
+    exptime = np.asarray(exptime)
+    counts = np.zeros(cps.shape, dtype=np.float64)
+    np.multiply(cps, exptime, out=counts, where=(exptime > 0) & np.isfinite(cps))
+    return counts
+
+
+def rebin_cps(
+    cps: np.ndarray,
+    exptime: np.ndarray,
+    starts: np.ndarray,
+    coarse: pd.DataFrame,
+    dtype: type = np.float32,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    cps and cps_err at a coarse cadence from native cps. exptime is the
+    native per-bin exposure and starts / coarse come from rebin_exptime.
+    """
+    counts = rebin_counts(cps_to_counts(cps, exptime), starts)
+    return lightcurve_df_to_cps(counts, coarse['expt'].to_numpy(), dtype=dtype)
+
+
+def rebin_lightcurve_df(
+    table: pd.DataFrame,
+    expt: pd.DataFrame,
+    binsz: float,
+    min_fill: float = 0.5,
+    dtype: type = np.float32,
+) -> tuple[np.ndarray, np.ndarray, pd.DataFrame]:
+    """
+    cps, cps_err and the exposure time table at cadence binsz from a frame of
+    native count columns (as from load_unflagged), without forming 30-s cps
+    """
+    coarse, starts = rebin_exptime(expt, binsz, min_fill)
+    counts = rebin_counts(table[curve_fields(table)].to_numpy(np.float64), starts)
+    cps, cps_err = lightcurve_df_to_cps(counts, coarse['expt'].to_numpy(), dtype=dtype)
+    return cps, cps_err, coarse
+
+
+def rebin_records(
+    lightcurves: Sequence[dict],
+    expt: pd.DataFrame,
+    binsz: float,
+    min_fill: float = 0.5,
+) -> tuple[list[dict], pd.DataFrame]:
+    """
+    lightcurve records (as from lightcurve_records) and exposure time table
+    at cadence binsz. identifying fields are carried over unchanged.
+    """
+    coarse, starts = rebin_exptime(expt, binsz, min_fill)
+    if not len(lightcurves):
+        return [], coarse
+    cps = np.vstack([lc['cps'] for lc in lightcurves])
+    cps, cps_err = rebin_cps(cps, expt['expt'].to_numpy(), starts, coarse)
+    return [
+        {k: v for k, v in lc.items() if k not in ('cps', 'cps_err')}
+        | {'cps': cps_vec, 'cps_err': cps_err_vec}
+        for lc, cps_vec, cps_err_vec in zip(lightcurves, cps, cps_err)
+    ], coarse
+
+
+def rescreenable(reason: str) -> bool:
+    """
+    whether a source rejected for this reason is screened again at a
+    coarser cadence: it failed for lack of significance, not a veto
+    """
+    return reason in RESCREEN_REASONS or reason.startswith("matched filter SNR")
+
+
+def native_cadence(expt: pd.DataFrame) -> float:
+    """width of the bins in an exposure time table, in seconds"""
+    return float(np.median((expt['t1'] - expt['t0']).to_numpy()))
+
+
+def screen_cadences(
+    lightcurves: Sequence[dict],
+    expt: pd.DataFrame,
+    cadences: Sequence[float] = CADENCES,
+    sigma: float = 3,
+    screen: Callable = screen_lightcurves,
+    metrics: Optional[ScreeningMetrics] = None,
+    offset: int = 0,
+    min_fill: float = 0.5,
+) -> tuple[list[dict], dict, dict]:
+    """
+    screen lightcurve records at each cadence in turn, finest first, with
+    `screen` (screen_lightcurves or screen_lightcurves_compiled). a source
+    is a candidate if it passes at any cadence; only sources rejected at
+    every finer cadence for lack of significance (see rescreenable) are
+    rebinned and screened again. returns candidate records, rejection
+    reasons at the finest cadence for sources that never passed (keyed by
+    position from `offset`, as screen_lightcurves does), and the cadence at
+    which each candidate passed, keyed by obj_id.
+    metrics gets the per-stage funnel of the finest cadence only, plus a
+    stage per coarser cadence.
+    """
+    if metrics is None:
+        metrics = ScreeningMetrics()
+    native = native_cadence(expt) if len(expt) else 30
+    candidates, rejects, cadence = {}, {}, {}
+    remaining = np.arange(len(lightcurves))
+    for n, binsz in enumerate(sorted(cadences)):
+        if len(remaining) == 0:
+            break
+        t = perf_counter()
+        subset = [lightcurves[i] for i in remaining]
+        if binsz > native:
+            subset, binned_expt = rebin_records(subset, expt, binsz, min_fill)
+        else:
+            binned_expt = expt
+        stage = f'cadence_{binsz:g}'
+        metrics.reached(stage, len(subset))
+        found, failed = screen(
+            subset, binned_expt, sigma=sigma,
+            metrics=metrics if n == 0 else ScreeningMetrics(),
+        )
+        # screen() keys rejects by position in subset; map back to lightcurves
+        rejected = np.zeros(len(subset), dtype=bool)
+        rejected[list(failed)] = True
+        for i, record in zip(remaining[~rejected], found):
+            candidates[i] = record
+            cadence[lightcurves[i]['obj_id']] = binsz
+        if n == 0:
+            rejects = {offset + int(remaining[i]): reason for i, reason in failed.items()}
+        else:
+            for i in remaining[~rejected]:
+                del rejects[offset + int(i)]
+            # the finest cadence's stages are timed by screen() itself
+            metrics.lap(stage, t)
+        remaining = np.array([
+            remaining[i] for i, reason in sorted(failed.items())
+            if rescreenable(reason)
+        ], dtype=remaining.dtype)
+    return [candidates[i] for i in sorted(candidates)], rejects, cadence
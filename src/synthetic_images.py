@@ -0,0 +1,86 @@
+"""
+synthetic GALEX-like -nd-full.fits.gz and -nd-30s.fits.gz image files for
+benchmarking the QA stage offline. the primary HDU holds the image (full
+depth) or frame cube (movie) with the header keywords read_image expects
+(N_FRAME, EXPT_i, T0_i, T1_i, CRVAL1/2), followed by the flag and edge
+backplanes in HDUs 1 and 2. the backplanes are 2D for movies too, since
+they do not change from frame to frame.
+"""
+from typing import Sequence
+
+from astropy.io import fits as pyfits
+import numpy as np
+from scipy import ndimage
+
+from gPhoton.types import Pathlike
+from synthetic_photometry import synthetic_exptime
+
+# GALEX intensity maps are 3200 x 3200 pixels of 1.5 arcsec
+GALEX_IMSZ = (3200, 3200)
+
+
+def star_field(
+    imsz: Sequence[int], n_stars: int, rng: np.random.Generator, fwhm: float = 4.0
+) -> np.ndarray:
+    """count-rate image (cps per pixel) of log-normal point sources"""
+    field = np.zeros(imsz, dtype=np.float32)
+    y = rng.integers(0, imsz[0], n_stars)
+    x = rng.integers(0, imsz[1], n_stars)
+    np.add.at(field, (y, x), rng.lognormal(0, 1.5, n_stars).astype(np.float32))
+    return ndimage.gaussian_filter(field, fwhm / 2.355)
+
+
+def detector_mask(imsz: Sequence[int]) -> np.ndarray:
+    """edge flags: the region outside the circular GALEX field of view"""
+    yy, xx = np.ogrid[:imsz[0], :imsz[1]]
+    r = np.hypot(yy - imsz[0] / 2, xx - imsz[1] / 2)
+    return (r > 0.45 * min(imsz)).astype(np.float32)
+
+
+def make_synthetic_image(
+    filename: Pathlike,
+    n_frames: int = 1,
+    imsz: Sequence[int] = GALEX_IMSZ,
+    n_stars: int = 2000,
+    background: float = 1e-3,
+    skypos: tuple[float, float] = (249.9097, 41.1124),
+    seed: int = 19470622,
+) -> str:
+    """
+    write a synthetic image file. n_frames=1 gives a 2D full-depth image
+    (like -nd-full.fits.gz); n_frames > 1 gives a movie cube of 30-s frames
+    (like -nd-30s.fits.gz). use a .gz filename for gzip compression.
+    """
+    rng = np.random.default_rng(seed)
+    exptime = synthetic_exptime(n_frames)
+    if n_frames == 1:
+        exptime = [{
+            't0': exptime[0]['t0'], 't1': exptime[0]['t0'] + 1600.0, 'expt': 1500.0
+        }]
+    rate = star_field(imsz, n_stars, rng) + np.float32(background)
+    # frames without exposure (see synthetic_exptime) are blank
+    frames = np.stack([
+        rng.poisson(rate * rec['expt']).astype(np.float32) / np.float32(rec['expt'])
+        if rec['expt'] > 0 else np.zeros(imsz, dtype=np.float32)
+        for rec in exptime
+    ])
+    edge = detector_mask(imsz)
+    flag = np.zeros(imsz, dtype=np.float32)
+    # a couple of hotspot-mask patches
+    for _ in range(3):
+        y, x = rng.integers(200, imsz[0] - 200), rng.integers(200, imsz[1] - 200)
+        flag[y - 20:y + 20, x - 20:x + 20] = 1
+    image = frames[0] if n_frames == 1 else frames
+    header = pyfits.Header()
+    header['N_FRAME'] = n_frames
+    header['CRVAL1'], header['CRVAL2'] = skypos
+    for i, rec in enumerate(exptime):
+        header[f'EXPT_{i}'] = rec['expt']
+        header[f'T0_{i}'] = rec['t0']
+        header[f'T1_{i}'] = rec['t1']
+    pyfits.HDUList([
+        pyfits.PrimaryHDU(image, header=header),
+        pyfits.ImageHDU(flag),
+        pyfits.ImageHDU(edge),
+    ]).writeto(filename, overwrite=True)
+    return str(filename)
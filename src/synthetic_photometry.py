@@ -0,0 +1,134 @@
+"""
+synthetic GALEX-like -30s-photom.parquet files for benchmarks and offline
+testing. column names follow bin_field_name and the per-band exposure time
+tables are stored in the nuv_exptime / fuv_exptime schema metadata, exactly
+as in the gPhoton2 photometry files read by lightcurve_interface_skeleton.
+"""
+import json
+from typing import Sequence
+
+import numpy as np
+import pyarrow as pa
+from pyarrow import parquet
+
+from gPhoton.types import GalexBand, Pathlike
+from lightcurve_interface_skeleton import bin_field_name
+
+APERSIZES = (12.8, 51.2)
+# bin exposure is reduced from 30 s by dead time; first and last bins are partial
+TYPICAL_BIN_EXPT = 25.0
+
+
+def synthetic_exptime(
+    n_bins: int, t_start: float = 741051671.0, binsz: float = 30
+) -> list[dict]:
+    """
+    exposure time records (t0, t1, expt) like the photometry file metadata,
+    with partial first and last bins and a one-bin dropout with no exposure
+    """
+    t0 = t_start + binsz * np.arange(n_bins)
+    expt = np.full(n_bins, TYPICAL_BIN_EXPT)
+    expt[0], expt[-1] = 0.4 * TYPICAL_BIN_EXPT, 0.2 * TYPICAL_BIN_EXPT
+    if n_bins > 4:
+        expt[n_bins // 3] = 0
+    return [
+        {'t0': float(a), 't1': float(a + binsz), 'expt': float(e)}
+        for a, e in zip(t0, expt)
+    ]
+
+
+def flare_profile(n_bins: int, peak: int, rise: float, decay: float) -> np.ndarray:
+    """fast-rise exponential-decay shape with unit peak, in bins"""
+    t = np.arange(n_bins) - peak
+    return np.where(t < 0, np.exp(t / max(rise, 1e-3)), np.exp(-t / decay))
+
+
+def synthetic_rates(
+    n_sources: int,
+    n_bins: int,
+    flare_rate: float = 0.005,
+    artifact_rate: float = 0.005,
+    rng: np.random.Generator = None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    cps per source and bin: log-normal quiescent rates, with FRED flares
+    injected into a `flare_rate` fraction of sources and isolated one-bin
+    spikes (a common artifact morphology) into an `artifact_rate` fraction.
+    returns rates and boolean arrays marking flaring and artifact sources.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    rates = rng.lognormal(mean=-1.5, sigma=1.2, size=(n_sources, 1)) * np.ones(n_bins)
+    flaring = rng.random(n_sources) < flare_rate
+    for i in np.nonzero(flaring)[0]:
+        shape = flare_profile(
+            n_bins, rng.integers(n_bins), rng.uniform(0.1, 1), rng.uniform(1, 8)
+        )
+        rates[i] += rng.uniform(5, 50) * rates[i, 0] * shape
+    artifact = rng.random(n_sources) < artifact_rate
+    for i in np.nonzero(artifact)[0]:
+        spikes = rng.choice(n_bins, size=rng.integers(3, 7), replace=False)
+        rates[i, spikes] += rng.uniform(5, 20, len(spikes)) * max(rates[i, 0], 0.5)
+    return rates, flaring, artifact
+
+
+def make_synthetic_photometry(
+    filename: Pathlike,
+    n_sources: int = 5000,
+    n_bins: int = 55,
+    flare_rate: float = 0.005,
+    artifact_rate: float = 0.005,
+    flagged_rate: float = 0.05,
+    bands: Sequence[GalexBand] = ("NUV", "FUV"),
+    apersizes: Sequence[float] = APERSIZES,
+    eclipse: int = 1234,
+    seed: int = 19470622,
+    row_group_size: int = 10000,
+) -> dict:
+    """
+    write a synthetic -30s-photom.parquet file. a `flagged_rate` fraction of
+    sources get counts in the mask and edge backplanes. returns a summary of
+    what was injected (obj_ids of flaring, artifact and flagged sources).
+    """
+    rng = np.random.default_rng(seed)
+    columns = {
+        'obj_id': np.arange(1, n_sources + 1, dtype=np.int64) * 100000 + eclipse,
+        'xcenter': rng.uniform(100, 3100, n_sources),
+        'ycenter': rng.uniform(100, 3100, n_sources),
+        'ra': rng.uniform(0, 1.2, n_sources),
+        'dec': rng.uniform(0, 1.2, n_sources),
+    }
+    metadata, injected = {}, {}
+    for band in bands:
+        exptime = synthetic_exptime(n_bins)
+        metadata[f'{band.lower()}_exptime'.encode('ascii')] = json.dumps(exptime).encode()
+        expt = np.array([rec['expt'] for rec in exptime])
+        rates, flaring, artifact = synthetic_rates(
+            n_sources, n_bins, flare_rate, artifact_rate, rng
+        )
+        scale = 1 if band == 'NUV' else 0.3  # sources are fainter in FUV
+        flagged = {
+            plane: rng.random(n_sources) < flagged_rate / 2 for plane in ("mask", "edge")
+        }
+        for size in apersizes:
+            # larger apertures collect more source and background light
+            counts = rng.poisson(rates * scale * (size / 12.8) ** 0.5 * expt)
+            columns[bin_field_name(size, band)] = counts.sum(axis=1).astype(np.float64)
+            for plane in ("mask", "edge"):
+                plane_counts = np.where(flagged[plane][:, None], counts, 0)
+                columns[bin_field_name(size, band, plane=plane)] = (
+                    plane_counts.sum(axis=1).astype(np.float64)
+                )
+                for binno in range(n_bins):
+                    columns[bin_field_name(size, band, binno, plane)] = (
+                        plane_counts[:, binno].astype(np.float64)
+                    )
+            for binno in range(n_bins):
+                columns[bin_field_name(size, band, binno)] = counts[:, binno].astype(np.float64)
+        injected[band] = {
+            'flaring': columns['obj_id'][flaring].tolist(),
+            'artifact': columns['obj_id'][artifact].tolist(),
+            'flagged': columns['obj_id'][flagged['mask'] | flagged['edge']].tolist(),
+        }
+    table = pa.table(columns).replace_schema_metadata(metadata)
+    parquet.write_table(table, filename, row_group_size=row_group_size)
+    return injected
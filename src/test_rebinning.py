@@ -0,0 +1,39 @@
+"""
+checks of multi-cadence screening on synthetic photometry.
+
+    python -m pytest test_rebinning.py
+"""
+import numpy as np
+
+from lightcurve_interface_skeleton import (
+    load_exptime, load_lightcurve_records, screen_lightcurves
+)
+from rebinning import RESCREEN_REASONS, screen_cadences
+from synthetic_photometry import make_synthetic_photometry
+
+
+def test_artifacts_stay_rejected_at_coarse_cadences(tmp_path):
+    photfile = tmp_path / 'e01234-30s-photom.parquet'
+    injected = make_synthetic_photometry(
+        photfile, n_sources=2000, flare_rate=0.001, artifact_rate=0.004
+    )
+    lightcurves = load_lightcurve_records(photfile, 'NUV')
+    expt = load_exptime(photfile, 'NUV', exptime_only=False)
+    _, native_rejects = screen_lightcurves(lightcurves, expt)
+    candidates, rejects, _ = screen_cadences(lightcurves, expt, (30, 120, 300))
+    artifacts = set(injected['NUV']['artifact'])
+    vetoed = [
+        i for i, lc in enumerate(lightcurves)
+        if lc['obj_id'] in artifacts and i in native_rejects
+        and native_rejects[i] not in RESCREEN_REASONS
+    ]
+    # the injected spikes are vetoed at 30 s, and averaging them away in
+    # coarse bins must not let them through
+    assert vetoed
+    assert all(rejects[i] == native_rejects[i] for i in vetoed)
+    vetoed_ids = {lightcurves[i]['obj_id'] for i in vetoed}
+    assert not vetoed_ids & {record['id'] for record in candidates}
+    # only sources rejected for lack of significance can be rescued
+    rescued = set(native_rejects) - set(rejects)
+    assert all(native_rejects[i] in RESCREEN_REASONS for i in rescued)
+    assert np.isin(list(rescued), vetoed, invert=True).all()